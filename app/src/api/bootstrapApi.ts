@@ -0,0 +1,14 @@
+import {api} from "@/lib/api.ts";
+
+// ログイン直後の初期表示用 (GET /me と GET /construction-master をまとめて取得)
+// 前回の etags を渡すと、変わっていない部分は省略されて notModified に名前が入る
+export const fetchBootstrap = async (etags?: { tenantUser?: string; constructionMaster?: string }, format = 'full') => {
+    const res = await api.get('/bootstrap', {
+        params: {
+            format,
+            userEtag: etags?.tenantUser,
+            treeEtag: etags?.constructionMaster,
+        },
+    });
+    return res.data;
+};
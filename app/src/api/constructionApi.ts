@@ -4,3 +4,19 @@ export const fetchConstructionMaster = async () => {
     const res = await api.get('/construction-master');
     return res.data;
 };
+
+// 指定ノードと depth 階層分の子だけを取得する (path 省略時はルート一覧)
+export const fetchConstructionNode = async (path?: string, depth = 1) => {
+    const res = await api.get('/construction-master/nodes', {
+        params: { path, depth },
+    });
+    return res.data;
+};
+
+// 作業・安全機材をタイトルで検索する (kind: 'task' | 'safety_equipment')
+export const searchConstructionMaster = async (q: string, kind?: string, limit = 20) => {
+    const res = await api.get('/construction-master/search', {
+        params: { q, kind, limit },
+    });
+    return res.data;
+};
@@ -65,14 +65,23 @@ export const useOtpAuth = (onSuccess: OnSuccess, onPasskeyPrompt: OnPasskeyPromp
 
         try {
             // Lambda ("verify_challenge") に "RESEND" を送る
-            // Lambda ("define_auth") がこれを検知して、新しいコードを発行してループさせます
+            // Lambda ("define_auth") がこれを検知してループさせ、"create_challenge" が再発行ポリシーに従ってコードを発行します
             const { nextStep } = await confirmSignIn({
                 challengeResponse: "RESEND"
             });
 
             if (nextStep.signInStep === "CONFIRM_SIGN_IN_WITH_CUSTOM_CHALLENGE") {
-                setResendMessage("新しい認証コードを送信しました。メールをご確認ください。");
-                setOtp(""); // 入力欄をクリア
+                // create_challenge の publicChallengeParameters (再発行ポリシーの結果)
+                const info = nextStep.additionalInfo ?? {};
+                if (info.otpStatus === "REUSED") {
+                    setResendMessage("送信済みの認証コードが有効です。先ほどのメールをご確認ください。");
+                } else if (info.otpStatus === "COOLDOWN") {
+                    const minutes = Math.max(1, Math.ceil(Number(info.cooldownSeconds ?? 0) / 60));
+                    setError(`再送信の回数が上限に達しました。約${minutes}分後にもう一度お試しください。`);
+                } else {
+                    setResendMessage("新しい認証コードを送信しました。メールをご確認ください。");
+                    setOtp(""); // 入力欄をクリア
+                }
             } else {
                 setError("再送信中に予期せぬエラーが発生しました。");
             }
@@ -0,0 +1,337 @@
+"""
+s0_auth-challenge (Cognito カスタム認証トリガー) の負荷試験
+
+使い方:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_auth_flow.py [--logins 1000] [--concurrency 20] [--ramp-seconds 0]
+
+- 1回のログインで Cognito が呼ぶ順番どおりにハンドラーを実行する
+    define_auth (SRP_A) -> define_auth (PASSWORD_VERIFIER) -> define_auth (CUSTOM_CHALLENGE)
+    -> create_challenge -> verify_challenge -> define_auth (トークン発行)
+  --wrong-rate の割合で最初に誤ったコードを入力させる (verify -> define -> create (再利用) -> verify)
+- 同時実行数 (--concurrency) の数だけプロセスを起動し、1プロセス = 1 Lambda コンテナとして1件ずつ処理する
+  (各プロセスでのハンドラーの import 時間をコールドスタートの初期化時間として計測する)
+- DynamoDB / SES / SQS はローカルの moto サーバー (省略時に自動起動) を使う
+  --endpoint-url で DynamoDB Local や LocalStack などを指定することもできる
+- --ddb-latency-ms / --ses-latency-ms で、呼び出しごとに実際の AWS 相当の遅延を加えられる
+- ハンドラーごと (コールド/ウォーム別) とログイン全体の p50 / p95 / p99 を表示する
+  (ログイン全体 = 1回のログインで実行したハンドラーの処理時間の合計。Cognito 自体の処理時間は含まない)
+"""
+import os
+import sys
+import json
+import math
+import logging
+import time
+import random
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager, get_context
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "infrastructure", "services", "s0_auth-challenge", "lambda"))
+
+REGION = "ap-northeast-1"
+OTP_TABLE_NAME = "bench-otp"
+SENDER_EMAIL = "no-reply@example.com"
+HANDLERS = ["define_auth", "create_challenge", "verify_challenge"]
+
+# ワーカープロセス内の状態 (プロセスごとに1つ = Lambda コンテナ1つ)
+_modules = {}
+_invoked = set()
+_last_otp = {}
+_shared_codes = None
+
+
+class Context:
+    """Lambda の context の代わり"""
+    function_name = "bench-auth"
+    memory_limit_in_mb = 256
+    invoked_function_arn = f"arn:aws:lambda:{REGION}:000000000000:function:bench-auth"
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def add_latency(session, service, latency_ms):
+    """
+    リクエスト送信前に一定時間待つ (実際の AWS のネットワーク遅延の代わり)
+    ハンドラーはクライアントを初回に使うときに作成するため、作成元の Session に登録しておく
+    """
+    if latency_ms <= 0:
+        return
+    session.events.register(f"before-send.{service}", lambda **kwargs: time.sleep(latency_ms / 1000))
+
+
+def init_worker(env, ddb_latency_ms, ses_latency_ms, shared_codes, show_logs):
+    """ワーカープロセスの初期化 (コールドスタート相当)。ハンドラーの import 時間を計測する"""
+    global _shared_codes
+    _shared_codes = shared_codes
+    os.environ.update(env)
+    if not show_logs:
+        # ログの JSON 化のコストは計測に含めたいので、出力先だけ捨てる
+        sys.stdout = open(os.devnull, "w")
+    sys.path.insert(0, LAMBDA_DIR)
+
+    init_ms = {}
+    for name in HANDLERS:
+        started = time.perf_counter()
+        _modules[name] = __import__(name)
+        init_ms[name] = (time.perf_counter() - started) * 1000
+    _modules["init_ms"] = init_ms
+
+    import boto3
+    boto3.setup_default_session()
+    add_latency(boto3.DEFAULT_SESSION, "dynamodb", ddb_latency_ms)
+    add_latency(boto3.DEFAULT_SESSION, "ses", ses_latency_ms)
+    add_latency(boto3.DEFAULT_SESSION, "sqs", ses_latency_ms)
+
+    create = _modules["create_challenge"]
+
+    # 生成したコードを控えておく (ハッシュしか保存されないため)
+    generate_otp = create.generate_otp
+
+    def capture_otp(length=6):
+        otp = generate_otp(length)
+        _last_otp["code"] = otp
+        return otp
+
+    create.generate_otp = capture_otp
+
+
+def invoke(name, event, timings):
+    """ハンドラーを呼び出し、処理時間を記録する (プロセス内で最初の呼び出しはコールド扱い)"""
+    handler = _modules[name].lambda_handler
+    cold = name not in _invoked
+    _invoked.add(name)
+    started = time.perf_counter()
+    result = handler(event, Context())
+    timings.append((name, cold, (time.perf_counter() - started) * 1000))
+    return result
+
+
+def trigger_event(user, session=None, answer=None):
+    request = {"userAttributes": user, "session": session or []}
+    if answer is not None:
+        request["challengeAnswer"] = answer
+        request["privateChallengeParameters"] = {"tenant_id": user["custom:tenant_id"]}
+    return {"request": request, "response": {}}
+
+
+def run_login(task):
+    """1回のログインを実行し、計測結果を返す"""
+    start_at, user, wrong_first = task
+    delay = start_at - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+    timings = []
+    session = []
+    email = user["email"]
+
+    for challenge in ("SRP_A", "PASSWORD_VERIFIER"):
+        invoke("define_auth", trigger_event(user, session), timings)
+        session.append({"challengeName": challenge, "challengeResult": True})
+    invoke("define_auth", trigger_event(user, session), timings)
+
+    _last_otp.clear()
+    created = invoke("create_challenge", trigger_event(user, session), timings)
+    status = created["response"]["publicChallengeParameters"].get("otpStatus", "SENT")
+    if "code" in _last_otp:
+        _shared_codes[email] = _last_otp["code"]
+    otp = _shared_codes.get(email)
+
+    signed_in = False
+    answers = (["000000" if otp != "000000" else "111111"] if wrong_first else []) + [otp or "RESEND"]
+    for answer in answers:
+        verified = invoke("verify_challenge", trigger_event(user, session, answer), timings)
+        session.append({"challengeName": "CUSTOM_CHALLENGE",
+                        "challengeResult": verified["response"]["answerCorrect"]})
+        defined = invoke("define_auth", trigger_event(user, session), timings)["response"]
+        if defined.get("issueTokens"):
+            signed_in = True
+            break
+        if defined.get("failAuthentication"):
+            break
+        invoke("create_challenge", trigger_event(user, session), timings)
+
+    return {
+        "pid": os.getpid(),
+        "init_ms": _modules["init_ms"],
+        "timings": timings,
+        "status": status,
+        "signed_in": signed_in,
+    }
+
+
+def setup_resources(endpoint_url, use_queue):
+    """ベンチマーク用のテーブル (とキュー) を作成する"""
+    # ワーカープロセスの import 時間に影響しないよう、親プロセスだけで import する
+    import boto3
+
+    session = boto3.session.Session(region_name=REGION)
+    dynamodb = session.client("dynamodb", endpoint_url=endpoint_url)
+    try:
+        dynamodb.delete_table(TableName=OTP_TABLE_NAME)
+        dynamodb.get_waiter("table_not_exists").wait(TableName=OTP_TABLE_NAME)
+    except dynamodb.exceptions.ResourceNotFoundException:
+        pass
+    dynamodb.create_table(
+        TableName=OTP_TABLE_NAME,
+        KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}, {"AttributeName": "email", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"},
+                              {"AttributeName": "email", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    dynamodb.get_waiter("table_exists").wait(TableName=OTP_TABLE_NAME)
+    session.client("ses", endpoint_url=endpoint_url).verify_email_identity(EmailAddress=SENDER_EMAIL)
+    if use_queue:
+        return session.client("sqs", endpoint_url=endpoint_url).create_queue(QueueName="bench-otp-mail")["QueueUrl"]
+    return None
+
+
+def print_stats(label, values):
+    values = sorted(values)
+    if not values:
+        return
+    print(f"{label:<32} {len(values):>7} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} "
+          f"{percentile(values, 99):>9.1f} {values[-1]:>9.1f}")
+
+
+def report(results, elapsed, args):
+    by_handler = defaultdict(list)
+    end_to_end = []
+    statuses = defaultdict(int)
+    init_by_pid = {}
+    for result in results:
+        init_by_pid[result["pid"]] = result["init_ms"]
+        statuses[result["status"]] += 1
+        end_to_end.append(sum(ms for _, _, ms in result["timings"]))
+        for name, cold, ms in result["timings"]:
+            by_handler[(name, "cold" if cold else "warm")].append(ms)
+
+    signed_in = sum(1 for r in results if r["signed_in"])
+    print(f"ログイン {len(results)} 件 (成功 {signed_in}) / 同時実行数 {args.concurrency} / "
+          f"経過 {elapsed:.1f} 秒 ({len(results) / elapsed:.1f} 件/秒)")
+    print("OTP発行結果: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+    print()
+    print(f"{'(ms)':<32} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name in HANDLERS:
+        print_stats(f"init (import) {name}", [init[name] for init in init_by_pid.values()])
+    for name in HANDLERS:
+        for kind in ("cold", "warm"):
+            print_stats(f"{name} [{kind}]", by_handler[(name, kind)])
+    print_stats("login (end-to-end)", end_to_end)
+
+    if args.json:
+        summary = {
+            "logins": len(results),
+            "signed_in": signed_in,
+            "concurrency": args.concurrency,
+            "elapsed_seconds": elapsed,
+            "otp_status": dict(statuses),
+        }
+        for (name, kind), values in by_handler.items():
+            values.sort()
+            summary[f"{name}.{kind}"] = {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+        end_to_end.sort()
+        summary["end_to_end"] = {f"p{p}": percentile(end_to_end, p) for p in (50, 95, 99)}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20, help="同時実行数 (= ワーカープロセス数)")
+    parser.add_argument("--users", type=int, default=0, help="ユーザー数 (0: ログイン数と同じ。少なくすると再ログインが発生する)")
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="全ログインの開始をこの秒数に均等に分散する (0: 一斉に開始)")
+    parser.add_argument("--wrong-rate", type=float, default=0.1, help="最初に誤ったコードを入力する割合")
+    parser.add_argument("--ddb-latency-ms", type=float, default=0)
+    parser.add_argument("--ses-latency-ms", type=float, default=0)
+    parser.add_argument("--queue", action="store_true", help="メール送信を SQS 経由にする (OTP_QUEUE_URL を設定)")
+    parser.add_argument("--endpoint-url", help="既存のローカルエンドポイント (省略時は moto サーバーを起動)")
+    parser.add_argument("--port", type=int, default=5123)
+    parser.add_argument("--json", help="集計結果を JSON で保存するパス")
+    parser.add_argument("--show-logs", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if not endpoint_url:
+        from moto.server import ThreadedMotoServer
+        # リクエストごとのアクセスログを出さない
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=args.port, verbose=False)
+        server.start()
+        endpoint_url = f"http://127.0.0.1:{args.port}"
+
+    # ワーカーからも同じエンドポイントに向ける (boto3 の AWS_ENDPOINT_URL)
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ["AWS_DEFAULT_REGION"] = REGION
+    os.environ["AWS_ENDPOINT_URL"] = endpoint_url
+
+    try:
+        queue_url = setup_resources(endpoint_url, args.queue)
+        env = {
+            "OTP_TABLE_NAME": OTP_TABLE_NAME,
+            "SENDER_EMAIL": SENDER_EMAIL,
+            "OTP_PEPPER": "bench",
+            "POWERTOOLS_TRACE_DISABLED": "1",
+            "POWERTOOLS_SERVICE_NAME": "bench-auth",
+            # 同じユーザーでの再ログインで発行回数の上限に当たらないようにする
+            "OTP_SEND_LIMIT_PER_EMAIL": os.environ.get("OTP_SEND_LIMIT_PER_EMAIL", "0"),
+            "OTP_SEND_LIMIT_PER_TENANT": os.environ.get("OTP_SEND_LIMIT_PER_TENANT", "0"),
+        }
+        if queue_url:
+            env["OTP_QUEUE_URL"] = queue_url
+
+        rng = random.Random(args.seed)
+        users = [
+            {
+                "email": f"user{i}@example.com",
+                "sub": f"sub-{i}",
+                "custom:tenant_id": f"tenant-{i % args.tenants}",
+            }
+            for i in range(args.users or args.logins)
+        ]
+
+        with Manager() as manager:
+            shared_codes = manager.dict()
+            with ProcessPoolExecutor(
+                max_workers=args.concurrency,
+                # fork だと親プロセスで import 済みのモジュールを引き継ぐため、コールドスタートを再現できない
+                mp_context=get_context("spawn"),
+                initializer=init_worker,
+                initargs=(env, args.ddb_latency_ms, args.ses_latency_ms, shared_codes, args.show_logs),
+            ) as executor:
+                # プロセスの起動 (コールドスタート) が終わってから一斉に開始させる
+                start_at = time.time() + 2 + args.concurrency * 0.05
+                step = args.ramp_seconds / args.logins if args.logins else 0
+                tasks = [
+                    (start_at + i * step, users[i % len(users)], rng.random() < args.wrong_rate)
+                    for i in range(args.logins)
+                ]
+                results = list(executor.map(run_login, tasks))
+            elapsed = max(time.time() - start_at, 1e-9)
+
+        report(results, elapsed, args)
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
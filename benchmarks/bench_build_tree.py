@@ -0,0 +1,151 @@
+"""
+s2_tenant-context の工事マスタ ツリー組み立て (build_tree) の計測
+
+使い方:
+    python benchmarks/bench_build_tree.py [--nodes 100000]
+
+- 合成した大規模マスタ (DEPT > TYPE > PROJ > TASK/SEQ, ENV > TYPE > ITEM) で計測
+- DynamoDBの返却順 (nodePath の辞書順) と、シャッフルした順の両方で組み立てる
+- 旧実装 (辞書順依存・部分文字列判定) と比較し、兄弟が数値順に並ぶことを確認する
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "infrastructure", "services", "s2_tenant-context", "lambda")
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+from tree import build_tree, CHILD_KEYS  # noqa: E402
+
+
+def legacy_build_tree(flat_items):
+    """変更前の実装 (比較用)"""
+    node_map = {}
+    for item in flat_items:
+        node = {"id": item.get("nodePath"), "title": item.get("title"), "children": [], "tasks": [], "safety_equipments": []}
+        if "is_high_risk" in item:
+            node["is_high_risk"] = item["is_high_risk"]
+        node_map[item.get("nodePath")] = node
+
+    root_nodes = []
+    for path, node in node_map.items():
+        parts = path.split("#")
+        if len(parts) <= 2:
+            root_nodes.append(node)
+        else:
+            parent = node_map.get("#".join(parts[:-2]))
+            if parent:
+                if "TASK" in parts[-2]:
+                    parent["tasks"].append(node)
+                elif "SEQ" in parts[-2]:
+                    parent["safety_equipments"].append(node)
+                else:
+                    parent["children"].append(node)
+            else:
+                root_nodes.append(node)
+    return root_nodes
+
+
+def make_master(target, seed=42):
+    """シードデータの形を保ったまま、約 target 件の合成マスタを作成"""
+    rng = random.Random(seed)
+    items = []
+
+    def add(path, title, high_risk=None):
+        item = {"tenant_id": "tenant-bench", "nodePath": path, "title": title}
+        if high_risk is not None:
+            item["is_high_risk"] = high_risk
+        items.append(item)
+
+    dept = 0
+    while len(items) < target:
+        dept += 1
+        add(f"DEPT#{dept}", f"部門{dept}")
+        for t in range(1, 13):
+            type_path = f"DEPT#{dept}#TYPE#{t}"
+            add(type_path, f"工種{t}")
+            for p in range(1, 13):
+                proj_path = f"{type_path}#PROJ#{p}"
+                add(proj_path, f"工事{p}")
+                for k in range(1, rng.randint(2, 12)):
+                    add(f"{proj_path}#TASK#{k}", f"作業{k}", rng.random() < 0.2)
+                for s in range(1, rng.randint(2, 12)):
+                    add(f"{proj_path}#SEQ#{s}", f"安全機材{s}")
+
+    env_types = max(1, target // 2000)
+    for e in range(1, 4):
+        add(f"ENV#{e}", f"環境{e}")
+        for t in range(1, env_types + 1):
+            add(f"ENV#{e}#TYPE#{t}", f"環境種別{t}")
+            for i in range(1, 12):
+                add(f"ENV#{e}#TYPE#{t}#ITEM#{i}", f"環境項目{i}")
+
+    # DynamoDBはソートキー (nodePath) の辞書順で返す
+    items.sort(key=lambda item: item["nodePath"])
+    return items
+
+
+def count_nodes(nodes):
+    total = 0
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        total += 1
+        for key in CHILD_KEYS:
+            stack.extend(node[key])
+    return total
+
+
+def is_numeric_order(nodes):
+    """兄弟が (種別, 数値ID) 順に並んでいるか"""
+    stack = [nodes]
+    while stack:
+        siblings = stack.pop()
+        keys = [(n["id"].split("#")[-2], int(n["id"].split("#")[-1])) for n in siblings]
+        if keys != sorted(keys):
+            return False
+        for node in siblings:
+            stack.extend(node[key] for key in CHILD_KEYS)
+    return True
+
+
+def bench(label, func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<40} {best * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    items = make_master(args.nodes)
+    shuffled = list(items)
+    random.Random(0).shuffle(shuffled)
+    print(f"--- 合成マスタ {len(items):,} 件 ---")
+
+    legacy = bench("旧実装 (辞書順)", lambda: legacy_build_tree(items), args.repeat)
+    legacy_shuffled = bench("旧実装 (シャッフル)", lambda: legacy_build_tree(shuffled), args.repeat)
+    current = bench("新実装 (辞書順)", lambda: build_tree(items), args.repeat)
+    stats = {}
+    current_shuffled = bench("新実装 (シャッフル)", lambda: build_tree(shuffled, stats=stats), args.repeat)
+
+    print("--- 結果の確認 ---")
+    print(f"  旧実装: ノード数 {count_nodes(legacy):,} (シャッフル時 {count_nodes(legacy_shuffled):,}, "
+          f"ルート {len(legacy_shuffled)} 件), 数値順 {is_numeric_order(legacy)}")
+    print(f"  新実装: ノード数 {count_nodes(current):,} (シャッフル時 {count_nodes(current_shuffled):,}, "
+          f"ルート {len(current_shuffled)} 件), 数値順 {is_numeric_order(current)}")
+    print(f"  入力順に関係なく同じ結果: {current == current_shuffled}  stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
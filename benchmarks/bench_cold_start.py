@@ -0,0 +1,210 @@
+"""
+各 Lambda ハンドラーのコールドスタート (モジュール import) 時間の計測
+
+使い方:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_cold_start.py [--runs 10] [--baseline-ref HEAD~1] [--importtime-dir /tmp/importtime]
+
+- ハンドラーごとに新しい Python プロセスを起動し、`python -X importtime` で import して計測する
+  (Lambda の初期化フェーズで行われる処理 = モジュールの import とグローバル変数の初期化)
+- レイヤー (共通レイヤー・VQ レイヤー) は Lambda と同じく sys.path の後ろに追加する
+- 各ハンドラーについて import 時間の p50 / p99 / max と、時間のかかったパッケージの上位を表示する
+- --baseline-ref を指定すると、その git リビジョンの infrastructure/ を一時ディレクトリに展開して同じ計測を行い、比較する
+- --importtime-dir を指定すると、-X importtime の生の出力を保存する (tuna などで可視化できる)
+"""
+import os
+import re
+import sys
+import math
+import shutil
+import tarfile
+import tempfile
+import argparse
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LAYER_PATHS = [
+    os.path.join("infrastructure", "layers", "common", "src", "python"),
+    os.path.join("infrastructure", "services", "s3_vq_workflow", "layer", "src", "python"),
+]
+
+# (表示名, lambda ディレクトリ, import するモジュール)
+HANDLERS = [
+    ("s0 define_auth", "infrastructure/services/s0_auth-challenge/lambda", "define_auth"),
+    ("s0 create_challenge", "infrastructure/services/s0_auth-challenge/lambda", "create_challenge"),
+    ("s0 verify_challenge", "infrastructure/services/s0_auth-challenge/lambda", "verify_challenge"),
+    ("s1 auth-user", "infrastructure/services/s1_auth-user/lambda", "main"),
+    ("s2 tenant-context", "infrastructure/services/s2_tenant-context/lambda", "main"),
+    ("s3 producer", "infrastructure/services/s3_vq_workflow/lambda/producer", "main"),
+    ("s3 worker", "infrastructure/services/s3_vq_workflow/lambda/worker", "main"),
+    ("s3 aggregator", "infrastructure/services/s3_vq_workflow/lambda/aggregator", "main"),
+    ("s4 log-archiver", "infrastructure/services/s4_log-archiver/lambda", "main"),
+    ("s5 log-query", "infrastructure/services/s5_log-query/lambda", "main"),
+]
+
+# import 時に参照される環境変数 (値は何でもよい)
+HANDLER_ENV = {
+    "AWS_DEFAULT_REGION": "ap-northeast-1",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "OTP_TABLE_NAME": "bench-otp",
+    "TENANT_USER_MASTER_TABLE_NAME": "bench-user",
+    "CONSTRUCTION_MASTER_TABLE_NAME": "bench-master",
+    "JOB_TABLE_NAME": "bench-job",
+    "POLLING_INTERVAL": "10",
+    "LOG_ARCHIVE_TABLE": "bench-log",
+    "LOG_ARCHIVE_TABLE_NAME": "bench-log",
+    "TARGET_LOG_GROUPS": "/aws/lambda/bench",
+    "POWERTOOLS_SERVICE_NAME": "bench",
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+TOTAL_LINE = re.compile(r"^TOTAL_MS=([\d.]+)$")
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def measure_once(tree_root, lambda_dir, module):
+    """
+    新しいプロセスでモジュールを import する
+    戻り値: (import 全体の時間 ms, {パッケージ名: 累積時間 ms}, -X importtime の生の出力)
+    """
+    paths = [os.path.join(tree_root, lambda_dir)]
+    for layer_path in LAYER_PATHS:
+        layer = os.path.join(tree_root, layer_path)
+        if os.path.isdir(layer):
+            # Lambda ではレイヤー (/opt/python) は関数のコード (/var/task) より後ろに入る
+            paths.append(layer)
+
+    code = (
+        "import sys, time\n"
+        f"sys.path[0:0] = {paths!r}\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(f'TOTAL_MS={(time.perf_counter() - started) * 1000:.3f}')\n"
+    )
+    env = {**os.environ, **HANDLER_ENV}
+    env.pop("PYTHONPATH", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.join(tree_root, lambda_dir),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    total = None
+    for line in result.stdout.splitlines():
+        match = TOTAL_LINE.match(line)
+        if match:
+            total = float(match.group(1))
+    if result.returncode != 0 or total is None:
+        raise RuntimeError(f"{lambda_dir}/{module} の import に失敗しました:\n{result.stderr[-2000:]}")
+
+    # ハンドラーのモジュール直下で import されたパッケージごとの累積時間
+    # (-X importtime は子が親より先に出力されるため、ハンドラーの行の直前までの深さ1の行を集める)
+    packages = defaultdict(float)
+    children = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3)) // 2
+        name = match.group(4)
+        if depth == 1:
+            children.append((name, int(match.group(2)) / 1000))
+        elif depth == 0:
+            if name == module:
+                for child, ms in children:
+                    packages[child.split(".")[0]] += ms
+            children = []
+    return total, packages, result.stderr
+
+
+def measure_tree(tree_root, runs, importtime_dir=None, label=""):
+    """ツリー内の全ハンドラーを計測する。戻り値: {表示名: (import 時間のリスト, 中央値の回のパッケージ別時間)}"""
+    results = {}
+    for name, lambda_dir, module in HANDLERS:
+        if not os.path.exists(os.path.join(tree_root, lambda_dir, f"{module}.py")):
+            continue
+        samples = []
+        for run in range(runs):
+            total, packages, raw = measure_once(tree_root, lambda_dir, module)
+            samples.append((total, packages))
+            if importtime_dir and run == 0:
+                os.makedirs(importtime_dir, exist_ok=True)
+                file_name = f"{label}{name.replace(' ', '_')}.log"
+                with open(os.path.join(importtime_dir, file_name), "w", encoding="utf-8") as f:
+                    f.write(raw)
+        samples.sort(key=lambda sample: sample[0])
+        results[name] = ([total for total, _ in samples], samples[len(samples) // 2][1])
+    return results
+
+
+def extract_revision(ref):
+    """git リビジョンの infrastructure/ を一時ディレクトリに展開する"""
+    workdir = tempfile.mkdtemp(prefix="bench-cold-start-")
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref, "infrastructure"],
+        cwd=ROOT, capture_output=True, check=True,
+    ).stdout
+    tar_path = os.path.join(workdir, "tree.tar")
+    with open(tar_path, "wb") as f:
+        f.write(archive)
+    with tarfile.open(tar_path) as tar:
+        tar.extractall(workdir)
+    os.remove(tar_path)
+    return workdir
+
+
+def print_results(title, results, baseline=None, top=5):
+    print(f"== {title}")
+    header = f"{'(ms)':<22} {'p50':>8} {'p99':>8} {'max':>8}"
+    if baseline:
+        header += f" {'base p50':>9} {'base p99':>9} {'p99 差':>8}"
+    print(header)
+    for name, (totals, _) in results.items():
+        line = f"{name:<22} {percentile(totals, 50):>8.1f} {percentile(totals, 99):>8.1f} {totals[-1]:>8.1f}"
+        if baseline and name in baseline:
+            base = baseline[name][0]
+            diff = percentile(totals, 99) - percentile(base, 99)
+            line += f" {percentile(base, 50):>9.1f} {percentile(base, 99):>9.1f} {diff:>+8.1f}"
+        print(line)
+
+    print()
+    print(f"import 時間の上位 {top} パッケージ (中央値の回, 累積 ms)")
+    for name, (_, packages) in results.items():
+        ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"  {name:<22} " + ", ".join(f"{pkg} {ms:.0f}" for pkg, ms in ranked))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--baseline-ref", help="比較対象の git リビジョン (例: HEAD~1)")
+    parser.add_argument("--importtime-dir", help="-X importtime の出力を保存するディレクトリ")
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline_ref:
+        workdir = extract_revision(args.baseline_ref)
+        try:
+            baseline = measure_tree(workdir, args.runs, args.importtime_dir, label="baseline_")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print_results(f"baseline ({args.baseline_ref})", baseline, top=args.top)
+
+    current = measure_tree(ROOT, args.runs, args.importtime_dir)
+    print_results("current (作業ツリー)", current, baseline, top=args.top)
+
+
+if __name__ == "__main__":
+    main()
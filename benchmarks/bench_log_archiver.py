@@ -0,0 +1,120 @@
+"""
+s4_log-archiver の1行あたりのCPUコスト計測
+
+使い方:
+    python benchmarks/bench_log_archiver.py [--rows 1000000]
+
+- action_category 分類: 旧実装 (毎行 any(...) の部分文字列検索) と
+  新実装 (単一正規表現 + 関数名ごとのLRUキャッシュ) の比較
+- Insightsの1行 -> DynamoDB保存用アイテム変換 (parse_insights_row) 全体のコスト
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "infrastructure", "services", "s4_log-archiver", "lambda")
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+from classifier import get_action_category_from_log, category_for_function  # noqa: E402
+from log_record import parse_insights_row  # noqa: E402
+
+# 実際のロググループに近い関数名 (種類はごく少数)
+FUNCTION_NAMES = [
+    "ndk-ky-system-dev-s1-auth-user",
+    "ndk-ky-system-dev-s2-context",
+    "ndk-ky-system-dev-s3-vq-producer",
+    "ndk-ky-system-dev-s3-vq-worker",
+    "ndk-ky-system-dev-s4-log",
+    "ndk-ky-system-dev-s5-log-query",
+    "ndk-ky-system-dev-auth-create-challenge",
+    "ndk-ky-system-dev-auth-define-auth",
+    "ndk-ky-system-dev-auth-verify-challenge",
+]
+LEVELS = ["INFO"] * 8 + ["WARNING", "ERROR"]
+
+
+def legacy_get_action_category(msg_data, function_name):
+    """変更前の実装 (比較用)"""
+    action_category = msg_data.get("action_category")
+    if action_category and action_category in {"EXECUTE", "DELETE", "BATCH", "AUTH", "LOGIN", "ERROR"}:
+        return action_category
+    if msg_data.get("level", "INFO") == "ERROR":
+        return "ERROR"
+    fn_lower = function_name.lower()
+    if any(x in fn_lower for x in ["auth", "otp", "token", "verify-challenge", "create-challenge"]):
+        return "AUTH"
+    if any(x in fn_lower for x in ["login", "define-auth"]):
+        return "LOGIN"
+    if any(x in fn_lower for x in ["delete", "remove"]):
+        return "DELETE"
+    if any(x in fn_lower for x in ["batch", "scheduled", "archiver", "worker"]):
+        return "BATCH"
+    return "EXECUTE"
+
+
+def make_rows(count, seed=42):
+    """Insightsの結果形式の合成ログを作成 (action_category なしのログを多めにする)"""
+    rng = random.Random(seed)
+    base = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    rows = []
+    for i in range(count):
+        msg = {
+            "level": rng.choice(LEVELS),
+            "message": "ジョブをチェックします",
+            "function_name": rng.choice(FUNCTION_NAMES),
+            "cold_start": False,
+            "duration_ms": rng.random() * 500,
+        }
+        if rng.random() < 0.3:
+            msg["action_category"] = "EXECUTE"
+        ts = base + datetime.timedelta(milliseconds=rng.randrange(86_400_000))
+        rows.append([
+            {"field": "@timestamp", "value": ts.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]},
+            {"field": "@message", "value": json.dumps(msg, ensure_ascii=False)},
+            {"field": "tenant_id", "value": f"tenant-{i % 20}"},
+            {"field": "user_id", "value": f"user-{i % 500}"},
+        ])
+    return rows
+
+
+def bench(label, func, count):
+    start = time.process_time()
+    func()
+    elapsed = time.process_time() - start
+    print(f"  {label:<40} {elapsed:8.3f}s  {elapsed / count * 1e9:8.0f} ns/row")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"--- 合成ログ {args.rows:,} 行を作成中... ---")
+    rows = make_rows(args.rows)
+    parsed = [(json.loads(r[1]["value"]), json.loads(r[1]["value"])["function_name"]) for r in rows]
+
+    # 旧実装と結果が一致することを確認
+    mismatches = sum(
+        1 for msg, fn in parsed if legacy_get_action_category(msg, fn) != get_action_category_from_log(msg, fn)
+    )
+    print(f"分類結果の不一致: {mismatches} 件")
+
+    print("--- action_category 分類 ---")
+    category_for_function.cache_clear()
+    legacy = bench("旧実装 (any + 部分文字列)", lambda: [legacy_get_action_category(m, f) for m, f in parsed], args.rows)
+    current = bench("新実装 (正規表現 + LRU)", lambda: [get_action_category_from_log(m, f) for m, f in parsed], args.rows)
+    print(f"  高速化: x{legacy / current:.1f}  キャッシュ: {category_for_function.cache_info()}")
+
+    print("--- 1行あたりの変換コスト (parse_insights_row) ---")
+    seen_keys = set()
+    expires_at = int(time.time())
+    bench("Insights行 -> DynamoDBアイテム", lambda: [parse_insights_row(r, seen_keys, expires_at) for r in rows], args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+s2_tenant-context の工事マスタ レスポンスのサイズとシリアライズ時間の計測
+
+使い方:
+    python benchmarks/bench_tree_encoding.py [--scale 100]
+
+- seeds/table_tenant_construction_master.json の部門を scale 倍に複製したツリーで計測
+- 表現形式 (full / compact / flat) ごとに、非圧縮・gzip・br のサイズを比較
+- 変更前のエンコード (json.dumps + ensure_ascii=False) と encoding.dumps (orjson) の時間を比較
+"""
+import os
+import sys
+import copy
+import json
+import gzip
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+LAMBDA_DIR = os.path.join(ROOT, "infrastructure", "services", "s2_tenant-context", "lambda")
+SEED_FILE = os.path.join(ROOT, "seeds", "table_tenant_construction_master.json")
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+import encoding  # noqa: E402
+from tree import CHILD_KEYS  # noqa: E402
+
+
+def to_tree_node(node):
+    """シードの形 (キーが省略されていることがある) を build_tree の出力と同じ形にする"""
+    result = {"id": node["id"], "title": node["title"]}
+    for key in CHILD_KEYS:
+        result[key] = [to_tree_node(child) for child in node.get(key, [])]
+    if "is_high_risk" in node:
+        result["is_high_risk"] = node["is_high_risk"]
+    return result
+
+
+def renumber(node, old_prefix, new_prefix):
+    node["id"] = new_prefix + node["id"][len(old_prefix):]
+    for key in CHILD_KEYS:
+        for child in node[key]:
+            renumber(child, old_prefix, new_prefix)
+
+
+def scaled_tree(scale):
+    """部門 (DEPT) を scale 倍に複製したツリー (ENV はそのまま)"""
+    with open(SEED_FILE, encoding="utf-8") as f:
+        roots = [to_tree_node(node) for node in json.load(f)["data"]]
+
+    depts = [r for r in roots if r["id"].startswith("DEPT#")]
+    others = [r for r in roots if not r["id"].startswith("DEPT#")]
+
+    tree = []
+    for copy_index in range(scale):
+        for dept in depts:
+            clone = copy.deepcopy(dept)
+            new_id = f"DEPT#{copy_index * len(depts) + int(dept['id'].split('#')[1])}"
+            renumber(clone, dept["id"], new_id)
+            tree.append(clone)
+    return tree + others
+
+
+def count_nodes(nodes):
+    return sum(1 + count_nodes([c for key in CHILD_KEYS for c in node[key]]) for node in nodes)
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tree = scaled_tree(args.scale)
+    print(f"--- ツリー {count_nodes(tree):,} ノード (部門 x{args.scale}) ---")
+    print(f"    orjson: {'あり' if encoding.orjson else 'なし'}  brotli: {'あり' if encoding.brotli else 'なし'}")
+
+    legacy, legacy_ms = timed(
+        lambda: json.dumps(tree, default=str, ensure_ascii=False).encode("utf-8"), args.repeat
+    )
+    print(f"  変更前 (json.dumps, full)         {len(legacy):>11,} bytes  {legacy_ms:8.1f} ms")
+
+    print(f"  {'形式':<8} {'非圧縮':>13} {'gzip':>11} {'br':>11}   {'変換+シリアライズ':>16} {'gzip':>9} {'br':>9}")
+    for fmt in encoding.FORMATS:
+        raw, encode_ms = timed(lambda: encoding.dumps(encoding.shape(tree, fmt)), args.repeat)
+        gz, gzip_ms = timed(lambda: encoding.compress(raw, "gzip"), args.repeat)
+        if encoding.brotli:
+            br, br_ms = timed(lambda: encoding.compress(raw, "br"), args.repeat)
+            br_size, br_time = f"{len(br):,}", f"{br_ms:7.1f}ms"
+        else:
+            br_size, br_time = "-", "-"
+        print(
+            f"  {fmt:<8} {len(raw):>13,} {len(gz):>11,} {br_size:>11}   "
+            f"{encode_ms:14.1f}ms {gzip_ms:7.1f}ms {br_time:>9}"
+        )
+
+    # 2回目以降はエンコード済み本文のキャッシュから返る
+    encoding._encoded_cache.clear()
+    _, first_ms = timed(lambda: encoding.encode_body(tree, "gzip, br", cache_key="bench"), 1)
+    _, cached_ms = timed(lambda: encoding.encode_body(tree, "gzip, br", cache_key="bench"), args.repeat)
+    print(f"  encode_body (full, br): 初回 {first_ms:.1f} ms / キャッシュ {cached_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,627 @@
+"""
+s3_vq_workflow (producer -> SQS -> worker) のオフライン負荷試験
+
+使い方:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_vq_workflow.py [--jobs 2000] [--concurrency 10] [--workers 10] [--batch-size 1]
+
+- DynamoDB / SQS / Secrets Manager はプロセス内の moto (mock_aws)、VQ API はプロセス内の疑似実装を使う (ネットワーク不要)
+- producer に POST を --jobs 件送り、worker が全ジョブを処理し終えるまで SQS からメッセージを受け取って実行する
+  (Lambda のイベントソースマッピングと同じく、最大 --batch-size 件ずつ渡し、成功したメッセージだけ削除する)
+- 遅延・障害の注入
+    --aws-latency-ms      AWS の API 呼び出しごとの遅延
+    --ddb-throttle-rate   DynamoDB の呼び出しが ThrottlingException になる割合 (botocore がリトライする)
+    --vq-latency-ms       VQ API の呼び出しごとの遅延
+    --vq-error-rate       VQ API が 500 を返す割合
+    --vq-processing-polls ジョブが done になるまでのポーリング回数 (0〜この値で一様に決める)
+    --invalid-reply-rate  完了時の結果が不正な JSON になる割合 (worker がジョブを作り直す)
+- 表示する内容
+    スループット、producer / worker の処理時間、ジョブの所要時間 (POST から完了まで)、
+    ジョブあたりの API 呼び出し回数 (AWS / VQ API)、DynamoDB の消費キャパシティ
+- moto の DynamoDB はスレッドセーフではないため、操作は1つずつ実行させている (serialize_moto_dynamodb)
+- DynamoDB の消費キャパシティは moto が返す ConsumedCapacity の合計 (概算。moto は更新を 0.5 として数え、
+  トランザクションは返さないため、トランザクションは書き込み1件あたり 2 として数える)
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import warnings
+import argparse
+import threading
+import functools
+import importlib.util
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVICE_DIR = os.path.join(ROOT, "infrastructure", "services", "s3_vq_workflow")
+LAYER_PATHS = [
+    os.path.join(ROOT, "infrastructure", "layers", "common", "src", "python"),
+    os.path.join(SERVICE_DIR, "layer", "src", "python"),
+]
+
+REGION = "ap-northeast-1"
+JOB_TABLE_NAME = "bench-vq-job"
+SECRET_NAME = "bench-vq-secret"
+API_BASE_URL = "https://vq.bench.local/public-api/v1"
+
+# 読み込み系の DynamoDB 操作 (それ以外は書き込みとして数える)
+READ_OPERATIONS = {"GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems"}
+# エラーを注入したリクエストに付けるヘッダー (moto に処理させない)
+INJECTED_HEADER = "X-Bench-Injected"
+
+VALID_REPLY = json.dumps({
+    "incidents": [{
+        "id": 1,
+        "title": "足場からの墜落",
+        "classification": "墜落・転落",
+        "summary": "高所作業中に足を踏み外した",
+        "cause": "手すりの未設置",
+        "countermeasures": [
+            {"no": 1, "title": "手すり設置", "description": "作業前に手すりを設置する", "responsible": "職長"},
+        ],
+    }],
+}, ensure_ascii=False)
+
+
+class Context:
+    """Lambda の context の代わり"""
+    function_name = "bench-vq"
+    memory_limit_in_mb = 256
+    invoked_function_arn = f"arn:aws:lambda:{REGION}:000000000000:function:bench-vq"
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+# ---------------------------------------------------
+# 疑似 VQ API
+# ---------------------------------------------------
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error (bench)", response=self)
+
+
+class FakeVQApi:
+    """
+    VQ API の疑似実装 (VQClient の http として渡す)
+    POST /auth -> token, POST /message -> tid/mid, GET /message/{tid}/{mid} -> processing / done
+    """
+
+    def __init__(self, rng, latency_ms, error_rate, processing_polls, invalid_reply_rate):
+        self.rng = rng
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.processing_polls = processing_polls
+        self.invalid_reply_rate = invalid_reply_rate
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.jobs = {}
+        self.next_id = 0
+
+    def _call(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+            failed = self.rng.random() < self.error_rate
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        if failed:
+            with self.lock:
+                self.calls[f"{kind} (500)"] += 1
+            return FakeResponse(500, {"error": "injected"})
+        return None
+
+    def post(self, url, json=None, timeout=None):
+        return self._call("auth") or FakeResponse(200, {"token": "bench-token"})
+
+    def request(self, method, url, headers=None, timeout=None, json=None):
+        if method == "POST":
+            return self._call("submit") or self._submit()
+        return self._call("poll") or self._poll(url)
+
+    def _submit(self):
+        with self.lock:
+            self.next_id += 1
+            tid, mid = f"tid-{self.next_id}", f"mid-{self.next_id}"
+            self.jobs[tid] = {
+                "remaining": self.rng.randint(0, self.processing_polls),
+                "invalid": self.rng.random() < self.invalid_reply_rate,
+            }
+        return FakeResponse(200, {"tid": tid, "mid": mid})
+
+    def _poll(self, url):
+        tid = url.rstrip("/").split("/")[-2]
+        with self.lock:
+            job = self.jobs[tid]
+            if job["remaining"] > 0:
+                job["remaining"] -= 1
+                return FakeResponse(200, {"status": "processing"})
+        reply = "```json\n{broken" if job["invalid"] else f"```json\n{VALID_REPLY}\n```"
+        return FakeResponse(200, {"status": "done", "reply": reply})
+
+
+# ---------------------------------------------------
+# AWS 呼び出しの計測・遅延・障害の注入 (botocore のイベント)
+# ---------------------------------------------------
+class RawBody:
+    """botocore の AWSResponse に渡すレスポンス本文"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class AwsInstrumentation:
+    def __init__(self, rng, latency_ms, ddb_throttle_rate):
+        self.rng = rng
+        self.latency_ms = latency_ms
+        self.ddb_throttle_rate = ddb_throttle_rate
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.capacity = Counter()
+
+    def install(self, session):
+        events = session.events
+        events.register("before-call", self.count_call)
+        events.register("before-parameter-build.dynamodb", self.request_capacity)
+        events.register("after-call.dynamodb", self.record_capacity)
+        # moto も before-send で応答を返すため、それより先に実行されるよう先頭に登録する
+        # (botocore は before-send のハンドラーをすべて呼ぶため、注入したリクエストは bypass_moto_for_injected で moto に処理させない)
+        events.register_first("before-send", self.inject)
+
+    def count_call(self, model, **kwargs):
+        with self.lock:
+            self.calls[f"{model.service_model.service_name}.{model.name}"] += 1
+
+    def request_capacity(self, params, model, **kwargs):
+        if "ReturnConsumedCapacity" in model.input_shape.members:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def record_capacity(self, parsed, model, **kwargs):
+        consumed = parsed.get("ConsumedCapacity")
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(c.get("CapacityUnits", 0) for c in consumed or [])
+        if model.name == "TransactWriteItems" and not units:
+            units = 2 * len(kwargs.get("context", {}).get("transact_items", [])) or 0
+        kind = "read" if model.name in READ_OPERATIONS else "write"
+        with self.lock:
+            self.capacity[kind] += units
+
+    def inject(self, request, **kwargs):
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        if self.ddb_throttle_rate and "dynamodb" in request.url and self.rng.random() < self.ddb_throttle_rate:
+            from botocore.awsrequest import AWSResponse
+            request.headers[INJECTED_HEADER] = "1"
+            with self.lock:
+                self.calls["dynamodb (throttled)"] += 1
+            body = json.dumps({
+                "__type": "com.amazonaws.dynamodb.v20120810#ThrottlingException",
+                "message": "injected by bench",
+            }).encode()
+            return AWSResponse(request.url, 400, {"Content-Type": "application/x-amz-json-1.0"}, RawBody(body))
+        return None
+
+
+def count_transact_items(params, context, **kwargs):
+    """TransactWriteItems の件数を after-call に渡す (moto が ConsumedCapacity を返さないため)"""
+    context["transact_items"] = params.get("TransactItems", [])
+
+
+def bypass_moto_for_injected():
+    """エラーを注入したリクエストは moto に処理させない (処理させると、スロットリングにしたはずの書き込みが反映されてしまう)"""
+    from moto.core.botocore_stubber import BotocoreStubber
+
+    stub = BotocoreStubber.__call__
+
+    @functools.wraps(stub)
+    def wrapper(self, event_name, request, **kwargs):
+        if request.headers.get(INJECTED_HEADER):
+            return None
+        return stub(self, event_name, request, **kwargs)
+
+    BotocoreStubber.__call__ = wrapper
+
+
+def serialize_moto_dynamodb():
+    """
+    moto の DynamoDB のリクエストを1つずつ処理させる
+    moto の TransactWriteItems はテーブル全体を複製して失敗時に書き戻すため、並列に動かすと他のスレッドの書き込みが消えたり、
+    書き込み後の応答の作成が他のスレッドの書き込みと重なって失敗し、botocore のリトライで条件付き更新が二重に評価されたりする (本物の DynamoDB では起きない)
+    """
+    from moto.dynamodb.responses import DynamoHandler
+
+    lock = threading.RLock()
+    dispatch = DynamoHandler._dispatch
+
+    @functools.wraps(dispatch)
+    def serialized(self, *args, **kwargs):
+        with lock:
+            return dispatch(self, *args, **kwargs)
+
+    DynamoHandler._dispatch = serialized
+
+
+# ---------------------------------------------------
+# 準備
+# ---------------------------------------------------
+def load_handler(name):
+    """lambda/<name>/main.py を別名のモジュールとして読み込む"""
+    path = os.path.join(SERVICE_DIR, "lambda", name, "main.py")
+    spec = importlib.util.spec_from_file_location(f"vq_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def setup_resources(tenants, visibility_timeout):
+    """テーブル (本番と同じ GSI)・キュー・シークレットを作成する。戻り値: キューの URL"""
+    import boto3
+
+    dynamodb = boto3.client("dynamodb", region_name=REGION)
+    dynamodb.create_table(
+        TableName=JOB_TABLE_NAME,
+        KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": kind}
+            for name, kind in [("job_id", "S"), ("tenant_id", "S"), ("created_at", "N"),
+                               ("terminal_hour", "S"), ("completed_at", "N")]
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "TenantDateIndex",
+                "KeySchema": [{"AttributeName": "tenant_id", "KeyType": "HASH"},
+                              {"AttributeName": "created_at", "KeyType": "RANGE"}],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+            {
+                "IndexName": "TerminalHourIndex",
+                "KeySchema": [{"AttributeName": "terminal_hour", "KeyType": "HASH"},
+                              {"AttributeName": "completed_at", "KeyType": "RANGE"}],
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["tenant_id", "model_id", "status", "latency_ms", "poll_count", "retry_count"],
+                },
+            },
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+    sqs = boto3.client("sqs", region_name=REGION)
+    dlq_url = sqs.create_queue(QueueName="bench-vq-job-dlq")["QueueUrl"]
+    dlq_arn = sqs.get_queue_attributes(QueueUrl=dlq_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    queue_url = sqs.create_queue(
+        QueueName="bench-vq-job-queue",
+        Attributes={
+            "VisibilityTimeout": str(visibility_timeout),
+            "RedrivePolicy": json.dumps({"deadLetterTargetArn": dlq_arn, "maxReceiveCount": 3}),
+        },
+    )["QueueUrl"]
+
+    boto3.client("secretsmanager", region_name=REGION).create_secret(
+        Name=SECRET_NAME,
+        SecretString=json.dumps([
+            {
+                "tenant_id": f"tenant-{i}",
+                "secret_data": {"api_key": f"key-{i}", "login_id": f"login-{i}", "model_id": f"model-{i % 2}"},
+            }
+            for i in range(tenants)
+        ]),
+    )
+    return queue_url, dlq_url
+
+
+def post_event(tenant_id, user_id, message):
+    return {
+        "requestContext": {
+            "http": {"method": "POST"},
+            "authorizer": {"jwt": {"claims": {"sub": user_id, "custom:tenant_id": tenant_id}}},
+        },
+        "body": json.dumps({"message": message}, ensure_ascii=False),
+    }
+
+
+def sqs_record(message):
+    """SQS の受信結果を Lambda のイベントの Records の形式にする"""
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message["Body"],
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": {},
+        "eventSource": "aws:sqs",
+    }
+
+
+# ---------------------------------------------------
+# 実行
+# ---------------------------------------------------
+def run_producer(producer, jobs, tenants, concurrency, rng):
+    """POST を jobs 件送る。戻り値: (処理時間のリスト, ステータスコードの集計, 経過秒数)"""
+    events = [post_event(f"tenant-{i % tenants}", f"user-{i}", f"ヒヤリハット報告 {i} {rng.random()}") for i in range(jobs)]
+    timings = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def invoke(event):
+        started = time.perf_counter()
+        result = producer.lambda_handler(event, Context())
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            timings.append(elapsed)
+            statuses[result["statusCode"]] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(invoke, events))
+    return timings, statuses, time.perf_counter() - started
+
+
+def run_workers(worker, queue_url, workers, batch_size, timeout):
+    """
+    キューが空になるまで worker を実行する
+    戻り値: (呼び出しごとの処理時間のリスト, 呼び出しの結果の集計, 経過秒数)
+    """
+    import boto3
+
+    # ベンチマーク側の受信・削除は計測に含めないよう、別のクライアントを使う
+    sqs = boto3.session.Session(region_name=REGION).client("sqs")
+    timings = []
+    outcomes = Counter()
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def loop():
+        while not done.is_set():
+            messages = sqs.receive_message(
+                QueueUrl=queue_url, MaxNumberOfMessages=batch_size, AttributeNames=["All"],
+            ).get("Messages", [])
+            if not messages:
+                time.sleep(0.05)
+                continue
+
+            records = [sqs_record(message) for message in messages]
+            started = time.perf_counter()
+            try:
+                result = worker.lambda_handler({"Records": records}, Context())
+                failed = {f["itemIdentifier"] for f in (result or {}).get("batchItemFailures", [])}
+                outcome = "partial" if failed else "ok"
+            except Exception:
+                # 例外の場合はバッチ全体が可視性タイムアウト後に再配信される
+                failed = {record["messageId"] for record in records}
+                outcome = "error"
+            elapsed = (time.perf_counter() - started) * 1000
+
+            entries = [
+                {"Id": str(i), "ReceiptHandle": record["receiptHandle"]}
+                for i, record in enumerate(records) if record["messageId"] not in failed
+            ]
+            if entries:
+                sqs.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+            with lock:
+                timings.append(elapsed)
+                outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # 表示中・処理中・遅延中のメッセージがなくなったら終了 (2回続けて確認する)
+    empty_checks = 0
+    names = ["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible", "ApproximateNumberOfMessagesDelayed"]
+    while time.perf_counter() - started < timeout:
+        time.sleep(0.2)
+        attributes = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=names)["Attributes"]
+        empty_checks = empty_checks + 1 if all(attributes.get(name) == "0" for name in names) else 0
+        if empty_checks >= 2:
+            break
+    done.set()
+    for thread in threads:
+        thread.join()
+    return timings, outcomes, time.perf_counter() - started
+
+
+def collect_jobs():
+    """ジョブテーブルの全件 (集計アイテムは除く)"""
+    import boto3
+
+    table = boto3.resource("dynamodb", region_name=REGION).Table(JOB_TABLE_NAME)
+    items = []
+    kwargs = {}
+    while True:
+        resp = table.scan(**kwargs)
+        items.extend(item for item in resp["Items"] if not item["job_id"].startswith("SUMMARY#"))
+        if "LastEvaluatedKey" not in resp:
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+# ---------------------------------------------------
+# 表示
+# ---------------------------------------------------
+def stats(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+def print_stats(label, values, out):
+    s = stats(values)
+    if s["count"]:
+        print(f"{label:<36} {s['count']:>7} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f} {s['max']:>9.1f}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10, help="producer の同時実行数")
+    parser.add_argument("--workers", type=int, default=10, help="worker の同時実行数")
+    parser.add_argument("--batch-size", type=int, default=1, help="worker に一度に渡すメッセージ数 (イベントソースマッピングの batch_size)")
+    parser.add_argument("--polling-interval", type=int, default=0, help="worker の再確認の遅延秒数 (POLLING_INTERVAL)")
+    parser.add_argument("--visibility-timeout", type=int, default=5)
+    parser.add_argument("--aws-latency-ms", type=float, default=0)
+    parser.add_argument("--ddb-throttle-rate", type=float, default=0)
+    parser.add_argument("--vq-latency-ms", type=float, default=0)
+    parser.add_argument("--vq-error-rate", type=float, default=0)
+    parser.add_argument("--vq-processing-polls", type=int, default=2)
+    parser.add_argument("--invalid-reply-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=600, help="worker の処理を打ち切るまでの秒数")
+    parser.add_argument("--aggregate", action="store_true", help="最後に aggregator を実行して集計時間を計測する")
+    parser.add_argument("--json", help="集計結果を JSON で保存するパス")
+    parser.add_argument("--show-logs", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    out = sys.stdout
+    if not args.show_logs:
+        # ログ・メトリクスの JSON 化のコストは計測に含めたいので、出力先だけ捨てる
+        # (powertools の Logger は作成時の sys.stdout に書くため、ハンドラーの読み込み前に差し替える)
+        sys.stdout = open(os.devnull, "w")
+        warnings.simplefilter("ignore")
+
+    os.environ.update({
+        "AWS_DEFAULT_REGION": REGION,
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "JOB_TABLE_NAME": JOB_TABLE_NAME,
+        "VQ_SECRET_ARN": SECRET_NAME,
+        "AUTH_API_URL": f"{API_BASE_URL}/auth",
+        "MESSAGE_API_URL": f"{API_BASE_URL}/message",
+        "CALLBACK_URL": "https://bench.local/webhook",
+        "POLLING_INTERVAL": str(args.polling_interval),
+        "POWERTOOLS_TRACE_DISABLED": "1",
+        "POWERTOOLS_SERVICE_NAME": "bench-vq",
+        "POWERTOOLS_METRICS_NAMESPACE": "bench",
+    })
+    sys.path[0:0] = LAYER_PATHS
+
+    from moto import mock_aws
+
+    rng = random.Random(args.seed)
+    serialize_moto_dynamodb()
+    bypass_moto_for_injected()
+    with mock_aws():
+        queue_url, dlq_url = setup_resources(args.tenants, args.visibility_timeout)
+        os.environ["SQS_QUEUE_URL"] = queue_url
+
+        # ハンドラーが使うクライアントはすべて ndk_common.aws の Session から作られる
+        from ndk_common import aws
+        instrumentation = AwsInstrumentation(rng, args.aws_latency_ms, args.ddb_throttle_rate)
+        instrumentation.install(aws.session())
+        aws.session().events.register("before-parameter-build.dynamodb.TransactWriteItems", count_transact_items)
+
+        vq_api = FakeVQApi(rng, args.vq_latency_ms, args.vq_error_rate, args.vq_processing_polls, args.invalid_reply_rate)
+        producer = load_handler("producer")
+        worker = load_handler("worker")
+        producer.vq._http = vq_api
+        worker.vq._http = vq_api
+
+        producer_ms, post_statuses, producer_elapsed = run_producer(producer, args.jobs, args.tenants, args.concurrency, rng)
+        worker_ms, worker_outcomes, worker_elapsed = run_workers(
+            worker, queue_url, args.workers, args.batch_size, args.timeout)
+
+        aggregate_ms = None
+        if args.aggregate:
+            aggregator = load_handler("aggregator")
+            started = time.perf_counter()
+            aggregator.lambda_handler({}, Context())
+            aggregate_ms = (time.perf_counter() - started) * 1000
+
+        # 集計用の読み込みは計測から外す
+        calls = Counter(instrumentation.calls)
+        capacity = Counter(instrumentation.capacity)
+        items = collect_jobs()
+        import boto3
+        dlq_count = int(boto3.client("sqs", region_name=REGION).get_queue_attributes(
+            QueueUrl=dlq_url, AttributeNames=["ApproximateNumberOfMessages"])["Attributes"]["ApproximateNumberOfMessages"])
+
+    accepted = post_statuses.get(200, 0)
+    statuses = Counter(item["status"] for item in items)
+    terminal = statuses.get("COMPLETED", 0) + statuses.get("FAILED", 0)
+    latency_ms = [float(item["latency_ms"]) for item in items if item.get("latency_ms") is not None]
+    per_job = max(accepted, 1)
+
+    print(f"ジョブ {args.jobs} 件 (受付 {accepted}) / producer 同時実行数 {args.concurrency} / "
+          f"worker 同時実行数 {args.workers} / バッチサイズ {args.batch_size}", file=out)
+    print(f"producer: {producer_elapsed:.1f} 秒 ({args.jobs / producer_elapsed:.1f} 件/秒)  "
+          f"worker: {worker_elapsed:.1f} 秒 ({terminal / max(worker_elapsed, 1e-9):.1f} 件/秒 完了)", file=out)
+    print("POST の結果: " + ", ".join(f"{k}={v}" for k, v in sorted(post_statuses.items())), file=out)
+    print("ジョブの状態: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())) + f", DLQ={dlq_count}", file=out)
+    print("worker の呼び出し: " + ", ".join(f"{k}={v}" for k, v in sorted(worker_outcomes.items())), file=out)
+    print(file=out)
+    print(f"{'(ms)':<36} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}", file=out)
+    print_stats("producer (POST)", producer_ms, out)
+    print_stats(f"worker (batch <= {args.batch_size})", worker_ms, out)
+    print_stats("job latency (POST -> terminal)", latency_ms, out)
+    if aggregate_ms is not None:
+        print_stats("aggregator", [aggregate_ms], out)
+    print(file=out)
+
+    print("ジョブあたりの API 呼び出し回数", file=out)
+    for name, count in sorted(calls.items()):
+        print(f"  {name:<40} {count:>8}  {count / per_job:>7.2f}/job", file=out)
+    for name, count in sorted(vq_api.calls.items()):
+        print(f"  {'vq.' + name:<40} {count:>8}  {count / per_job:>7.2f}/job", file=out)
+    aws_total = sum(count for name, count in calls.items() if "(" not in name)
+    vq_total = sum(count for name, count in vq_api.calls.items() if "(" not in name)
+    print(f"  {'合計 (AWS)':<38} {aws_total:>8}  {aws_total / per_job:>7.2f}/job", file=out)
+    print(f"  {'合計 (VQ API)':<38} {vq_total:>8}  {vq_total / per_job:>7.2f}/job", file=out)
+    print(f"DynamoDB 消費キャパシティ (概算): 読み込み {capacity['read']:.1f} RCU ({capacity['read'] / per_job:.2f}/job), "
+          f"書き込み {capacity['write']:.1f} WCU ({capacity['write'] / per_job:.2f}/job)", file=out)
+
+    if args.json:
+        summary = {
+            "args": vars(args),
+            "accepted": accepted,
+            "statuses": dict(statuses),
+            "dlq": dlq_count,
+            "producer_elapsed_seconds": producer_elapsed,
+            "worker_elapsed_seconds": worker_elapsed,
+            "producer_ms": stats(producer_ms),
+            "worker_ms": stats(worker_ms),
+            "job_latency_ms": stats(latency_ms),
+            "aws_calls": dict(calls),
+            "vq_calls": dict(vq_api.calls),
+            "aws_calls_per_job": aws_total / per_job,
+            "vq_calls_per_job": vq_total / per_job,
+            "capacity": dict(capacity),
+        }
+        if aggregate_ms is not None:
+            summary["aggregator_ms"] = aggregate_ms
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -74,6 +74,14 @@ module "api_gateway" {
   user_pool_client_id = module.auth.user_pool_client_id
 }
 
+# ─────────────────────────────
+# 5-2. 共通 Lambda レイヤー (各サービスの Lambda で共有)
+# ─────────────────────────────
+module "common_layer" {
+  source      = "../../layers/common"
+  name_prefix = "${local.project}-${local.environment}"
+}
+
 # ─────────────────────────────
 # 6. バックエンドサービス (S1 Auth User)
 # ─────────────────────────────
@@ -96,6 +104,9 @@ module "s1_auth_user" {
   # KMS
   lambda_kms_key_arn = module.kms.lambda_key_arn
 
+  # 共通レイヤー (powertools / xray / ndk_common)
+  common_layer_arn = module.common_layer.layer_arn
+
 }
 
 # ─────────────────────────────
@@ -109,6 +120,32 @@ module "s2_tenant_context" {
   # DB情報 (DynamoDBモジュールのoutputsに追加されている前提)
   construction_master_table_name = module.dynamodb.tenant_construction_master_table_name
   construction_master_table_arn  = module.dynamodb.tenant_construction_master_table_arn
+  tenant_user_master_table_name  = module.dynamodb.tenant_user_master_table_name
+  tenant_user_master_table_arn   = module.dynamodb.tenant_user_master_table_arn
+
+  # AGW情報 (共通)
+  api_gateway_id            = module.api_gateway.api_id
+  api_gateway_execution_arn = module.api_gateway.api_execution_arn
+  authorizer_id             = module.api_gateway.authorizer_id
+
+  # KMS
+  lambda_kms_key_arn = module.kms.lambda_key_arn
+
+  # 共通レイヤー (powertools / xray / ndk_common)
+  common_layer_arn = module.common_layer.layer_arn
+}
+
+# ─────────────────────────────
+# 6-3. バックエンドサービス (S5 Log Query)
+# ─────────────────────────────
+module "s5_log_query" {
+  source = "../../services/s5_log-query"
+
+  name_prefix = "${local.project}-${local.environment}-s5-log-query"
+
+  # 参照先DB (S4 Log Archiver の保存先)
+  log_archive_table_name = module.dynamodb.tenant_log_archive_table_name
+  log_archive_table_arn  = module.dynamodb.tenant_log_archive_table_arn
 
   # AGW情報 (共通)
   api_gateway_id            = module.api_gateway.api_id
@@ -117,6 +154,9 @@ module "s2_tenant_context" {
 
   # KMS
   lambda_kms_key_arn = module.kms.lambda_key_arn
+
+  # 共通レイヤー (powertools / xray / ndk_common)
+  common_layer_arn = module.common_layer.layer_arn
 }
 
 # ─────────────────────────────
@@ -255,6 +295,9 @@ module "s3_vq_workflow" {
 
   # KMS
   lambda_kms_key_arn = module.kms.lambda_key_arn
+
+  # 共通レイヤー (powertools / xray / ndk_common)
+  common_layer_arn = module.common_layer.layer_arn
 }
 
 # ─────────────────────────────
@@ -270,6 +313,13 @@ module "s4_log_archiver" {
   log_archive_table_name = module.dynamodb.tenant_log_archive_table_name
   log_archive_table_arn  = module.dynamodb.tenant_log_archive_table_arn
 
+  # コールド層 (Parquet) の保存先
+  cold_tier_bucket_name = module.s3_log_archive.bucket_name
+  cold_tier_bucket_arn  = module.s3_log_archive.bucket_arn
+
+  # pyarrow レイヤーの ZIP のアップロード先 (バージョニング有効・ライフサイクルルールの対象外のプレフィックス)
+  artifact_bucket_name = module.s3_log_archive.bucket_name
+
   # 収集対象のロググループ (s1, s2, s3...)
   target_log_group_names = [
     "/aws/lambda/${local.project}-${local.environment}-s1-auth-user",
@@ -277,6 +327,7 @@ module "s4_log_archiver" {
     "/aws/lambda/${local.project}-${local.environment}-s3-vq-producer",
     "/aws/lambda/${local.project}-${local.environment}-s3-vq-worker",
     "/aws/lambda/${local.project}-${local.environment}-s4-log",
+    "/aws/lambda/${local.project}-${local.environment}-s5-log-query",
     "/aws/lambda/${local.project}-${local.environment}-auth-create-challenge",
     "/aws/lambda/${local.project}-${local.environment}-auth-define-auth",
     "/aws/lambda/${local.project}-${local.environment}-auth-verify-challenge"
@@ -287,6 +338,9 @@ module "s4_log_archiver" {
   # KMS
   lambda_kms_key_arn = module.kms.lambda_key_arn
 
+  # 共通レイヤー (powertools / xray / ndk_common)
+  common_layer_arn = module.common_layer.layer_arn
+
 }
 
 module "s3_log_archive" {
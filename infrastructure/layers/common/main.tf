@@ -0,0 +1,63 @@
+# ─────────────────────────────
+# 全サービス共通の Lambda レイヤー
+#  - ndk_common (遅延生成の boto3 クライアント・遅延 import)
+#  - aws-lambda-powertools / aws-xray-sdk
+# 各サービスの ZIP から共通ライブラリを外し、コードの ZIP を小さくする (コールドスタート対策)
+# ─────────────────────────────
+locals {
+  # レイヤーのZIPは python/ 以下が /opt/python に展開され、sys.path に追加される
+  layer_src_dir = "${path.module}/src"
+}
+
+# ─────────────────────────────
+# 依存ライブラリのインストール（ローカルで pip 実行）
+# ─────────────────────────────
+resource "null_resource" "layer_deps" {
+  # requirements.txt が変わったら再実行
+  triggers = {
+    requirements = filesha256("${path.module}/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    working_dir = local.layer_src_dir
+
+    command = <<-EOT
+      echo "[layer common] install deps with pip"
+
+      # 念のため過去の依存を掃除 (ndk_common 以外)
+      find python -mindepth 1 -maxdepth 1 ! -name ndk_common -exec rm -rf {} +
+
+      pip install -r ../requirements.txt -t python
+
+      # boto3 / botocore はランタイムに含まれるため、レイヤーには入れない
+      # (aws-xray-sdk の依存で入ってしまう。入れると展開サイズが大きくなりコールドスタートが遅くなる)
+      rm -rf python/boto3* python/botocore* python/s3transfer* python/jmespath* \
+        python/dateutil python/python_dateutil* python/urllib3* python/six.py python/six-*
+
+      echo "[layer common] deps installed"
+    EOT
+  }
+}
+
+# ─────────────────────────────
+# レイヤーのZIP化
+# ─────────────────────────────
+data "archive_file" "layer_zip" {
+  type        = "zip"
+  source_dir  = local.layer_src_dir
+  output_path = "${path.module}/layer_payload.zip"
+  excludes    = ["**/__pycache__", "python/*.dist-info", "**/.DS_Store", ".gitkeep"]
+
+  # 先に pip 実行してから ZIP させる
+  depends_on = [null_resource.layer_deps]
+}
+
+resource "aws_lambda_layer_version" "this" {
+  layer_name          = "${var.name_prefix}-common"
+  description         = "ndk_common + aws-lambda-powertools + aws-xray-sdk"
+  filename            = data.archive_file.layer_zip.output_path
+  source_code_hash    = data.archive_file.layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.12"]
+  # 純粋な Python のライブラリのみのため、両アーキテクチャで共用する
+  compatible_architectures = ["arm64", "x86_64"]
+}
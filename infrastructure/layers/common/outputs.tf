@@ -0,0 +1,4 @@
+output "layer_arn" {
+  description = "共通レイヤーの ARN (バージョン付き)"
+  value       = aws_lambda_layer_version.this.arn
+}
@@ -0,0 +1,10 @@
+"""
+全サービス共通のLambdaレイヤー (コールドスタート対策)
+
+- aws: boto3 のクライアント・テーブルを最初に使うときに作成する (接続プール等を調整した共通設定)
+- lazy: 重いモジュールの import を最初に使うときまで遅らせる
+- etag: ETag の作成と If-None-Match の照合 (s1 / s2 で同じユーザー情報に同じ ETag を返す)
+- timing: 処理段階ごとの所要時間を CloudWatch メトリクス (EMF) と X-Ray のサブセグメントに出力する
+
+このパッケージ自体は import 時に何も読み込まない
+"""
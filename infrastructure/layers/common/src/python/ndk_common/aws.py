@@ -0,0 +1,87 @@
+"""
+boto3 クライアント・リソースの共通生成
+
+- import 時には boto3 を読み込まない (最初に client() / table() を呼んだときに読み込む)
+- 作成したクライアントはコンテナ内で使い回す (ウォームスタート時は作り直さない)
+- 接続プール・タイムアウト・リトライを調整した共通の Config を使う (環境変数で変更可)
+- クライアントはスレッドセーフなので全スレッドで共有し、リソース (Table) はスレッドごとに作成する
+"""
+import os
+import threading
+
+# ThreadPoolExecutor で並列に呼び出す関数があるため、既定 (10) より多めにする
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "25"))
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get("AWS_CONNECT_TIMEOUT_SECONDS", "3"))
+READ_TIMEOUT_SECONDS = float(os.environ.get("AWS_READ_TIMEOUT_SECONDS", "10"))
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "3"))
+
+# boto3 の Session はスレッドセーフではないため、クライアントの作成はロックして行う
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_thread_local = threading.local()
+
+
+def config(**overrides):
+    """共通の botocore Config (overrides で一部の設定を上書きできる)"""
+    from botocore.config import Config
+
+    base = Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+        read_timeout=READ_TIMEOUT_SECONDS,
+        retries={"mode": "standard", "max_attempts": MAX_ATTEMPTS},
+        tcp_keepalive=True,
+    )
+    return base.merge(Config(**overrides)) if overrides else base
+
+
+def session():
+    """コンテナ内で共有する boto3 の Session"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+                _session = boto3.session.Session()
+    return _session
+
+
+def client(service_name: str, **config_overrides):
+    """
+    共有のクライアントを返す (初回だけ作成する)
+    config_overrides が異なる場合は別のクライアントとして作成する
+    """
+    key = (service_name, repr(sorted(config_overrides.items())))
+    found = _clients.get(key)
+    if found is None:
+        with _lock:
+            found = _clients.get(key)
+            if found is None:
+                found = session().client(service_name, config=config(**config_overrides))
+                _clients[key] = found
+    return found
+
+
+def resource(service_name: str):
+    """呼び出したスレッド用のリソースを返す (初回だけ作成する)"""
+    resources = getattr(_thread_local, "resources", None)
+    if resources is None:
+        resources = _thread_local.resources = {}
+    found = resources.get(service_name)
+    if found is None:
+        with _lock:
+            found = session().resource(service_name, config=config())
+        resources[service_name] = found
+    return found
+
+
+def table(table_name: str):
+    """呼び出したスレッド用の DynamoDB テーブルを返す"""
+    tables = getattr(_thread_local, "tables", None)
+    if tables is None:
+        tables = _thread_local.tables = {}
+    found = tables.get(table_name)
+    if found is None:
+        found = tables[table_name] = resource("dynamodb").Table(table_name)
+    return found
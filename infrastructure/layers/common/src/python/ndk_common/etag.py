@@ -0,0 +1,28 @@
+"""
+ETag の作成と If-None-Match の照合
+s1_auth-user (GET /me) と s2_tenant-context (GET /bootstrap) が同じユーザー情報に同じ ETag を返すよう、作り方をここにまとめる
+"""
+import json
+import hashlib
+
+
+def make_etag(tenant_id: str, user_id: str, item: dict | None) -> str:
+    """ユーザー情報アイテムのバージョン (version -> updated_at -> 内容のハッシュ) から ETag を作成"""
+    if item is None:
+        version = "none"
+    elif item.get("version") is not None:
+        version = f"v{item['version']}"
+    elif item.get("updated_at"):
+        version = f"u{item['updated_at']}"
+    else:
+        version = "h" + hashlib.sha1(json.dumps(item, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+    digest = hashlib.sha1(f"{tenant_id}|{user_id}|{version}".encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match ヘッダーに ETag が含まれるか (弱いETag W/ も同一とみなす)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,27 @@
+"""
+重いモジュールの遅延 import
+GET のように一部の経路でしか使わないモジュール (requests など) を、
+最初に属性へアクセスしたときに読み込む (importlib.util.LazyLoader を使用)
+"""
+import sys
+import importlib.util
+
+
+def lazy_import(name: str):
+    """
+    モジュールを遅延 import する (既に読み込まれていればそれを返す)
+    使い方: requests = lazy_import("requests")  # requests.post(...) の時点で読み込まれる
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,95 @@
+"""
+処理段階ごとの所要時間の計測
+
+- stage("VqSubmit") / @timed("VqSubmit") で囲んだ処理の時間を
+  CloudWatch メトリクス (powertools Metrics の EMF 形式、"<段階名>Duration" ミリ秒) と X-Ray のサブセグメント ("## <段階名>") に出力する
+- 出力するかどうかは呼び出しごとに TIMING_SAMPLE_RATE (0〜1) の確率で決める (@sample_invocation をハンドラーに付ける)
+  付けていない場合は常に出力する
+- メトリクスはハンドラーの @metrics.log_metrics で出力される
+  (powertools の Metrics は同じ名前空間のインスタンス間で値を共有するため、ハンドラー側の Metrics() でまとめて出力される)
+- 呼び出し中の段階ごとの合計時間は durations() で取得できる (ログ出力用)
+"""
+import os
+import time
+import random
+import threading
+import functools
+from contextlib import contextmanager
+
+SAMPLE_RATE = float(os.environ.get("TIMING_SAMPLE_RATE", "1"))
+
+_lock = threading.Lock()
+_sampled = True
+_durations = {}
+_metrics = None
+_tracer = None
+
+
+def _providers():
+    """powertools の Metrics / Tracer (最初に使うときに作成する)"""
+    global _metrics, _tracer
+    if _metrics is None:
+        with _lock:
+            if _metrics is None:
+                from aws_lambda_powertools import Metrics, Tracer
+                _tracer = Tracer()
+                _metrics = Metrics()
+    return _metrics, _tracer
+
+
+def sample_invocation(handler):
+    """ハンドラー用のデコレーター: この呼び出しで計測値を出力するかを決め、前回の合計時間を消す"""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _sampled
+        _sampled = SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+        _durations.clear()
+        return handler(event, context)
+
+    return wrapper
+
+
+def _record(name: str, elapsed_ms: float) -> None:
+    from aws_lambda_powertools.metrics import MetricUnit
+
+    metrics, _ = _providers()
+    with _lock:
+        _durations[name] = round(_durations.get(name, 0.0) + elapsed_ms, 1)
+        metrics.add_metric(name=f"{name}Duration", unit=MetricUnit.Milliseconds, value=round(elapsed_ms, 1))
+
+
+@contextmanager
+def stage(name: str):
+    """with 文で囲んだ処理の時間を計測する (サンプリングされなかった呼び出しでは何もしない)"""
+    if not _sampled:
+        yield
+        return
+
+    _, tracer = _providers()
+    started = time.perf_counter()
+    with tracer.provider.in_subsegment(f"## {name}"):
+        try:
+            yield
+        finally:
+            _record(name, (time.perf_counter() - started) * 1000)
+
+
+def timed(name: str):
+    """関数全体を stage(name) で計測するデコレーター"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def durations() -> dict:
+    """この呼び出しで計測した段階ごとの合計時間 (ミリ秒)"""
+    with _lock:
+        return dict(_durations)
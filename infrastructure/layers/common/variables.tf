@@ -0,0 +1,4 @@
+variable "name_prefix" {
+  description = "Resource name prefix (e.g. ndk-ky-system-dev)"
+  type        = string
+}
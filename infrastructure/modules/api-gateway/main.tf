@@ -15,9 +15,13 @@ resource "aws_apigatewayv2_api" "this" {
       "X-Amz-Date",
       "X-Api-Key",
       "X-Amz-Security-Token",
-      "tenant-id"
+      "tenant-id",
+      "If-None-Match" # 工事マスタの条件付き取得 (304)
     ]
 
+    # フロントエンドから参照するレスポンスヘッダー
+    expose_headers = ["ETag"]
+
     allow_credentials = true
 
     max_age           = 300
@@ -17,6 +17,38 @@ resource "aws_dynamodb_table" "tenant_log_archive" {
     type = "N" # UNIX Timestamp
   }
 
+  # GSI用の複合キー: "<tenant_id>#<値>" (アーカイバーが書き込む)
+  attribute {
+    name = "tenant_action_category"
+    type = "S"
+  }
+
+  attribute {
+    name = "tenant_level"
+    type = "S"
+  }
+
+  # ─────────────────────────────
+  # Global Secondary Indexes (GSI)
+  # ─────────────────────────────
+  # ログ参照API (s5) で action_category / level を絞り込むためのインデックス
+  # 画面表示に必要な項目のみ射影してインデックスを小さく保つ
+  global_secondary_index {
+    name               = "TenantActionCategoryIndex"
+    hash_key           = "tenant_action_category"
+    range_key          = "timestamp"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["tenant_id", "level", "message", "user_id", "function_name", "action_category"]
+  }
+
+  global_secondary_index {
+    name               = "TenantLevelIndex"
+    hash_key           = "tenant_level"
+    range_key          = "timestamp"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["tenant_id", "level", "message", "user_id", "function_name", "action_category"]
+  }
+
   # TTL (Time To Live): 90日後に自動削除
   ttl {
     attribute_name = "expires_at"
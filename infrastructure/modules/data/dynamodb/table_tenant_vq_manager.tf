@@ -26,6 +26,16 @@ resource "aws_dynamodb_table" "tenant_vq_manager" {
     type = "N"
   }
 
+  attribute {
+    name = "terminal_hour"
+    type = "S"
+  }
+
+  attribute {
+    name = "completed_at"
+    type = "N"
+  }
+
   # ─────────────────────────────
   # Global Secondary Indexes (GSI)
   # ─────────────────────────────
@@ -38,6 +48,17 @@ resource "aws_dynamodb_table" "tenant_vq_manager" {
     projection_type = "ALL"
   }
 
+  # 完了・失敗したジョブを時間帯 (UTC, 例: 2024-01-01T09) ごとに引くためのインデックス
+  # worker が完了時に terminal_hour を書き込んだジョブだけが載る (スパースインデックス)
+  # Use case: 所要時間の定期集計 (s3_vq_workflow の aggregator)
+  global_secondary_index {
+    name               = "TerminalHourIndex"
+    hash_key           = "terminal_hour"
+    range_key          = "completed_at"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["tenant_id", "model_id", "status", "latency_ms", "poll_count", "retry_count"]
+  }
+
   # ─────────────────────────────
   # Settings
   # ─────────────────────────────
@@ -86,6 +86,11 @@ resource "aws_s3_bucket_lifecycle_configuration" "log_archive" {
     id     = "archive-old-logs"
     status = "Enabled"
 
+    # CloudTrail の出力先のみ対象 (コールド層のParquetは下のルールで管理)
+    filter {
+      prefix = "AWSLogs/"
+    }
+
     transition {
       days          = 90
       storage_class = "GLACIER"
@@ -95,4 +100,24 @@ resource "aws_s3_bucket_lifecycle_configuration" "log_archive" {
       days = 365
     }
   }
+
+  # アプリログのコールド層 (s4_log-archiver が出力する Parquet)
+  # 監査時にそのまま読めるよう、即時取り出し可能な Glacier Instant Retrieval に移行する
+  rule {
+    id     = "cold-tier-logs"
+    status = "Enabled"
+
+    filter {
+      prefix = "log-archive/"
+    }
+
+    transition {
+      days          = 90
+      storage_class = "GLACIER_IR"
+    }
+
+    expiration {
+      days = 365
+    }
+  }
 }
\ No newline at end of file
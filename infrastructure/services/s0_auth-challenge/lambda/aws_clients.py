@@ -0,0 +1,18 @@
+"""
+AWS クライアントの遅延生成 (s0 の各 Lambda で共通)
+import 時には作成せず、使う経路でだけ初回に作成してウォームスタート時は使い回す
+(例: create_challenge は SQS 経由で送る場合、SES のクライアントを作らない)
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def client(service_name: str):
+    import boto3
+    return boto3.client(service_name)
+
+
+@lru_cache(maxsize=None)
+def table(table_name: str):
+    import boto3
+    return boto3.resource("dynamodb").Table(table_name)
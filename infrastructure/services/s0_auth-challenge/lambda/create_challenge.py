@@ -1,74 +1,154 @@
 """
 Create Auth Challenge Lambda
-OTPコードを生成し、メール送信し、DynamoDBに保存
+OTPコードを生成し、DynamoDBに保存 (コードはハッシュ化して保存) し、メール送信を依頼する
+
+OTP_QUEUE_URL が設定されている場合はメール送信を SQS に積むだけにして、
+SES の送信は send_otp_worker に任せる (SES の遅延・一時障害がサインインに影響しないようにする)
+未設定の場合、または SQS への送信に失敗した場合はこの Lambda から直接 SES で送信する
+
+発行済みのコードが再利用できる間は新しいコードを発行しない (再発行ポリシーは otp_policy を参照)
 """
 import os
 import json
-import random
+import secrets
 import time
-import boto3
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer
 
+import aws_clients
+from otp_hash import hash_otp
+from otp_mail import send_otp_mail
+from otp_policy import (
+    STATUS_SENT, STATUS_REUSED, STATUS_COOLDOWN,
+    is_reusable, check_send_rate, put_if_not_reusable, seconds_left,
+)
+
 logger = Logger()
 tracer = Tracer()
 
-# AWS クライアント
-ses = boto3.client("ses")
-dynamodb = boto3.resource("dynamodb")
-
 # 環境変数
 OTP_TABLE_NAME = os.environ.get("OTP_TABLE_NAME")
-SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
+OTP_QUEUE_URL = os.environ.get("OTP_QUEUE_URL")
 OTP_LENGTH = int(os.environ.get("OTP_LENGTH", "6"))
 OTP_EXPIRY_SECONDS = int(os.environ.get("OTP_EXPIRY_SECONDS", "300"))  # 5分
+MAX_ATTEMPTS = int(os.environ.get("MAX_ATTEMPTS", "3"))  # verify_challenge と同じ値にする
 
 
 def generate_otp(length: int = 6) -> str:
     """6桁のOTPコードを生成"""
-    return "".join([str(random.randint(0, 9)) for _ in range(length)])
+    return "".join(str(secrets.randbelow(10)) for _ in range(length))
 
 
-def save_otp_to_dynamodb(tenant_id: str, email: str, otp: str, user_id: str) -> None:
-    """OTPコードをDynamoDBに保存"""
-    table = dynamodb.Table(OTP_TABLE_NAME)
+def get_current_otp(tenant_id: str, email: str) -> dict | None:
+    """発行済みのOTPレコードを取得"""
+    table = aws_clients.table(OTP_TABLE_NAME)
+    response = table.get_item(
+        Key={"tenant_id": tenant_id, "email": email},
+        ConsistentRead=True,
+    )
+    return response.get("Item")
+
+
+def save_otp_to_dynamodb(tenant_id: str, email: str, otp: str, user_id: str, now: int) -> dict | None:
+    """
+    OTPコードをDynamoDBに保存 (平文は保存せず、ハッシュだけを保存する)
+    並行して別のコードが発行されていた場合は上書きせず、そのレコードを返す
+    """
+    table = aws_clients.table(OTP_TABLE_NAME)
 
-    current_time = int(time.time())
-    expires_at = current_time + OTP_EXPIRY_SECONDS
+    expires_at = now + OTP_EXPIRY_SECONDS
 
-    table.put_item(
-        Item={
+    existing = put_if_not_reusable(
+        table,
+        {
             "tenant_id": tenant_id,
             "email": email,
-            "otp_code": otp,
+            "otp_hash": hash_otp(tenant_id, email, otp),
             "user_id": user_id,
-            "created_at": current_time,
+            "created_at": now,
             "expires_at": expires_at,
             "attempts": 0,
-        }
+        },
+        MAX_ATTEMPTS,
     )
-    logger.info("OTPをDynamoDBに保存しました", action_category="AUTH", expires_at=expires_at)
+    if existing is None:
+        logger.info("OTPをDynamoDBに保存しました", action_category="AUTH", expires_at=expires_at)
+    return existing
+
+
+def issue_otp(tenant_id: str, email: str, user_id: str) -> dict:
+    """
+    再発行ポリシーに従ってOTPを発行する
+    戻り値: {"status": SENT | REUSED | COOLDOWN, "expires_in": 秒, "cooldown": 秒}
+    """
+    now = int(time.time())
+
+    # 1. 再利用できるコードがあれば、書き込みも送信もしない
+    current = get_current_otp(tenant_id, email)
+    if is_reusable(current, now, MAX_ATTEMPTS):
+        logger.info("発行済みのOTPを再利用します", action_category="AUTH")
+        return {"status": STATUS_REUSED, "expires_in": seconds_left(current, now), "cooldown": 0}
+
+    # 2. 発行回数の制限 (有効期限内のコードがある場合は再発行として数える)
+    table = aws_clients.table(OTP_TABLE_NAME)
+    reissue = current is not None and seconds_left(current, now) > 0
+    cooldown = check_send_rate(table, tenant_id, email, now, reissue)
+    if cooldown:
+        logger.warning("OTPの発行回数が上限に達しました", action_category="AUTH", cooldown_seconds=cooldown)
+        # 使い切っていない有効なコードがあれば、引き続きそれを使える
+        usable = current is not None and int(current.get("attempts", 0)) < MAX_ATTEMPTS
+        return {
+            "status": STATUS_COOLDOWN,
+            "expires_in": seconds_left(current, now) if usable else 0,
+            "cooldown": cooldown,
+        }
+
+    # 3. 新しいコードを発行
+    otp = generate_otp(OTP_LENGTH)
+    logger.info("OTPを生成しました", action_category="AUTH", otp_length=OTP_LENGTH)
+
+    existing = save_otp_to_dynamodb(tenant_id, email, otp, user_id, now)
+    if existing is not None:
+        logger.info("並行して発行されたOTPを再利用します", action_category="AUTH")
+        return {"status": STATUS_REUSED, "expires_in": seconds_left(existing, now), "cooldown": 0}
+
+    # 4. メール送信
+    deliver_otp(tenant_id, email, otp, now + OTP_EXPIRY_SECONDS)
+    return {"status": STATUS_SENT, "expires_in": OTP_EXPIRY_SECONDS, "cooldown": 0}
 
 
 def send_otp_email(email: str, otp: str) -> None:
-    """OTPコードをメールで送信"""
-    subject = "【認証コード】ログイン確認"
+    """OTPコードをメールで送信 (同期)"""
+    send_otp_mail(aws_clients.client("ses"), email, otp)
+    logger.info("OTPメールを送信しました", action_category="AUTH", email=email)
 
-    # プレーンテキスト版（シンプルに）
-    body_text = (otp
-    )
 
-    ses.send_email(
-        Source=SENDER_EMAIL,
-        Destination={"ToAddresses": [email]},
-        Message={
-            "Subject": {"Data": subject, "Charset": "UTF-8"},
-            "Body": {
-                "Text": {"Data": body_text, "Charset": "UTF-8"},
-            },
-        },
+def enqueue_otp_email(tenant_id: str, email: str, otp: str, expires_at: int) -> None:
+    """OTPメールの送信依頼をSQSに登録"""
+    aws_clients.client("sqs").send_message(
+        QueueUrl=OTP_QUEUE_URL,
+        MessageBody=json.dumps({
+            "tenant_id": tenant_id,
+            "email": email,
+            "otp": otp,
+            "expires_at": expires_at,
+            # ワーカーで送信までの遅延を計測するため (ミリ秒)
+            "requested_at_ms": int(time.time() * 1000),
+        }),
     )
-    logger.info("OTPメールを送信しました", action_category="AUTH", email=email)
+    logger.info("OTPメールの送信依頼を登録しました", action_category="AUTH")
+
+
+def deliver_otp(tenant_id: str, email: str, otp: str, expires_at: int) -> None:
+    """キューがあれば送信依頼を登録し、なければ (または登録に失敗したら) 直接送信する"""
+    if OTP_QUEUE_URL:
+        try:
+            enqueue_otp_email(tenant_id, email, otp, expires_at)
+            return
+        except ClientError:
+            logger.exception("送信依頼の登録に失敗したため、直接送信します", action_category="ERROR")
+
+    send_otp_email(email, otp)
 
 
 @tracer.capture_lambda_handler
@@ -77,10 +157,11 @@ def lambda_handler(event, context):
     """
     OTPチャレンジの作成
 
-    1. OTPコード生成（6桁）
-    2. DynamoDBに保存（TTL付き）
-    3. SESでメール送信
-    4. Cognitoにチャレンジパラメータを返却
+    1. 発行済みのコードが再利用できればそれを使う
+    2. 発行回数の上限を超えていればクールダウン (発行しない)
+    3. OTPコード生成（6桁）、DynamoDBに保存（TTL付き）
+    4. メール送信 (SQS経由、またはSESで直接送信)
+    5. Cognitoにチャレンジパラメータを返却
     """
     request = event.get("request", {})
     user_attributes = request.get("userAttributes", {})
@@ -98,33 +179,30 @@ def lambda_handler(event, context):
         raise ValueError("Email is required for OTP authentication")
 
     try:
-        # 1. OTP生成
-        otp = generate_otp(OTP_LENGTH)
-        logger.info("OTPを生成しました", action_category="AUTH", otp_length=OTP_LENGTH)
-
-        # 2. DynamoDBに保存
-        save_otp_to_dynamodb(tenant_id, email, otp, user_id)
-
-        # 3. メール送信
-        send_otp_email(email, otp)
+        # 1〜4. OTPの発行 (再利用・クールダウンを含む)
+        result = issue_otp(tenant_id, email, user_id)
 
-        # 4. レスポンス設定
+        # 5. レスポンス設定
         response = event.get("response", {})
 
         # publicChallengeParameters: クライアントに返す情報（OTPは含めない）
         response["publicChallengeParameters"] = {
             "email": email,
             "maskedEmail": mask_email(email),
+            # 画面表示用 (SENT: 新しいコードを送信 / REUSED: 送信済みのコードを使う / COOLDOWN: しばらく再送信できない)
+            "otpStatus": result["status"],
+            "expiresIn": str(result["expires_in"]),
+            "cooldownSeconds": str(result["cooldown"]),
         }
 
         # privateChallengeParameters: 検証時に使用（内部用）
+        # OTPはDynamoDBのハッシュだけで検証するため、平文は渡さない
         response["privateChallengeParameters"] = {
-            "answer": otp,
             "tenant_id": tenant_id,
         }
 
         event["response"] = response
-        logger.info("OTPチャレンジ作成完了", action_category="AUTH")
+        logger.info("OTPチャレンジ作成完了", action_category="AUTH", otp_status=result["status"])
 
     except ClientError as e:
         logger.exception("AWSサービスエラーが発生しました", action_category="ERROR")
@@ -0,0 +1,32 @@
+"""
+OTPコードのハッシュ化 (create_challenge / verify_challenge で共通)
+DynamoDB には平文のコードを保存せず、HMAC-SHA256 (テナント・メールアドレスに紐付け) を保存する
+検証時は入力値を同じ方法でハッシュ化し、DynamoDB の条件式で比較する
+
+OTP_PEPPER が未設定の場合はハッシュを作らずに例外にする (空のキーで保存・検証を続けない)
+"""
+import os
+import hmac
+import hashlib
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+# ハッシュ用の秘密値 (ペッパー)。テーブルの中身だけが漏れてもコードを総当たりできないようにする
+OTP_PEPPER = os.environ.get("OTP_PEPPER", "")
+
+if not OTP_PEPPER:
+    logger.error("OTP_PEPPER が設定されていません。OTPの発行・検証はすべて失敗します", action_category="ERROR")
+
+
+class MissingPepperError(RuntimeError):
+    """OTP_PEPPER が設定されていない"""
+
+
+def hash_otp(tenant_id: str, email: str, otp: str) -> str:
+    """OTPコードのハッシュ (同じコードでもテナント・メールアドレスが違えば別の値になる)"""
+    if not OTP_PEPPER:
+        raise MissingPepperError("OTP_PEPPER is not set")
+    message = f"{tenant_id}:{email.lower()}:{otp}".encode("utf-8")
+    return hmac.new(OTP_PEPPER.encode("utf-8"), message, hashlib.sha256).hexdigest()
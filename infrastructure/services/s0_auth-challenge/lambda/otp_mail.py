@@ -0,0 +1,29 @@
+"""
+OTPメールの作成・送信 (create_challenge の同期送信 / send_otp_worker の非同期送信で共通)
+"""
+import os
+
+SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
+
+SUBJECT = "【認証コード】ログイン確認"
+
+# SES のスロットリング系エラー (待ってからリトライすれば送れるもの)
+RETRYABLE_ERROR_CODES = {"Throttling", "ThrottlingException", "MaxSendingRateExceeded", "ServiceUnavailable"}
+
+
+def send_otp_mail(ses, email: str, otp: str) -> str:
+    """OTPコードをメールで送信し、SES の MessageId を返す"""
+    # プレーンテキスト版（シンプルに）
+    body_text = otp
+
+    response = ses.send_email(
+        Source=SENDER_EMAIL,
+        Destination={"ToAddresses": [email]},
+        Message={
+            "Subject": {"Data": SUBJECT, "Charset": "UTF-8"},
+            "Body": {
+                "Text": {"Data": body_text, "Charset": "UTF-8"},
+            },
+        },
+    )
+    return response.get("MessageId")
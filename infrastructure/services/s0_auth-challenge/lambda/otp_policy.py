@@ -0,0 +1,121 @@
+"""
+OTPの再発行ポリシー (create_challenge から使用)
+
+CreateAuthChallenge は再送信 (RESEND) だけでなく、コード不一致のたびにも呼ばれるため、
+毎回コードを作り直してメールを送ると SES とテーブルへの書き込みが膨らむ
+
+- 再利用: 有効期限内・試行回数が上限未満で、発行から OTP_REUSE_WINDOW_SECONDS 以内のコードがあれば、
+  新しいコードを発行せずそのまま使わせる (書き込みもメール送信もしない)
+- 送信回数の制限: メールアドレスごと・テナントごとの発行回数を固定ウィンドウのカウンター (ADD による原子的な加算) で数え、
+  上限を超えたらクールダウンとして発行しない
+  テナントの上限は再発行 (有効期限内のコードがあるのに作り直す場合) にだけ適用する
+  (朝の一斉ログインなど、初回のサインインをテナント単位で止めないため)
+  カウンターは OTP テーブルに RATE# で始まるソートキーのアイテムとして保存し、TTL (expires_at) で削除させる
+"""
+import os
+
+from botocore.exceptions import ClientError
+
+# 発行から何秒以内ならコードを再利用するか (0 で再利用しない)
+OTP_REUSE_WINDOW_SECONDS = int(os.environ.get("OTP_REUSE_WINDOW_SECONDS", "60"))
+
+# メールアドレスごとの発行回数の上限 (ウィンドウ内)。0 で制限しない
+OTP_SEND_LIMIT_PER_EMAIL = int(os.environ.get("OTP_SEND_LIMIT_PER_EMAIL", "5"))
+OTP_SEND_LIMIT_EMAIL_WINDOW_SECONDS = int(os.environ.get("OTP_SEND_LIMIT_EMAIL_WINDOW_SECONDS", "900"))
+
+# テナントごとの再発行回数の上限 (ウィンドウ内)。0 で制限しない
+OTP_SEND_LIMIT_PER_TENANT = int(os.environ.get("OTP_SEND_LIMIT_PER_TENANT", "300"))
+OTP_SEND_LIMIT_TENANT_WINDOW_SECONDS = int(os.environ.get("OTP_SEND_LIMIT_TENANT_WINDOW_SECONDS", "60"))
+
+# OTP レコードの状態
+STATUS_SENT = "SENT"
+STATUS_REUSED = "REUSED"
+STATUS_COOLDOWN = "COOLDOWN"
+
+
+def is_reusable(item: dict | None, now: int, max_attempts: int) -> bool:
+    """既存のOTPレコードをそのまま使わせてよいか"""
+    if not item or "otp_hash" not in item or OTP_REUSE_WINDOW_SECONDS <= 0:
+        return False
+    return (
+        int(item.get("expires_at", 0)) >= now
+        and int(item.get("attempts", 0)) < max_attempts
+        and int(item.get("created_at", 0)) + OTP_REUSE_WINDOW_SECONDS > now
+    )
+
+
+def reusable_condition(now: int, max_attempts: int) -> tuple:
+    """
+    is_reusable の否定を条件式にしたもの (put_item の ConditionExpression 用)
+    並行して発行が走った場合に、相手が書いたばかりのコードを上書きしないようにする
+    """
+    expression = (
+        "attribute_not_exists(otp_hash) OR expires_at < :now"
+        " OR attempts >= :max OR created_at <= :reuse_from"
+    )
+    values = {":now": now, ":max": max_attempts, ":reuse_from": now - OTP_REUSE_WINDOW_SECONDS}
+    return expression, values
+
+
+def _increment(table, tenant_id: str, sort_key: str, window_seconds: int, now: int) -> tuple:
+    """固定ウィンドウのカウンターを +1 する。戻り値: (加算後の回数, ウィンドウ終了までの秒数)"""
+    window_start = now - now % window_seconds
+    window_end = window_start + window_seconds
+    result = table.update_item(
+        Key={"tenant_id": tenant_id, "email": f"{sort_key}#{window_start}"},
+        UpdateExpression="ADD #count :inc SET expires_at = if_not_exists(expires_at, :expires_at)",
+        ExpressionAttributeNames={"#count": "count"},
+        ExpressionAttributeValues={":inc": 1, ":expires_at": window_end},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(result["Attributes"]["count"]), window_end - now
+
+
+def check_send_rate(table, tenant_id: str, email: str, now: int, reissue: bool) -> int:
+    """
+    発行回数のカウンターを加算し、上限を超えていればクールダウンの秒数を返す (超えていなければ 0)
+    reissue: 有効期限内のコードを作り直す場合 True (テナントの上限はこの場合だけ数える)
+    """
+    limits = [
+        (f"RATE#EMAIL#{email.lower()}", OTP_SEND_LIMIT_PER_EMAIL, OTP_SEND_LIMIT_EMAIL_WINDOW_SECONDS),
+    ]
+    if reissue:
+        limits.append(("RATE#TENANT", OTP_SEND_LIMIT_PER_TENANT, OTP_SEND_LIMIT_TENANT_WINDOW_SECONDS))
+    cooldown = 0
+    for sort_key, limit, window_seconds in limits:
+        if limit <= 0:
+            continue
+        count, remaining = _increment(table, tenant_id, sort_key, window_seconds, now)
+        if count > limit:
+            cooldown = max(cooldown, remaining)
+            # メールアドレス単位で止まった場合は、テナントのカウンターを消費しない
+            break
+    return cooldown
+
+
+def put_if_not_reusable(table, item: dict, max_attempts: int) -> dict | None:
+    """
+    既存のコードが再利用できない場合だけ新しいOTPレコードを書き込む
+    戻り値: 書き込んだ場合は None、再利用すべきレコードがあった場合はそのレコード
+    """
+    expression, values = reusable_condition(item["created_at"], max_attempts)
+    try:
+        table.put_item(
+            Item=item,
+            ConditionExpression=expression,
+            ExpressionAttributeValues=values,
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        return None
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # 戻り値は AttributeValue 形式だが、呼び出し側で使うのは期限の値だけ
+        old = e.response.get("Item") or {}
+        return {k: int(v["N"]) for k, v in old.items() if "N" in v}
+
+
+def seconds_left(item: dict, now: int) -> int:
+    """OTPの残り有効秒数"""
+    return max(0, int(item.get("expires_at", 0)) - now)
+
@@ -0,0 +1,224 @@
+"""
+Send OTP Worker Lambda
+create_challenge が SQS に登録したOTPメールの送信依頼を受け取り、SESで送信する
+
+- 1回の起動で受け取ったメッセージ (SQS のバッチ) を数スレッドで並行して送信する
+- SES の送信レート (SES_MAX_SEND_RATE 通/秒) を超えないよう、トークンバケットで送信間隔を調整する
+  (コンテナごとの制御のため、関数の同時実行数 × SES_MAX_SEND_RATE がアカウントの上限を超えないように設定する)
+- スロットリング系のエラーは指数バックオフ (ジッター付き) でリトライする
+- 送れなかったメッセージだけを batchItemFailures で返し、SQS に再配信させる
+  (イベントソースマッピングで ReportBatchItemFailures を有効にしておくこと)
+- 有効期限が切れたOTPは送信せずに破棄する
+- 送信までの所要時間 (送信依頼から SES の受付まで・キュー待ち・SES の応答) を EMF のメトリクスとして出力する
+"""
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger, Tracer, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+
+import aws_clients
+from otp_mail import send_otp_mail, RETRYABLE_ERROR_CODES
+
+logger = Logger()
+tracer = Tracer()
+metrics = Metrics(namespace=os.environ.get("POWERTOOLS_METRICS_NAMESPACE", "AuthChallenge"))
+
+# 環境変数
+SES_MAX_SEND_RATE = float(os.environ.get("SES_MAX_SEND_RATE", "14"))
+SEND_CONCURRENCY = int(os.environ.get("SEND_CONCURRENCY", "4"))
+SEND_MAX_RETRIES = int(os.environ.get("SEND_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("RETRY_BASE_DELAY_SECONDS", "0.2"))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("RETRY_MAX_DELAY_SECONDS", "2"))
+
+# 残り時間がこれを下回ったらリトライせず、SQS の再配信に任せる
+REMAINING_TIME_MARGIN_MS = 3000
+
+
+class RateLimiter:
+    """トークンバケット (rate 通/秒、最大 rate 通までのバースト)"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """1通分のトークンを取得する (足りなければ待つ)。待った秒数を返す"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+# コンテナ内で共有する (ウォームスタート時も送信レートを引き継ぐ)
+rate_limiter = RateLimiter(SES_MAX_SEND_RATE)
+
+
+def backoff_delay(attempt: int) -> float:
+    """attempt 回目のリトライまでの待ち時間 (フルジッター)"""
+    return random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+
+
+def send_with_retry(email: str, otp: str, context) -> dict:
+    """
+    レート制限・リトライ付きで送信する
+    戻り値: {"message_id", "retries", "throttle_wait_ms", "ses_latency_ms"}
+    リトライ上限に達した場合、または送信できないエラーの場合は ClientError をそのまま送出する
+    """
+    retries = 0
+    throttle_wait = 0.0
+    while True:
+        throttle_wait += rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            message_id = send_otp_mail(aws_clients.client("ses"), email, otp)
+            return {
+                "message_id": message_id,
+                "retries": retries,
+                "throttle_wait_ms": round(throttle_wait * 1000, 1),
+                "ses_latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code not in RETRYABLE_ERROR_CODES or retries >= SEND_MAX_RETRIES:
+                raise
+            if context is not None and context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+                raise
+            delay = backoff_delay(retries)
+            retries += 1
+            logger.warning("SESのスロットリングのためリトライします", action_category="AUTH",
+                           error_code=code, retries=retries, delay_seconds=round(delay, 3))
+            time.sleep(delay)
+
+
+def process_record(record: dict, context) -> dict:
+    """
+    1件の送信依頼を処理する
+    戻り値: {"status": "sent" | "expired" | "invalid" | "failed", ...計測値}
+    """
+    message_id = record.get("messageId")
+    try:
+        body = json.loads(record["body"])
+        email = body["email"]
+        otp = body["otp"]
+    except (KeyError, TypeError, ValueError):
+        # 再配信しても処理できないため破棄する
+        logger.error("送信依頼の形式が不正です", action_category="ERROR", message_id=message_id)
+        return {"status": "invalid"}
+
+    tenant_id = body.get("tenant_id")
+    now_ms = int(time.time() * 1000)
+    requested_at_ms = body.get("requested_at_ms")
+    queue_wait_ms = now_ms - requested_at_ms if requested_at_ms else None
+
+    expires_at = body.get("expires_at")
+    if expires_at and now_ms // 1000 > expires_at:
+        logger.warning("OTPの有効期限が切れているため送信しません", action_category="AUTH",
+                       tenant_id=tenant_id, queue_wait_ms=queue_wait_ms)
+        return {"status": "expired", "queue_wait_ms": queue_wait_ms}
+
+    try:
+        result = send_with_retry(email, otp, context)
+    except ClientError as e:
+        logger.exception("OTPメールの送信に失敗しました", action_category="ERROR",
+                         tenant_id=tenant_id, error_code=e.response["Error"]["Code"])
+        return {"status": "failed", "queue_wait_ms": queue_wait_ms}
+    except Exception:
+        # 通信エラーなど。バッチ全体を失敗させず、このメッセージだけ再配信させる
+        logger.exception("OTPメールの送信中に予期しないエラーが発生しました", action_category="ERROR",
+                         tenant_id=tenant_id)
+        return {"status": "failed", "queue_wait_ms": queue_wait_ms}
+
+    # 送信依頼の登録から SES の受付完了までの時間
+    delivery_latency_ms = int(time.time() * 1000) - requested_at_ms if requested_at_ms else None
+    logger.info("OTPメールを送信しました", action_category="AUTH", tenant_id=tenant_id,
+                ses_message_id=result["message_id"], delivery_latency_ms=delivery_latency_ms,
+                queue_wait_ms=queue_wait_ms, ses_latency_ms=result["ses_latency_ms"],
+                throttle_wait_ms=result["throttle_wait_ms"], retries=result["retries"])
+    return {
+        "status": "sent",
+        "queue_wait_ms": queue_wait_ms,
+        "delivery_latency_ms": delivery_latency_ms,
+        "ses_latency_ms": result["ses_latency_ms"],
+        "retries": result["retries"],
+    }
+
+
+def summarize(results: list) -> dict:
+    """バッチ全体の集計 (ログ出力用)"""
+    summary = {status: 0 for status in ("sent", "expired", "invalid", "failed")}
+    for result in results:
+        summary[result["status"]] += 1
+
+    latencies = sorted(r["delivery_latency_ms"] for r in results if r.get("delivery_latency_ms") is not None)
+    if latencies:
+        summary["delivery_latency_ms_max"] = latencies[-1]
+        summary["delivery_latency_ms_p50"] = latencies[len(latencies) // 2]
+        summary["delivery_latency_ms_avg"] = round(sum(latencies) / len(latencies), 1)
+    summary["retries"] = sum(r.get("retries", 0) for r in results)
+    return summary
+
+
+def emit_delivery_metrics(results: list) -> None:
+    """
+    送信までの所要時間をメトリクスに追加する (値はメッセージごと。ハンドラーの終了時に EMF でまとめて出力される)
+    add_metric はスレッドセーフではないため、送信スレッドの終了後にまとめて呼ぶ
+    """
+    values = (
+        ("OtpDeliveryLatency", "delivery_latency_ms"),
+        ("OtpQueueWait", "queue_wait_ms"),
+        ("SesLatency", "ses_latency_ms"),
+    )
+    for result in results:
+        for name, key in values:
+            if result.get(key) is not None:
+                metrics.add_metric(name=name, unit=MetricUnit.Milliseconds, value=result[key])
+
+
+@tracer.capture_lambda_handler
+@metrics.log_metrics
+@logger.inject_lambda_context(log_event=False)
+def lambda_handler(event, context):
+    """
+    SQS からの送信依頼を処理し、送信できなかったメッセージを batchItemFailures で返す
+    """
+    records = event.get("Records", [])
+    logger.info("OTPメール送信を開始", action_category="AUTH", record_count=len(records))
+
+    started = time.perf_counter()
+    # SES のクライアントは送信スレッドを起動する前に作成しておく
+    # (作成は boto3 の既定セッションを使うためスレッドセーフではない。作成後のクライアントはスレッドセーフ)
+    aws_clients.client("ses")
+    workers = max(1, min(SEND_CONCURRENCY, len(records)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda record: process_record(record, context), records))
+
+    emit_delivery_metrics(results)
+
+    failures = [
+        {"itemIdentifier": record["messageId"]}
+        for record, result in zip(records, results)
+        if result["status"] == "failed"
+    ]
+
+    logger.info("OTPメール送信完了", action_category="AUTH",
+                duration_ms=round((time.perf_counter() - started) * 1000, 1), **summarize(results))
+
+    return {"batchItemFailures": failures}
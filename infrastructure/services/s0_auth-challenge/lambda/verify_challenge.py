@@ -1,72 +1,110 @@
 """
 Verify Auth Challenge Lambda
 ユーザーが入力したOTPコードを検証
+
+1. 先に試行回数を +1 する (1回の条件付き update_item。有効期限内・上限未満の場合だけ)
+2. 加算できた場合だけ、返ってきたレコードのハッシュと入力値を比較する
+3. 一致したらレコードを条件付きで削除する (同じコードでの2回目以降のサインインは失敗させる)
+試行回数は比較より前に原子的に数えるため、並行して推測を送っても MAX_ATTEMPTS 回を超えて比較されることはない
 """
 import os
+import hmac
 import time
-import boto3
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer
 
+import aws_clients
+from otp_hash import hash_otp
+
 logger = Logger()
 tracer = Tracer()
 
-# AWS クライアント
-dynamodb = boto3.resource("dynamodb")
-
 # 環境変数
 OTP_TABLE_NAME = os.environ.get("OTP_TABLE_NAME")
 MAX_ATTEMPTS = int(os.environ.get("MAX_ATTEMPTS", "3"))
 
+_deserializer = TypeDeserializer()
 
-def get_otp_from_dynamodb(tenant_id: str, email: str) -> dict | None:
-    """DynamoDBからOTPレコードを取得"""
-    table = dynamodb.Table(OTP_TABLE_NAME)
+
+def charge_attempt(tenant_id: str, email: str, now: int) -> tuple:
+    """
+    試行回数を +1 する (レコードがあり、有効期限内で、試行回数が上限未満の場合だけ)
+    戻り値: (加算後のレコード または None, 加算できなかった場合の元のレコード (レコードがなければ None))
+    """
+    table = aws_clients.table(OTP_TABLE_NAME)
 
     try:
-        response = table.get_item(
+        result = table.update_item(
             Key={
                 "tenant_id": tenant_id,
                 "email": email,
-            }
+            },
+            UpdateExpression="ADD attempts :inc",
+            ConditionExpression="attribute_exists(email) AND attempts < :max AND expires_at >= :now",
+            ExpressionAttributeValues={":inc": 1, ":max": MAX_ATTEMPTS, ":now": now},
+            ReturnValues="ALL_NEW",
+            # 失敗理由 (期限切れ・回数超過・レコードなし) の判定用に、更新前の値を返させる
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
         )
-        return response.get("Item")
-    except ClientError:
-        logger.exception("DynamoDBからOTP取得に失敗しました", action_category="ERROR")
-        return None
+        return result["Attributes"], None
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        old_item = e.response.get("Item")
+        if not old_item:
+            return None, None
+        return None, {k: _deserializer.deserialize(v) for k, v in old_item.items()}
 
 
-def increment_attempts(tenant_id: str, email: str) -> None:
-    """試行回数をインクリメント"""
-    table = dynamodb.Table(OTP_TABLE_NAME)
+def consume_otp(tenant_id: str, email: str, otp_hash: str) -> bool:
+    """
+    OTPレコードを削除する (ハッシュが一致する場合だけ)
+    並行して同じコードで検証した場合や、その間に再発行された場合は False
+    """
+    table = aws_clients.table(OTP_TABLE_NAME)
 
     try:
-        table.update_item(
+        table.delete_item(
             Key={
                 "tenant_id": tenant_id,
                 "email": email,
             },
-            UpdateExpression="SET attempts = attempts + :inc",
-            ExpressionAttributeValues={":inc": 1},
+            ConditionExpression="otp_hash = :hash",
+            ExpressionAttributeValues={":hash": otp_hash},
         )
-    except ClientError:
-        logger.exception("試行回数の更新に失敗しました", action_category="ERROR")
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
 
 
-def delete_otp(tenant_id: str, email: str) -> None:
-    """OTPレコードを削除（認証成功後）"""
-    table = dynamodb.Table(OTP_TABLE_NAME)
+def verify_otp(tenant_id: str, email: str, user_answer: str, now: int) -> bool:
+    """試行回数を数えてからコードを比較し、一致すればレコードを削除する"""
+    item, old_item = charge_attempt(tenant_id, email, now)
 
-    try:
-        table.delete_item(
-            Key={
-                "tenant_id": tenant_id,
-                "email": email,
-            }
-        )
-        logger.info("OTPレコードを削除しました", action_category="AUTH")
-    except ClientError:
-        logger.exception("OTPレコードの削除に失敗しました", action_category="ERROR")
+    if item is None:
+        if old_item is None:
+            logger.warning("OTPレコードが見つかりません", action_category="ERROR")
+        elif now > old_item.get("expires_at", 0):
+            # 期限切れのレコードは TTL で削除される
+            logger.warning("OTPの有効期限が切れています", action_category="ERROR")
+        else:
+            logger.warning("試行回数の上限を超えました", action_category="ERROR", max_attempts=MAX_ATTEMPTS)
+        return False
+
+    otp_hash = hash_otp(tenant_id, email, user_answer)
+    if not hmac.compare_digest(str(item.get("otp_hash", "")), otp_hash):
+        logger.warning("OTP検証失敗 - コード不一致", action_category="ERROR", attempts=int(item["attempts"]))
+        return False
+
+    if not consume_otp(tenant_id, email, otp_hash):
+        logger.warning("OTPは既に使用されています", action_category="ERROR")
+        return False
+
+    logger.info("OTP検証成功", action_category="AUTH", attempts=int(item["attempts"]))
+    return True
 
 
 @tracer.capture_lambda_handler
@@ -100,65 +138,17 @@ def lambda_handler(event, context):
         event["response"] = response
         return event
 
-    # privateChallengeParameters から期待値を取得（バックアップ）
-    private_params = request.get("privateChallengeParameters", {})
-    expected_answer = private_params.get("answer")
-
     logger.info("OTP検証を開始", action_category="AUTH")
 
     answer_correct = False
 
     try:
-        # DynamoDBから保存されたOTPを取得
-        otp_record = get_otp_from_dynamodb(tenant_id, email)
-
-        if not otp_record:
-            logger.warning("OTPレコードが見つかりません", action_category="ERROR")
-            response["answerCorrect"] = False
-            event["response"] = response
-            return event
-
-        stored_otp = otp_record.get("otp_code")
-        expires_at = otp_record.get("expires_at", 0)
-        attempts = otp_record.get("attempts", 0)
-        current_time = int(time.time())
-
-        # 有効期限チェック
-        if current_time > expires_at:
-            logger.warning("OTPの有効期限が切れています", action_category="ERROR")
-            delete_otp(tenant_id, email)
-            response["answerCorrect"] = False
-            event["response"] = response
-            return event
-
-        # 試行回数チェック
-        if attempts >= MAX_ATTEMPTS:
-            logger.warning("試行回数の上限を超えました", action_category="ERROR", max_attempts=MAX_ATTEMPTS)
-            delete_otp(tenant_id, email)
-            response["answerCorrect"] = False
-            event["response"] = response
-            return event
-
-        # OTP一致チェック（DynamoDB優先、なければprivateChallengeParameters）
-        if stored_otp and user_answer == stored_otp:
-            answer_correct = True
-            logger.info("OTP検証成功（DynamoDB）", action_category="AUTH")
-        elif expected_answer and user_answer == expected_answer:
-            answer_correct = True
-            logger.info("OTP検証成功（privateChallengeParameters）", action_category="AUTH")
-        else:
-            logger.warning("OTP検証失敗 - コード不一致", action_category="ERROR")
-            increment_attempts(tenant_id, email)
-
-        if answer_correct:
-            # 成功時はOTPレコードを削除
-            delete_otp(tenant_id, email)
-
-    except Exception as e:
+        answer_correct = verify_otp(tenant_id, email, user_answer, int(time.time()))
+    except Exception:
         logger.exception("OTP検証中にエラーが発生しました", action_category="ERROR")
         answer_correct = False
 
     response["answerCorrect"] = answer_correct
     event["response"] = response
 
-    return event
\ No newline at end of file
+    return event
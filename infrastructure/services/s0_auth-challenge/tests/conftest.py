@@ -0,0 +1,73 @@
+"""
+s0_auth-challenge の単体テスト
+
+使い方:
+    pip install pytest boto3 aws-lambda-powertools "moto[dynamodb]>=5"
+    python -m pytest infrastructure/services/s0_auth-challenge/tests
+
+- DynamoDB はプロセス内の moto を使う (AWS には接続しない)
+- moto の DynamoDB は1リクエストずつ処理させる (本物の DynamoDB と同じく、1件の条件付き更新を原子的にするため)
+"""
+import os
+import sys
+import threading
+import functools
+
+import boto3
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda"))
+
+os.environ.update({
+    "AWS_DEFAULT_REGION": "ap-northeast-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "POWERTOOLS_TRACE_DISABLED": "true",
+    "OTP_TABLE_NAME": "otp-codes-test",
+    "OTP_PEPPER": "test-pepper",
+})
+
+
+def _serialize_moto_dynamodb():
+    from moto.dynamodb.responses import DynamoHandler
+
+    lock = threading.RLock()
+    dispatch = DynamoHandler._dispatch
+
+    @functools.wraps(dispatch)
+    def serialized(self, *args, **kwargs):
+        with lock:
+            return dispatch(self, *args, **kwargs)
+
+    DynamoHandler._dispatch = serialized
+
+
+_serialize_moto_dynamodb()
+
+
+@pytest.fixture
+def otp_table():
+    """OTP テーブル (tenant_id / email) を moto に作成する"""
+    from moto import mock_aws
+
+    import aws_clients
+
+    with mock_aws():
+        aws_clients.client.cache_clear()
+        aws_clients.table.cache_clear()
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["OTP_TABLE_NAME"],
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "email", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "email", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield aws_clients.table(os.environ["OTP_TABLE_NAME"])
+        aws_clients.client.cache_clear()
+        aws_clients.table.cache_clear()
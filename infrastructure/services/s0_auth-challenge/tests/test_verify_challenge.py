@@ -0,0 +1,99 @@
+"""verify_challenge: 試行回数を先に数えてから比較する (並行した推測でも MAX_ATTEMPTS 回までしか比較しない)"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import verify_challenge
+from otp_hash import hash_otp
+
+TENANT = "tenant-a"
+EMAIL = "user@example.com"
+CODE = "123456"
+
+
+@pytest.fixture
+def otp(otp_table):
+    now = int(time.time())
+    otp_table.put_item(Item={
+        "tenant_id": TENANT,
+        "email": EMAIL,
+        "otp_hash": hash_otp(TENANT, EMAIL, CODE),
+        "created_at": now,
+        "expires_at": now + 300,
+        "attempts": 0,
+    })
+    return otp_table
+
+
+@pytest.fixture
+def compared(monkeypatch):
+    """ハッシュを比較した (= 試行回数を加算できた) 推測を記録する"""
+    answers = []
+    lock = threading.Lock()
+    original = verify_challenge.hash_otp
+
+    def counting_hash(tenant_id, email, otp):
+        with lock:
+            answers.append(otp)
+        return original(tenant_id, email, otp)
+
+    monkeypatch.setattr(verify_challenge, "hash_otp", counting_hash)
+    return answers
+
+
+def guess_concurrently(answers):
+    barrier = threading.Barrier(len(answers))
+
+    def guess(answer):
+        barrier.wait()
+        return verify_challenge.verify_otp(TENANT, EMAIL, answer, int(time.time()))
+
+    with ThreadPoolExecutor(max_workers=len(answers)) as executor:
+        return list(executor.map(guess, answers))
+
+
+def record(table):
+    return table.get_item(Key={"tenant_id": TENANT, "email": EMAIL}).get("Item")
+
+
+def test_correct_code_succeeds_once(otp):
+    assert verify_challenge.verify_otp(TENANT, EMAIL, CODE, int(time.time()))
+    assert record(otp) is None
+    assert not verify_challenge.verify_otp(TENANT, EMAIL, CODE, int(time.time()))
+
+
+def test_wrong_codes_lock_the_record(otp):
+    now = int(time.time())
+    for _ in range(verify_challenge.MAX_ATTEMPTS):
+        assert not verify_challenge.verify_otp(TENANT, EMAIL, "000000", now)
+
+    assert not verify_challenge.verify_otp(TENANT, EMAIL, CODE, now)
+    assert record(otp)["attempts"] == verify_challenge.MAX_ATTEMPTS
+
+
+def test_expired_code_is_not_charged(otp):
+    later = int(time.time()) + 301
+    assert not verify_challenge.verify_otp(TENANT, EMAIL, CODE, later)
+    assert record(otp)["attempts"] == 0
+
+
+def test_concurrent_guesses_are_capped_at_max_attempts(otp, compared):
+    # 正解を含む多数の推測を同時に送っても、比較されるのは MAX_ATTEMPTS 件まで
+    answers = [f"{i:06d}" for i in range(verify_challenge.MAX_ATTEMPTS * 5)] + [CODE]
+
+    results = guess_concurrently(answers)
+
+    assert len(compared) == verify_challenge.MAX_ATTEMPTS
+    assert sum(results) == (1 if CODE in compared else 0)
+    item = record(otp)
+    if item is not None:
+        assert item["attempts"] == verify_challenge.MAX_ATTEMPTS
+
+
+def test_concurrent_correct_guesses_sign_in_once(otp):
+    results = guess_concurrently([CODE] * (verify_challenge.MAX_ATTEMPTS * 3))
+
+    assert sum(results) == 1
+    assert record(otp) is None
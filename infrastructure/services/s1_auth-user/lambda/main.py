@@ -1,6 +1,5 @@
 import os
 import json
-import boto3
 from botocore.exceptions import ClientError
 
 # Powertoolsのインポート
@@ -8,22 +7,39 @@ from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.utilities.data_classes import event_source, APIGatewayProxyEventV2
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+# 共通レイヤー (boto3 のクライアントは初回アクセス時に作成)
+from ndk_common import aws
+from ndk_common.etag import etag_matches
+
+import profile_cache
+
 # 1. サービスの初期化
 logger = Logger()
 tracer = Tracer()
 
-dynamodb = boto3.resource("dynamodb")
 TABLE_NAME = os.environ.get("TENANT_USER_MASTER_TABLE_NAME")
 
 
-def create_response(status_code: int, body: dict) -> dict:
+# ブラウザ側でもサーバーのキャッシュと同じ時間だけ再利用させる (本人の情報なので private)
+PROFILE_CACHE_CONTROL = f"private, max-age={profile_cache.PROFILE_CACHE_TTL_SECONDS}"
+
+
+def create_response(status_code: int, body: dict, headers: dict | None = None) -> dict:
     return {
         "statusCode": status_code,
-        "headers": {"Content-Type": "application/json"},
+        "headers": {"Content-Type": "application/json", **(headers or {})},
         "body": json.dumps(body, default=str, ensure_ascii=False)
     }
 
 
+def not_modified_response(etag: str) -> dict:
+    return {
+        "statusCode": 304,
+        "headers": {"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL},
+        "body": ""
+    }
+
+
 @tracer.capture_lambda_handler
 @event_source(data_class=APIGatewayProxyEventV2)
 @logger.inject_lambda_context(log_event=False)
@@ -57,17 +73,17 @@ def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
         logger.debug("受信したclaims", action_category="EXECUTE", claims=raw_claims)
         return create_response(400, {"message": "Invalid token claims"})
 
-    logger.info("テナントユーザー情報を取得します", action_category="EXECUTE")
+    # ?consistent=true の場合はキャッシュを使わず最新の値を読む (プロフィール更新直後など)
+    params = event.query_string_parameters or {}
+    consistent = params.get("consistent", "").lower() in ("1", "true")
+
+    logger.info("テナントユーザー情報を取得します", action_category="EXECUTE", consistent=consistent)
 
-    # 4. DynamoDBアクセス
+    # 4. DynamoDBアクセス (コンテナ内キャッシュがあれば使う)
+    stats = {}
     try:
-        table = dynamodb.Table(TABLE_NAME)
-        response = table.get_item(
-            Key={
-                "tenant_id": tenant_id,
-                "user_id": user_id,
-            }
-        )
+        table = aws.table(TABLE_NAME)
+        user_item, etag = profile_cache.get_profile(table, tenant_id, user_id, consistent, stats)
     except ClientError:
         logger.exception("DynamoDBアクセスに失敗しました", action_category="ERROR")
         return create_response(500, {"message": "Database access error"})
@@ -76,9 +92,10 @@ def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
         return create_response(500, {"message": "Internal server error"})
 
     # 5. レスポンス返却
-    user_item = response.get("Item")
+    logger.info("テナントユーザー情報を取得しました", action_category="EXECUTE", cache=stats["cache"])
 
-    logger.info("テナントユーザー情報を取得しました", action_category="EXECUTE")
+    if not consistent and etag_matches((event.headers or {}).get("if-none-match"), etag):
+        return not_modified_response(etag)
 
     response_body = {
         "tenantId": tenant_id,
@@ -86,4 +103,4 @@ def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
         "tenantUser": user_item
     }
 
-    return create_response(200, response_body)
\ No newline at end of file
+    return create_response(200, response_body, {"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+テナントユーザー情報のコンテナ内キャッシュ
+フロントエンドはほぼ毎画面 GET /me を呼ぶため、同じ (tenant_id, sub) の get_item を短時間だけ省略する
+
+- キャッシュは TTL 付きの LRU (コンテナごと。別コンテナとは共有しない)
+- ETag はアイテムの version 属性 (なければ updated_at、どちらもなければ内容のハッシュ) から作る
+- consistent=True の場合はキャッシュを使わず、強い整合性で読み直してキャッシュを更新する
+"""
+import os
+import time
+from collections import OrderedDict
+
+# ETag の作り方は s2_tenant-context (GET /bootstrap) と共通
+from ndk_common.etag import make_etag
+
+# キャッシュの有効期間 (秒)。0 でキャッシュしない
+PROFILE_CACHE_TTL_SECONDS = int(os.environ.get("PROFILE_CACHE_TTL_SECONDS", "60"))
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "1024"))
+
+# (tenant_id, user_id) -> (有効期限 (monotonic), item, etag)
+_cache = OrderedDict()
+
+
+def get_profile(table, tenant_id: str, user_id: str, consistent: bool, stats: dict) -> tuple:
+    """
+    ユーザー情報を取得する
+    戻り値: (item または None, etag)
+    stats["cache"] に取得元 (memory / dynamodb) を記録する
+    """
+    cache_key = (tenant_id, user_id)
+    now = time.monotonic()
+
+    if not consistent:
+        cached = _cache.get(cache_key)
+        if cached and cached[0] > now:
+            _cache.move_to_end(cache_key)
+            stats["cache"] = "memory"
+            return cached[1], cached[2]
+
+    response = table.get_item(
+        Key={"tenant_id": tenant_id, "user_id": user_id},
+        ConsistentRead=consistent,
+    )
+    item = response.get("Item")
+    etag = make_etag(tenant_id, user_id, item)
+    stats["cache"] = "dynamodb"
+
+    if PROFILE_CACHE_TTL_SECONDS > 0:
+        _cache[cache_key] = (now + PROFILE_CACHE_TTL_SECONDS, item, etag)
+        _cache.move_to_end(cache_key)
+        while len(_cache) > PROFILE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return item, etag
@@ -68,7 +68,7 @@ resource "null_resource" "lambda_deps" {
       echo "[s1_auth-user] install deps with pip"
 
       # 念のため過去の依存を掃除
-      rm -rf aws_lambda_powertools* boto3* __pycache__
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* __pycache__
 
       # 依存ライブラリを lambda/ 直下にインストール
       pip install -r requirements.txt -t .
@@ -109,9 +109,13 @@ resource "aws_lambda_function" "this" {
 
   kms_key_arn = var.lambda_kms_key_arn
 
+  # powertools / xray / ndk_common は共通レイヤーから読み込む
+  layers = [var.common_layer_arn]
+
   environment {
     variables = {
       TENANT_USER_MASTER_TABLE_NAME = var.tenant_user_master_table_name
+      PROFILE_CACHE_TTL_SECONDS     = "60"
       POWERTOOLS_SERVICE_NAME       = "AuthUserContext"
       LOG_LEVEL                     = "INFO"
     }
@@ -35,3 +35,8 @@ variable "lambda_kms_key_arn" {
   description = "KMS key ARN for Lambda environment encryption"
   type        = string
 }
+
+variable "common_layer_arn" {
+  description = "共通 Lambda レイヤーの ARN (infrastructure/layers/common)"
+  type        = string
+}
@@ -0,0 +1,143 @@
+"""
+工事マスタのレスポンス表現とエンコード
+
+表現形式 (?format=):
+- full    : 従来どおり (空配列も含めて全キーを返す)
+- compact : 空の children / tasks / safety_equipments を省略する
+- flat    : 親のインデックスを持つ行の配列 (キーの繰り返しがない)
+            {"format": "flat", "columns": [...], "rows": [[id, title, 親の行番号 or -1, 格納先, is_high_risk], ...]}
+            格納先は CHILD_KEYS のインデックス (0: children, 1: tasks, 2: safety_equipments)
+
+本文は Accept-Encoding に応じて br / gzip で圧縮し、base64 で返す (API Gateway が復元する)
+JSON のエンコードは orjson があれば使う (ない環境では標準の json)
+同じ ETag・同じエンコードの本文はコンテナ内でキャッシュし、2回目以降はシリアライズしない
+"""
+import json
+import gzip
+import base64
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # ローカル実行など、orjson がない環境
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from tree import CHILD_KEYS
+
+FORMAT_FULL = "full"
+FORMAT_COMPACT = "compact"
+FORMAT_FLAT = "flat"
+FORMATS = (FORMAT_FULL, FORMAT_COMPACT, FORMAT_FLAT)
+
+FLAT_COLUMNS = ["id", "title", "parent", "group", "is_high_risk"]
+
+# これより小さい本文は圧縮しない (ヘッダーやCPUのほうが高くつく)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# エンコード済み本文のキャッシュ: (ETag, content-encoding) -> (body, is_base64, 適用した圧縮方式)
+ENCODED_CACHE_SIZE = 32
+_encoded_cache = OrderedDict()
+
+
+def dumps(obj) -> bytes:
+    """JSON を UTF-8 のバイト列にする"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compact_tree(nodes: list) -> list:
+    """空の子配列を省略したツリー"""
+    result = []
+    for node in nodes:
+        compact = {k: v for k, v in node.items() if k not in CHILD_KEYS}
+        for key in CHILD_KEYS:
+            children = node.get(key)
+            if children:
+                compact[key] = compact_tree(children)
+        result.append(compact)
+    return result
+
+
+def flat_tree(nodes: list) -> dict:
+    """親の行番号で階層を表すフラットな配列 (行は表示順)"""
+    rows = []
+    stack = [(node, -1, 0) for node in reversed(nodes)]
+    while stack:
+        node, parent, group = stack.pop()
+        index = len(rows)
+        rows.append([node["id"], node.get("title"), parent, group, node.get("is_high_risk")])
+        for group_index in range(len(CHILD_KEYS) - 1, -1, -1):
+            children = node.get(CHILD_KEYS[group_index], [])
+            stack.extend((child, index, group_index) for child in reversed(children))
+    return {"format": FORMAT_FLAT, "columns": FLAT_COLUMNS, "rows": rows}
+
+
+def shape(tree: list, fmt: str):
+    """表現形式に合わせてツリーを変換"""
+    if fmt == FORMAT_COMPACT:
+        return compact_tree(tree)
+    if fmt == FORMAT_FLAT:
+        return flat_tree(tree)
+    return tree
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Accept-Encoding から圧縮方式を選ぶ (br > gzip)"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(raw: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(raw, quality=BROTLI_QUALITY)
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL)
+
+
+def encode_body(obj, accept_encoding: str | None, cache_key: str | None = None) -> tuple:
+    """
+    レスポンス本文を作成する
+    戻り値: (body, isBase64Encoded, 追加ヘッダー)
+    cache_key (ETag) を渡すと、同じ内容の2回目以降はキャッシュから返す
+    obj が関数の場合は、キャッシュがないときにだけ呼び出して本文を作る
+    """
+    encoding = choose_encoding(accept_encoding)
+
+    cached = _encoded_cache.get((cache_key, encoding)) if cache_key else None
+    if cached is None:
+        raw = dumps(obj() if callable(obj) else obj)
+        if encoding and len(raw) >= MIN_COMPRESS_BYTES:
+            cached = (base64.b64encode(compress(raw, encoding)).decode("ascii"), True, encoding)
+        else:
+            cached = (raw.decode("utf-8"), False, None)
+
+        if cache_key:
+            _encoded_cache[(cache_key, encoding)] = cached
+            while len(_encoded_cache) > ENCODED_CACHE_SIZE:
+                _encoded_cache.popitem(last=False)
+    else:
+        _encoded_cache.move_to_end((cache_key, encoding))
+
+    body, is_base64, applied = cached
+    headers = {"Vary": "Accept-Encoding"}
+    if applied:
+        headers["Content-Encoding"] = applied
+    return body, is_base64, headers
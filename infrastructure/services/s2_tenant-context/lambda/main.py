@@ -1,6 +1,8 @@
 import os
-import json
-import boto3
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
@@ -8,76 +10,157 @@ from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.utilities.data_classes import event_source, APIGatewayProxyEventV2
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+# 共通レイヤー (boto3 のクライアントは初回アクセス時に作成)
+from ndk_common import aws
+from ndk_common.etag import etag_matches
+
+import tree_cache
+import search_index
+import encoding
+import user_profile
+from tree import build_tree, summarize_node
+
 logger = Logger()
 tracer = Tracer()
 
-dynamodb = boto3.resource("dynamodb")
 TABLE_NAME = os.environ.get("CONSTRUCTION_MASTER_TABLE_NAME")
 
+# 全件取得時に並列クエリで分割する nodePath のプレフィックス (例: "DEPT#,ENV#")
+# 未設定なら1本のクエリを順番にページングする
+# ※ ルートノードの種類をすべて網羅するように設定すること (漏れたプレフィックスは取得されない)
+PARALLEL_QUERY_PREFIXES = [p for p in os.environ.get("PARALLEL_QUERY_PREFIXES", "").split(",") if p]
+
+# 並列クエリ用 (ウォームスタート時はスレッドを使い回す)
+# (boto3 のリソースはスレッドセーフではないため、aws.table() がスレッドごとに作成する)
+_executor = ThreadPoolExecutor(max_workers=max(1, len(PARALLEL_QUERY_PREFIXES)))
+# GET /bootstrap でユーザー情報をツリーと並行して取得する用
+# (ツリー側が _executor を使うため、同じプールで待ち合わせないよう分けている)
+_bootstrap_executor = ThreadPoolExecutor(max_workers=1)
 
-def create_response(status_code: int, body: dict) -> dict:
+
+# ブラウザには毎回再検証させる (変更がなければ 304 で本文を返さない)
+TREE_CACHE_CONTROL = "private, no-cache"
+
+
+def create_response(status_code: int, body: dict, headers: dict | None = None) -> dict:
     return {
         "statusCode": status_code,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body, default=str, ensure_ascii=False)
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": encoding.dumps(body).decode("utf-8")
     }
 
 
-def build_tree(flat_items: list) -> list:
+def cached_response(event: APIGatewayProxyEventV2, body, etag: str | None) -> dict:
     """
-    フラットなDynamoDBアイテムリストを、用途別の配列を持つ階層構造(Tree)に変換する
+    ETag 付きの 200 レスポンス (Accept-Encoding に応じて圧縮する)
+    body は関数でもよい (エンコード済みのキャッシュがあれば呼ばれない)
+    etag が None (マスタのバージョンが未登録) の場合は ETag を付けず、エンコード結果もキャッシュしない
     """
-    node_map = {}
+    payload, is_base64, headers = encoding.encode_body(
+        body, (event.headers or {}).get("accept-encoding"), cache_key=etag
+    )
+    if etag:
+        headers = {"ETag": etag, **headers}
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            "Cache-Control": TREE_CACHE_CONTROL,
+            **headers
+        },
+        "body": payload,
+        "isBase64Encoded": is_base64
+    }
 
-    # 1. まず全ノードをマップ化（初期化）
-    for item in flat_items:
-        node = {
-            "id": item.get("nodePath"),
-            "title": item.get("title"),  # ★ name -> title に変更
-            "children": [],
-            "tasks": [],                 # ★ tasks用配列を追加
-            "safety_equipments": []      # ★ 安全機材用配列を追加
-        }
 
-        # ハイリスクフラグなど、その他の属性も必要ならコピー
-        if "is_high_risk" in item:
-            node["is_high_risk"] = item["is_high_risk"]
+def representation(event: APIGatewayProxyEventV2, fmt: str = encoding.FORMAT_FULL) -> str:
+    """ETag に含める表現の違い (形式・圧縮方式で本文のバイト列が変わるため)"""
+    content_encoding = encoding.choose_encoding((event.headers or {}).get("accept-encoding"))
+    return f"format={fmt}|encoding={content_encoding or 'identity'}"
 
-        # デバッグ用や詳細データ用として元データも持たせるなら
-        # node["data"] = item
 
-        node_map[item.get("nodePath")] = node
+def not_modified_response(etag: str) -> dict:
+    return {
+        "statusCode": 304,
+        "headers": {"ETag": etag, "Cache-Control": TREE_CACHE_CONTROL},
+        "body": ""
+    }
 
-    root_nodes = []
 
-    # 2. 親子関係の構築
-    for path, node in node_map.items():
-        parts = path.split("#")
+def iter_master_items(table, key_condition, stats: dict, **extra_kwargs):
+    """
+    LastEvaluatedKey をたどって全ページを取得し、アイテムを1件ずつ返す
+    stats にページ数・件数を加算する
+    extra_kwargs は Query にそのまま渡す (ProjectionExpression など)
+    """
+    query_kwargs = {"KeyConditionExpression": key_condition, **extra_kwargs}
+
+    while True:
+        response = table.query(**query_kwargs)
+        items = response.get("Items", [])
+
+        stats["page_count"] += 1
+        stats["item_count"] += len(items)
+        yield from items
+
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
 
-        # ルートノード判定 (例: DEPT#1 は要素数2)
-        if len(parts) <= 2:
-            root_nodes.append(node)
-        else:
-            # 親を探すロジック (後ろの2要素 #KEY#ID を削る)
-            # 例: ...#PROJ#1#TASK#1 -> ...#PROJ#1
-            parent_path = "#".join(parts[:-2])
-            parent = node_map.get(parent_path)
 
-            if parent:
-                # ★ IDによって格納先を振り分けるロジック
-                if "TASK" in parts[-2]:  # IDの最後から2番目が TASK か判定
-                    parent["tasks"].append(node)
-                elif "SEQ" in parts[-2]:  # IDの最後から2番目が SEQ か判定
-                    parent["safety_equipments"].append(node)
-                else:
-                    parent["children"].append(node)
-            else:
-                # 親が見つからない場合はルート扱い（念のため）
-                root_nodes.append(node)
+def fetch_master_items(tenant_id: str, dept_prefix: str | None, stats: dict):
+    """
+    工事マスタを取得する
+    - deptId 指定時、または並列設定がない場合は1本のクエリをページング
+    - 並列設定がある場合はプレフィックスごとのクエリを並列に実行して連結
+    """
+    key_condition = Key("tenant_id").eq(tenant_id)
 
-    # (オプション) 配列をID順などでソートしたい場合はここで各ノードに対してsortを行う
+    if dept_prefix or not PARALLEL_QUERY_PREFIXES:
+        if dept_prefix:
+            key_condition = key_condition & Key("nodePath").begins_with(dept_prefix)
+        return iter_master_items(aws.table(TABLE_NAME), key_condition, stats)
 
-    return root_nodes
+    def fetch_prefix(prefix):
+        # スレッドごとに集計して最後に合算する
+        local_stats = {"page_count": 0, "item_count": 0}
+        condition = key_condition & Key("nodePath").begins_with(prefix)
+        items = list(iter_master_items(aws.table(TABLE_NAME), condition, local_stats))
+        return items, local_stats
+
+    results = list(_executor.map(fetch_prefix, PARALLEL_QUERY_PREFIXES))
+    for _, local_stats in results:
+        stats["page_count"] += local_stats["page_count"]
+        stats["item_count"] += local_stats["item_count"]
+
+    return chain.from_iterable(items for items, _ in results)
+
+
+# ノード単位の取得 (GET /construction-master/nodes) で使う定数
+DEFAULT_NODE_DEPTH = 1
+MAX_NODE_DEPTH = 3
+NODE_PATH_PATTERN = re.compile(r"^[A-Za-z0-9_-]+(#[A-Za-z0-9_-]+)*$")
+
+
+def subtree_condition(tenant_id: str, node_path: str):
+    """
+    node_path 自身とその子孫だけを取得するキー条件
+    "DEPT#1" <= nodePath <= "DEPT#1$" とすることで、"DEPT#10..." などの兄弟は含めない
+    ('#' (0x23) の次の文字が '$' (0x24) のため、"DEPT#1#..." はすべてこの範囲に入る)
+    """
+    return Key("tenant_id").eq(tenant_id) & Key("nodePath").between(node_path, node_path + "$")
+
+
+def fetch_subtree_items(tenant_id: str, node_path: str, stats: dict):
+    """ノードとその子孫を、表示に必要な属性だけ取得する"""
+    return iter_master_items(
+        aws.table(TABLE_NAME),
+        subtree_condition(tenant_id, node_path),
+        stats,
+        ProjectionExpression="#p, #t, #r",
+        ExpressionAttributeNames={"#p": "nodePath", "#t": "title", "#r": "is_high_risk"},
+    )
 
 
 @tracer.capture_lambda_handler
@@ -86,6 +169,10 @@ def build_tree(flat_items: list) -> list:
 def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
     """
     工事マスタ取得API
+    - GET /construction-master        : ツリー全体 (または deptId 配下)
+    - GET /construction-master/nodes  : 指定ノードと直下の子のみ (遅延読み込み用)
+    - GET /construction-master/search : 作業・安全機材のタイトル検索
+    - GET /bootstrap                  : ログイン直後の初期表示用 (ユーザー情報 + ツリー)
     """
     # ★修正: JWTトークンから tenant_id を安全に取得 (s1と同じ対応)
     raw_claims = (
@@ -105,26 +192,66 @@ def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
 
     logger.append_keys(tenant_id=tenant_id)
 
+    route_key = event.raw_event.get("routeKey")
+    if route_key == "GET /bootstrap":
+        return handle_bootstrap(event, tenant_id, raw_claims.get("sub"))
+    if route_key == "GET /construction-master/nodes":
+        return handle_get_node(event, tenant_id)
+    if route_key == "GET /construction-master/search":
+        return handle_search(event, tenant_id)
+
+    return handle_get_master(event, tenant_id)
+
+
+def handle_get_master(event: APIGatewayProxyEventV2, tenant_id: str) -> dict:
+    """ツリー全体 (または deptId 配下) を返す"""
     # クエリパラメータ取得
     params = event.query_string_parameters or {}
     dept_prefix = params.get("deptId")
+    fmt = params.get("format", encoding.FORMAT_FULL)
+
+    if fmt not in encoding.FORMATS:
+        return create_response(400, {"message": "Invalid format"})
 
-    logger.info("工事マスタを取得します", action_category="EXECUTE", dept_prefix=dept_prefix)
+    if dept_prefix and not NODE_PATH_PATTERN.match(dept_prefix):
+        logger.warning("deptIdが不正です", action_category="ERROR", dept_prefix=dept_prefix)
+        return create_response(400, {"message": "Invalid deptId"})
+
+    logger.info("工事マスタを取得します", action_category="EXECUTE", dept_prefix=dept_prefix, format=fmt)
 
     try:
-        table = dynamodb.Table(TABLE_NAME)
+        table = aws.table(TABLE_NAME)
 
-        key_condition = Key("tenant_id").eq(tenant_id)
-        if dept_prefix:
-            key_condition = key_condition & Key("nodePath").begins_with(dept_prefix)
+        # マスタのバージョンから ETag を作成し、変更がなければ 304 を返す
+        version = tree_cache.get_version(table, tenant_id)
+        etag = tree_cache.make_etag(tenant_id, dept_prefix, version, representation(event, fmt))
 
-        response = table.query(KeyConditionExpression=key_condition)
-        items = response.get("Items", [])
+        if etag and etag_matches((event.headers or {}).get("if-none-match"), etag):
+            logger.info("工事マスタに変更はありません", action_category="EXECUTE", version=version)
+            return not_modified_response(etag)
 
-        # 階層構造に変換
-        tree_data = build_tree(items)
+        stats = {"page_count": 0, "item_count": 0}
 
-        logger.info("工事マスタを取得しました", action_category="EXECUTE", item_count=len(items))
+        # キャッシュがなければ、全ページを取得しながら階層構造に変換
+        tree_data = tree_cache.get_tree(
+            table,
+            tenant_id,
+            dept_prefix,
+            version,
+            build=lambda: build_tree(fetch_master_items(tenant_id, dept_prefix, stats), stats=stats),
+            stats=stats
+        )
+
+        logger.info(
+            "工事マスタを取得しました",
+            action_category="EXECUTE",
+            version=version,
+            cache=stats["cache"],
+            item_count=stats["item_count"],
+            page_count=stats["page_count"],
+            orphan_count=stats.get("orphan_count", 0),
+            parallel=bool(PARALLEL_QUERY_PREFIXES) and not dept_prefix
+        )
 
     except ClientError:
         logger.exception("DynamoDBクエリに失敗しました", action_category="ERROR")
@@ -133,4 +260,229 @@ def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
         logger.exception("予期しないエラーが発生しました", action_category="ERROR")
         return create_response(500, {"message": "Internal server error"})
 
-    return create_response(200, tree_data)
\ No newline at end of file
+    return cached_response(event, lambda: encoding.shape(tree_data, fmt), etag)
+
+
+def handle_get_node(event: APIGatewayProxyEventV2, tenant_id: str) -> dict:
+    """
+    ノード単位の取得
+    GET /construction-master/nodes?path=DEPT#1&depth=1
+    - path 省略時はルートノードの一覧
+    - depth 階層分の children / tasks / safety_equipments と、その先の子の件数を返す
+    """
+    params = event.query_string_parameters or {}
+    node_path = params.get("path")
+
+    try:
+        depth = min(max(int(params.get("depth", DEFAULT_NODE_DEPTH)), 0), MAX_NODE_DEPTH)
+    except ValueError:
+        return create_response(400, {"message": "Invalid depth"})
+
+    if node_path and not NODE_PATH_PATTERN.match(node_path):
+        logger.warning("pathが不正です", action_category="ERROR", node_path=node_path)
+        return create_response(400, {"message": "Invalid path"})
+
+    logger.info("工事マスタのノードを取得します", action_category="EXECUTE", node_path=node_path, depth=depth)
+
+    try:
+        table = aws.table(TABLE_NAME)
+
+        version = tree_cache.get_version(table, tenant_id)
+        etag = tree_cache.make_etag(
+            tenant_id, f"NODE#{node_path or tree_cache.ALL_NODES}", version, f"depth={depth}|{representation(event)}"
+        )
+
+        if etag and etag_matches((event.headers or {}).get("if-none-match"), etag):
+            return not_modified_response(etag)
+
+        stats = {"page_count": 0, "item_count": 0}
+
+        if node_path:
+            # ノード自身と子孫だけをキー条件の範囲クエリで取得
+            roots = build_tree(fetch_subtree_items(tenant_id, node_path, stats))
+            node = next((n for n in roots if n["id"] == node_path), None)
+            if node is None:
+                logger.warning("ノードが見つかりません", action_category="ERROR", node_path=node_path)
+                return create_response(404, {"message": "Node not found"})
+            body = summarize_node(node, depth)
+        else:
+            # ルート一覧はツリー全体のキャッシュから作る
+            roots = tree_cache.get_tree(
+                table,
+                tenant_id,
+                None,
+                version,
+                build=lambda: build_tree(fetch_master_items(tenant_id, None, stats), stats=stats),
+                stats=stats
+            )
+            # ルート一覧自体を1階層と数える
+            body = [summarize_node(root, max(depth - 1, 0)) for root in roots]
+
+        logger.info(
+            "工事マスタのノードを取得しました",
+            action_category="EXECUTE",
+            item_count=stats["item_count"],
+            page_count=stats["page_count"],
+            cache=stats.get("cache")
+        )
+
+    except ClientError:
+        logger.exception("DynamoDBクエリに失敗しました", action_category="ERROR")
+        return create_response(500, {"message": "Database error"})
+    except Exception:
+        logger.exception("予期しないエラーが発生しました", action_category="ERROR")
+        return create_response(500, {"message": "Internal server error"})
+
+    return cached_response(event, body, etag)
+
+
+def handle_search(event: APIGatewayProxyEventV2, tenant_id: str) -> dict:
+    """
+    タイトル検索
+    GET /construction-master/search?q=昇柱&kind=task&limit=20
+    - kind: task / safety_equipment (省略時はすべてのノード)
+    - 一致したノードの id / title / kind と、ルートからのパンくず (breadcrumbs) を返す
+    """
+    params = event.query_string_parameters or {}
+    query = (params.get("q") or "").strip()
+    kind_name = params.get("kind")
+
+    if not query:
+        return create_response(400, {"message": "q is required"})
+    if kind_name and kind_name not in search_index.KIND_BY_NAME:
+        return create_response(400, {"message": "Invalid kind"})
+    try:
+        limit = min(max(int(params.get("limit", search_index.DEFAULT_LIMIT)), 1), search_index.MAX_LIMIT)
+    except ValueError:
+        return create_response(400, {"message": "Invalid limit"})
+
+    try:
+        table = aws.table(TABLE_NAME)
+
+        version = tree_cache.get_version(table, tenant_id)
+        etag = tree_cache.make_etag(
+            tenant_id, "SEARCH", version, f"q={query}|kind={kind_name}|limit={limit}|{representation(event)}"
+        )
+
+        if etag and etag_matches((event.headers or {}).get("if-none-match"), etag):
+            return not_modified_response(etag)
+
+        stats = {"page_count": 0, "item_count": 0}
+
+        # インデックスがなければ、ツリー全体 (キャッシュ) から作成する
+        index = search_index.get_index(
+            table,
+            tenant_id,
+            version,
+            load_tree=lambda: tree_cache.get_tree(
+                table,
+                tenant_id,
+                None,
+                version,
+                build=lambda: build_tree(fetch_master_items(tenant_id, None, stats), stats=stats),
+                stats=stats
+            ),
+            stats=stats
+        )
+        results = index.search(query, kind=search_index.KIND_BY_NAME.get(kind_name), limit=limit)
+
+        logger.info(
+            "工事マスタを検索しました",
+            action_category="EXECUTE",
+            query=query,
+            kind=kind_name,
+            hit_count=len(results),
+            cache=stats.get("cache")
+        )
+
+    except ClientError:
+        logger.exception("DynamoDBクエリに失敗しました", action_category="ERROR")
+        return create_response(500, {"message": "Database error"})
+    except Exception:
+        logger.exception("予期しないエラーが発生しました", action_category="ERROR")
+        return create_response(500, {"message": "Internal server error"})
+
+    return cached_response(event, {"items": results}, etag)
+
+
+def handle_bootstrap(event: APIGatewayProxyEventV2, tenant_id: str, user_id: str | None) -> dict:
+    """
+    ログイン直後の初期表示用 (GET /me と GET /construction-master をまとめたもの)
+    GET /bootstrap?format=compact&userEtag=...&treeEtag=...
+    - ユーザー情報 (s1 の GET /me と同じ形) とツリーを並行して取得して返す
+    - 部分ごとの ETag を etags に返す。次回 userEtag / treeEtag に渡すと、
+      変わっていない部分は本文から省略し notModified に名前を返す (フロント側のキャッシュを使う)
+    """
+    if not user_id:
+        logger.warning("トークンにuser_idがありません", action_category="ERROR")
+        return create_response(400, {"message": "Invalid token claims"})
+
+    params = event.query_string_parameters or {}
+    fmt = params.get("format", encoding.FORMAT_FULL)
+    if fmt not in encoding.FORMATS:
+        return create_response(400, {"message": "Invalid format"})
+
+    logger.append_keys(user_id=user_id)
+    logger.info("初期表示用のデータを取得します", action_category="EXECUTE", format=fmt)
+
+    try:
+        # ユーザー情報はワーカースレッドで、ツリーはこのスレッドで並行して取得
+        user_future = _bootstrap_executor.submit(user_profile.get_user, tenant_id, user_id)
+
+        table = aws.table(TABLE_NAME)
+        version = tree_cache.get_version(table, tenant_id)
+        tree_etag = tree_cache.make_etag(tenant_id, None, version, f"format={fmt}")
+
+        stats = {"page_count": 0, "item_count": 0}
+        tree_data = None
+        if not (tree_etag and etag_matches(params.get("treeEtag"), tree_etag)):
+            tree_data = tree_cache.get_tree(
+                table,
+                tenant_id,
+                None,
+                version,
+                build=lambda: build_tree(fetch_master_items(tenant_id, None, stats), stats=stats),
+                stats=stats
+            )
+
+        user_item, user_etag = user_future.result()
+
+    except ClientError:
+        logger.exception("DynamoDBクエリに失敗しました", action_category="ERROR")
+        return create_response(500, {"message": "Database error"})
+    except Exception:
+        logger.exception("予期しないエラーが発生しました", action_category="ERROR")
+        return create_response(500, {"message": "Internal server error"})
+
+    body = {
+        "tenantId": tenant_id,
+        "userId": user_id,
+        "etags": {"tenantUser": user_etag, "constructionMaster": tree_etag},
+        "notModified": []
+    }
+    if etag_matches(params.get("userEtag"), user_etag):
+        body["notModified"].append("tenantUser")
+    else:
+        body["tenantUser"] = user_item
+    if tree_data is None:
+        body["notModified"].append("constructionMaster")
+
+    # 全体の ETag (どちらかが変われば変わる)
+    etag = tree_cache.make_etag(
+        tenant_id, "BOOTSTRAP", version,
+        f"{user_etag}|{tree_etag}|{','.join(body['notModified'])}|{representation(event, fmt)}"
+    )
+
+    logger.info(
+        "初期表示用のデータを取得しました",
+        action_category="EXECUTE",
+        cache=stats.get("cache"),
+        not_modified=body["notModified"]
+    )
+
+    if etag and etag_matches((event.headers or {}).get("if-none-match"), etag):
+        return not_modified_response(etag)
+
+    if tree_data is not None:
+        return cached_response(event, lambda: {**body, "constructionMaster": encoding.shape(tree_data, fmt)}, etag)
+    return cached_response(event, body, etag)
@@ -0,0 +1,164 @@
+"""
+工事マスタの全文検索インデックス
+作業 (TASK) や安全機材 (SEQ) をタイトルの部分一致・前方一致で検索する ("昇柱" -> 該当作業)
+
+日本語のタイトルは単語区切りがないため、文字 N-gram (1文字 + 2文字) の転置インデックスを使う
+- 2文字以上のクエリ: クエリのbigramをすべて含むノードに絞り込み、タイトルの部分一致で確定する
+- 1文字のクエリ: unigram の転置リストをそのまま使う
+インデックスはツリーから作成し、tree_cache で (コンテナ内LRU / DynamoDBのgzipスナップショット) キャッシュする
+
+シリアライズ形式 (JSON):
+    {"docs": [[nodePath, title], ...], "grams": {"昇柱": [docのindex, ...], ...}}
+"""
+import unicodedata
+from collections import OrderedDict
+
+import tree_cache
+from tree import CHILD_KEYS, parse_segment
+
+INDEX_SORT_KEY = "INDEX#SEARCH"
+
+# 検索対象の種別 (API の kind パラメータ -> nodePath の種別)
+KIND_BY_NAME = {
+    "task": "TASK",
+    "safety_equipment": "SEQ",
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# tenant_id -> (version, SearchIndex)  展開済みのインデックスをコンテナ内で使い回す
+_indexes = OrderedDict()
+
+
+def normalize(text: str) -> str:
+    """全角/半角・大文字/小文字の違いを吸収し、空白を除く"""
+    return "".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+def grams_of(text: str) -> set:
+    """インデックスに登録する N-gram (1文字 + 2文字)"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def build_index(tree: list) -> dict:
+    """ツリーから転置インデックスを作成 (ノードはツリーの表示順に並ぶ)"""
+    docs = []
+    grams = {}
+
+    stack = list(reversed(tree))
+    while stack:
+        node = stack.pop()
+        doc_id = len(docs)
+        title = node.get("title") or ""
+        docs.append([node["id"], title])
+
+        for gram in grams_of(normalize(title)):
+            grams.setdefault(gram, []).append(doc_id)
+
+        for key in reversed(CHILD_KEYS):
+            stack.extend(reversed(node.get(key, [])))
+
+    return {"docs": docs, "grams": grams}
+
+
+class SearchIndex:
+    """シリアライズ済みのインデックスを検索用に展開したもの"""
+
+    def __init__(self, data: dict):
+        self.docs = data["docs"]
+        self.grams = data["grams"]
+        self.titles = {path: title for path, title in self.docs}
+        # 部分一致の確認用 (検索のたびに正規化しない)
+        self.normalized = [normalize(title) for _, title in self.docs]
+
+    def search(self, query: str, kind: str | None = None, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        タイトルにクエリを含むノードを返す
+        並び順: 前方一致 -> タイトルが短い順 -> ツリーの表示順
+        """
+        needle = normalize(query)
+        if not needle:
+            return []
+
+        doc_ids = self._candidates(needle)
+        matches = []
+        for doc_id in doc_ids:
+            text = self.normalized[doc_id]
+            position = text.find(needle)
+            if position < 0:
+                continue
+            if kind and self.kind_of(doc_id) != kind:
+                continue
+            matches.append((position != 0, len(text), doc_id))
+
+        matches.sort()
+        return [self._result(doc_id) for _, _, doc_id in matches[:limit]]
+
+    def _candidates(self, needle: str) -> list:
+        """N-gram の転置リストの積集合 (件数の少ないリストから絞り込む)"""
+        if len(needle) == 1:
+            return self.grams.get(needle, [])
+
+        postings = []
+        for gram in {needle[i:i + 2] for i in range(len(needle) - 1)}:
+            posting = self.grams.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return sorted(candidates)
+
+    def kind_of(self, doc_id: int) -> str | None:
+        """nodePath 末尾の種別 (TASK / SEQ など)"""
+        segment = parse_segment(self.docs[doc_id][0])
+        return segment[1] if segment else None
+
+    def _result(self, doc_id: int) -> dict:
+        path, title = self.docs[doc_id]
+        return {
+            "id": path,
+            "title": title,
+            "kind": self.kind_of(doc_id),
+            "breadcrumbs": self.breadcrumbs(path),
+        }
+
+    def breadcrumbs(self, path: str) -> list:
+        """祖先ノード (ルートから親まで) の id / title"""
+        parts = path.split("#")
+        ancestors = ["#".join(parts[:end]) for end in range(2, len(parts) - 1, 2)]
+        return [{"id": ancestor, "title": self.titles.get(ancestor)} for ancestor in ancestors]
+
+
+def get_index(table, tenant_id: str, version: int | None, load_tree, stats: dict) -> SearchIndex:
+    """
+    バージョンに対応する検索インデックスを取得する
+    load_tree: インデックスがない場合に、元になるツリーを取得する関数
+    バージョンが未登録 (None) の場合は毎回作成し、保持しない
+    """
+    cached = _indexes.get(tenant_id)
+    if version is not None and cached and cached[0] == version:
+        _indexes.move_to_end(tenant_id)
+        stats["cache"] = "memory"
+        return cached[1]
+
+    data = tree_cache.get_cached(
+        table, tenant_id, INDEX_SORT_KEY, version, build=lambda: build_index(load_tree()), stats=stats
+    )
+    index = SearchIndex(data)
+    if version is None:
+        return index
+
+    _indexes[tenant_id] = (version, index)
+    _indexes.move_to_end(tenant_id)
+    while len(_indexes) > tree_cache.TREE_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
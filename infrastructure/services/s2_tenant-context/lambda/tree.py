@@ -0,0 +1,173 @@
+"""
+工事マスタのツリー組み立て
+DynamoDBのフラットなアイテム (nodePath = "DEPT#1#TYPE#2#PROJ#3#TASK#4") を階層構造に変換する
+
+- nodePath はノードごとに1回だけ (親のnodePath, 種別, ID) に分解する (ID は数値なら int)
+- 入力順に依存しない (全ノードを作ってから親に付ける)
+- 兄弟は (種別, ID の数値順) で並べる (DynamoDBのソート順だと "#10" が "#2" より前になる)
+- 親が存在しないノード (孤児) は orphans の指定に従って扱い、件数を stats に記録する
+- 組み立て中は循環GCを止める (ノードは循環参照を作らないが、大量の dict / list 生成で GC が何度も走るため)
+"""
+import gc
+from contextlib import contextmanager
+
+CHILD_KEYS = ("children", "tasks", "safety_equipments")
+
+# 末尾の種別ごとの格納先 (該当しない種別は children)
+CHILD_KEY_BY_KIND = {
+    "TASK": "tasks",
+    "SEQ": "safety_equipments",
+}
+
+# 孤児の扱い
+ORPHANS_AS_ROOT = "root"   # ルートとして返す (従来の動作)
+ORPHANS_DROP = "drop"      # 返さない
+
+
+def parse_segment(path: str) -> tuple | None:
+    """
+    nodePath を (親の nodePath, 種別, ID) に分解する
+    例: "DEPT#1#TYPE#10" -> ("DEPT#1", "TYPE", 10) / ルート "DEPT#1" -> (None, "DEPT", 1)
+    末尾が "種別#ID" の組になっていない場合は None
+    """
+    parts = path.rsplit("#", 2)
+    if len(parts) == 3:
+        parent_path, kind, node_id = parts
+    elif len(parts) == 2:
+        parent_path = None
+        kind, node_id = parts
+    else:
+        return None
+    if not kind or not node_id:
+        return None
+    return parent_path, kind, int(node_id) if node_id.isdigit() else node_id
+
+
+def sibling_sort_key(kind: str, node_id) -> tuple:
+    """兄弟の並び順 (種別 -> 数値ID -> 数値以外のID)"""
+    if isinstance(node_id, int):
+        return kind, 0, node_id, ""
+    return kind, 1, 0, node_id
+
+
+@contextmanager
+def _gc_paused():
+    """循環GCを一時停止する (元々無効なら何もしない)"""
+    if not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def build_tree(flat_items, orphans: str = ORPHANS_AS_ROOT, stats: dict | None = None) -> list:
+    """
+    フラットなDynamoDBアイテムを、用途別の配列を持つ階層構造(Tree)に変換する
+    flat_items はリストでもジェネレータでもよい (ページング取得をそのまま流し込める)
+    stats を渡すと node_count / orphan_count / invalid_path_count を記録する
+    """
+    with _gc_paused():
+        return _build_tree(flat_items, orphans, stats)
+
+
+def _build_tree(flat_items, orphans: str, stats: dict | None) -> list:
+    # 1. ノードを作る (同じ nodePath は最初のものを使う)
+    node_map = {}      # nodePath -> node
+    for item in flat_items:
+        path = item.get("nodePath")
+        if not path or path in node_map:
+            continue
+
+        node = {
+            "id": path,
+            "title": item.get("title"),
+            "children": [],
+            "tasks": [],
+            "safety_equipments": []
+        }
+        # ハイリスクフラグなど、その他の属性
+        if "is_high_risk" in item:
+            node["is_high_risk"] = item["is_high_risk"]
+        node_map[path] = node
+
+    # 2. 親に付ける (全ノードが揃っているので、入力順に関係なく親を引ける)
+    root_nodes = []
+    root_keys = []     # root_nodes と同じ並びの兄弟内の並び順
+    orphan_nodes = []
+    orphan_keys = []
+    child_keys = {}    # id(兄弟の配列) -> 同じ並びの並び順
+    unsorted = {}      # 並び順が崩れた兄弟の配列 (id -> 配列)
+    invalid_count = 0
+
+    for path, node in node_map.items():
+        segment = parse_segment(path)
+        if segment is None:
+            # 形式が不正なパスは親を特定できないため孤児として扱う
+            invalid_count += 1
+            orphan_nodes.append(node)
+            orphan_keys.append(("", 2, 0, path))
+            continue
+
+        parent_path, kind, node_id = segment
+        sort_key = sibling_sort_key(kind, node_id)
+
+        if parent_path is None:
+            root_nodes.append(node)
+            root_keys.append(sort_key)
+            continue
+
+        parent = node_map.get(parent_path)
+        if parent is None:
+            orphan_nodes.append(node)
+            orphan_keys.append(sort_key)
+            continue
+
+        siblings = parent[CHILD_KEY_BY_KIND.get(kind, "children")]
+        if siblings:
+            keys = child_keys[id(siblings)]
+            if sort_key < keys[-1]:
+                unsorted[id(siblings)] = siblings
+            keys.append(sort_key)
+        else:
+            child_keys[id(siblings)] = [sort_key]
+        siblings.append(node)
+
+    if orphans == ORPHANS_AS_ROOT:
+        root_nodes.extend(orphan_nodes)
+        root_keys.extend(orphan_keys)
+
+    if stats is not None:
+        stats["node_count"] = len(node_map)
+        stats["orphan_count"] = len(orphan_nodes)
+        stats["invalid_path_count"] = invalid_count
+
+    # 3. 並び順が崩れた兄弟だけを並べ替える (DynamoDBの返却順なら "#10" の後に "#2" が来た配列のみ)
+    root_nodes[:] = _sorted_by_keys(root_nodes, root_keys)
+    for siblings in unsorted.values():
+        siblings[:] = _sorted_by_keys(siblings, child_keys[id(siblings)])
+
+    return root_nodes
+
+
+def _sorted_by_keys(nodes: list, keys: list) -> list:
+    """keys の順に nodes を並べ替える (並び順は兄弟内で一意)"""
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return [nodes[i] for i in order]
+
+
+def summarize_node(node: dict, depth: int) -> dict:
+    """
+    ノードを depth 階層分だけ返す
+    それより深い階層は配列を省略し、child_counts (子の件数) だけを返す
+    """
+    summary = {k: v for k, v in node.items() if k not in CHILD_KEYS}
+    summary["child_counts"] = {key: len(node.get(key, [])) for key in CHILD_KEYS}
+
+    if depth > 0:
+        for key in CHILD_KEYS:
+            summary[key] = [summarize_node(child, depth - 1) for child in node.get(key, [])]
+
+    return summary
@@ -0,0 +1,184 @@
+"""
+工事マスタのツリーキャッシュ
+
+マスタはシード投入 (scripts/construction_dynamodb.py) の時にしか変わらないため、
+バージョン番号を基準に組み立て済みツリー (や検索インデックスなどの派生データ) をキャッシュする
+
+同じテーブルに以下のアイテムを同居させる (テナントのマスタとはPKが異なるので Query に混ざらない):
+- バージョン:   tenant_id = META#<tenant_id>,  nodePath = VERSION            (version: シード投入ごとに +1)
+- スナップショット: tenant_id = CACHE#<tenant_id>, nodePath = TREE#<deptId or *> (payload: gzip圧縮したJSON)
+                  派生データは nodePath = INDEX#<名前> など、種類ごとに別のキーを使う
+
+参照順: コンテナ内LRU -> スナップショット -> マスタを Query して組み立て (スナップショットを保存)
+- スナップショットを保存するのはツリー全体と、実在するルート (DEPT#1 など) 配下だけ
+  それ以外のプレフィックスはコンテナ内LRUにだけ保持する (クエリパラメータからアイテムを増やされないように)
+- バージョンが未登録の場合はキャッシュしない (バージョン 0 のまま古いデータを返し続けないように)
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import re
+from collections import OrderedDict
+
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+META_PK_PREFIX = "META#"
+CACHE_PK_PREFIX = "CACHE#"
+VERSION_SK = "VERSION"
+TREE_SK_PREFIX = "TREE#"
+ALL_NODES = "*"
+
+# コンテナ内に保持するツリーの数
+TREE_CACHE_SIZE = int(os.environ.get("TREE_CACHE_SIZE", "32"))
+# DynamoDBのアイテム上限 (400KB) に余裕を持たせる
+MAX_SNAPSHOT_BYTES = 350 * 1024
+# スナップショットを保存するプレフィックス (ルートノードの nodePath: "種別#ID")
+ROOT_PREFIX_PATTERN = re.compile(r"^[A-Za-z0-9_-]+#[A-Za-z0-9_-]+$")
+
+# (tenant_id, prefix) -> (version, tree)
+_memory_cache = OrderedDict()
+
+
+def version_key(tenant_id: str) -> dict:
+    return {"tenant_id": f"{META_PK_PREFIX}{tenant_id}", "nodePath": VERSION_SK}
+
+
+def tree_sort_key(prefix: str | None) -> str:
+    return f"{TREE_SK_PREFIX}{prefix or ALL_NODES}"
+
+
+def snapshot_key(tenant_id: str, sort_key: str) -> dict:
+    return {"tenant_id": f"{CACHE_PK_PREFIX}{tenant_id}", "nodePath": sort_key}
+
+
+def get_version(table, tenant_id: str) -> int | None:
+    """マスタのバージョンを取得 (未登録なら None。キャッシュ・ETag を使わない)"""
+    response = table.get_item(Key=version_key(tenant_id), ProjectionExpression="version")
+    item = response.get("Item")
+    if not item or item.get("version") is None:
+        logger.warning("マスタのバージョンが未登録のためキャッシュを使いません", action_category="EXECUTE")
+        return None
+    return int(item["version"])
+
+
+def bump_version(table, tenant_id: str) -> int:
+    """マスタのバージョンを +1 する (シード投入後に呼ぶ)"""
+    response = table.update_item(
+        Key=version_key(tenant_id),
+        UpdateExpression="ADD version :one SET updated_at = :now",
+        ExpressionAttributeValues={":one": 1, ":now": int(time.time())},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["version"])
+
+
+def make_etag(tenant_id: str, prefix: str | None, version: int | None, variant: str = "") -> str | None:
+    """テナント・プレフィックス・バージョン (・表現形式) から ETag を作成 (バージョンが未登録なら None)"""
+    if version is None:
+        return None
+    digest = hashlib.sha1(f"{tenant_id}|{prefix or ALL_NODES}|{version}|{variant}".encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def _remember(cache_key: tuple, version: int, value) -> None:
+    _memory_cache[cache_key] = (version, value)
+    _memory_cache.move_to_end(cache_key)
+    while len(_memory_cache) > TREE_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _load_snapshot(table, tenant_id: str, sort_key: str, version: int):
+    response = table.get_item(Key=snapshot_key(tenant_id, sort_key))
+    item = response.get("Item")
+    if not item or int(item.get("version", -1)) != version:
+        return None
+    return json.loads(gzip.decompress(item["payload"].value))
+
+
+def _save_snapshot(table, tenant_id: str, sort_key: str, version: int, value, item_count: int) -> None:
+    payload = gzip.compress(json.dumps(value, default=str, ensure_ascii=False).encode("utf-8"))
+    if len(payload) > MAX_SNAPSHOT_BYTES:
+        logger.warning(
+            "データが大きすぎるためスナップショットを保存しません",
+            action_category="EXECUTE",
+            snapshot=sort_key,
+            payload_bytes=len(payload)
+        )
+        return
+
+    try:
+        table.put_item(
+            Item={
+                **snapshot_key(tenant_id, sort_key),
+                "version": version,
+                "payload": Binary(payload),
+                "item_count": item_count,
+                "built_at": int(time.time()),
+            },
+            # 古いバージョンで新しいスナップショットを上書きしない
+            ConditionExpression="attribute_not_exists(version) OR version <= :v",
+            ExpressionAttributeValues={":v": version},
+        )
+    except ClientError as e:
+        # キャッシュの保存失敗はレスポンスに影響させない
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            logger.exception("スナップショットの保存に失敗しました", action_category="ERROR")
+
+
+def _always(value) -> bool:
+    return True
+
+
+def get_cached(table, tenant_id: str, sort_key: str, version: int | None, build, stats: dict, persist=_always):
+    """
+    バージョンに対応するデータを取得する (値は JSON にできる形であること)
+    build: キャッシュがない場合にデータを作成する関数 (stats に item_count などを記録する)
+    persist: 作成したデータをスナップショットに保存するかを判定する関数 (None ならコンテナ内LRUだけ使う)
+    stats["cache"] に取得元 (memory / snapshot / query) を記録する
+    """
+    if version is None:
+        stats["cache"] = "query"
+        return build()
+
+    cache_key = (tenant_id, sort_key)
+
+    cached = _memory_cache.get(cache_key)
+    if cached and cached[0] == version:
+        _memory_cache.move_to_end(cache_key)
+        stats["cache"] = "memory"
+        return cached[1]
+
+    value = _load_snapshot(table, tenant_id, sort_key, version) if persist else None
+    if value is not None:
+        stats["cache"] = "snapshot"
+    else:
+        value = build()
+        stats["cache"] = "query"
+        if persist and persist(value):
+            _save_snapshot(table, tenant_id, sort_key, version, value, stats.get("item_count", 0))
+
+    _remember(cache_key, version, value)
+    return value
+
+
+def get_tree(table, tenant_id: str, prefix: str | None, version: int | None, build, stats: dict) -> list:
+    """
+    バージョンに対応するツリーを取得する
+    build: キャッシュがない場合にツリーを組み立てる関数 (stats に item_count などを記録する)
+    stats["cache"] に取得元 (memory / snapshot / query) を記録する
+    スナップショットはツリー全体と、ノードが存在するルート配下だけ保存する
+    """
+    if prefix is None:
+        persist = _always
+    elif ROOT_PREFIX_PATTERN.match(prefix):
+        persist = bool
+    else:
+        persist = None
+    return get_cached(table, tenant_id, tree_sort_key(prefix), version, build, stats, persist=persist)
@@ -0,0 +1,22 @@
+"""
+テナントユーザー情報の取得 (GET /bootstrap 用)
+ETag は s1_auth-user (GET /me) と共通の ndk_common.etag.make_etag で作る
+(フロントエンドはどちらで取得したユーザー情報も同じ ETag でキャッシュできる)
+"""
+import os
+
+from ndk_common import aws
+from ndk_common.etag import make_etag
+
+USER_TABLE_NAME = os.environ.get("TENANT_USER_MASTER_TABLE_NAME")
+
+
+def get_user(tenant_id: str, user_id: str) -> tuple:
+    """
+    ユーザー情報を取得する (ワーカースレッドから呼ばれる)
+    戻り値: (item または None, etag)
+    """
+    # ワーカースレッド用のテーブルは aws.table() がスレッドごとに作成する
+    response = aws.table(USER_TABLE_NAME).get_item(Key={"tenant_id": tenant_id, "user_id": user_id})
+    item = response.get("Item")
+    return item, make_etag(tenant_id, user_id, item)
@@ -44,10 +44,18 @@ data "aws_iam_policy_document" "dynamodb_read" {
     actions = [
       "dynamodb:GetItem",
       "dynamodb:Query", # begins_with などの検索に必須
+      "dynamodb:PutItem", # ツリーのスナップショット (CACHE#<tenant_id>) の保存
       # "dynamodb:BatchGetItem" # 将来必要なら追加
     ]
     resources = [var.construction_master_table_arn]
   }
+
+  # GET /bootstrap でユーザー情報も返すため
+  statement {
+    effect    = "Allow"
+    actions   = ["dynamodb:GetItem"]
+    resources = [var.tenant_user_master_table_arn]
+  }
 }
 
 resource "aws_iam_role_policy" "dynamodb_read" {
@@ -72,10 +80,12 @@ resource "null_resource" "lambda_deps" {
       echo "[s2_tenant-context] install deps with pip"
 
       # 念のため過去の依存を掃除
-      rm -rf aws_lambda_powertools* boto3* __pycache__
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* orjson* brotli* __pycache__
 
       # 依存ライブラリを lambda/ 直下にインストール
-      pip install -r requirements.txt -t .
+      # orjson / brotli はネイティブ拡張を含むため、Lambda (arm64 / Python 3.12) 用のwheelを指定して取得する
+      pip install -r requirements.txt -t . \
+        --platform manylinux2014_aarch64 --implementation cp --python-version 3.12 --only-binary=:all:
 
       echo "[s2_tenant-context] deps installed"
     EOT
@@ -106,6 +116,9 @@ resource "aws_lambda_function" "this" {
 
   kms_key_arn = var.lambda_kms_key_arn
 
+  # powertools / xray / ndk_common は共通レイヤーから読み込む
+  layers = [var.common_layer_arn]
+
 
   filename         = data.archive_file.lambda_zip.output_path
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
@@ -114,6 +127,11 @@ resource "aws_lambda_function" "this" {
     variables = {
       # Pythonコード内の os.environ.get("...") と合わせる
       CONSTRUCTION_MASTER_TABLE_NAME = var.construction_master_table_name
+      TENANT_USER_MASTER_TABLE_NAME  = var.tenant_user_master_table_name
+      # 全件取得を並列クエリに分割するプレフィックス (ルートノードの種類を網羅すること)
+      PARALLEL_QUERY_PREFIXES        = "DEPT#,ENV#"
+      # コンテナ内に保持する組み立て済みツリーの数
+      TREE_CACHE_SIZE                = "32"
       POWERTOOLS_SERVICE_NAME        = "TenantContext"
       LOG_LEVEL                      = "INFO"
     }
@@ -147,6 +165,36 @@ resource "aws_apigatewayv2_route" "get_master" {
   authorizer_id      = var.authorizer_id
 }
 
+# ノード単位の取得 (画面の階層ごとに遅延読み込みする用)
+resource "aws_apigatewayv2_route" "get_master_node" {
+  api_id    = var.api_gateway_id
+  route_key = "GET /construction-master/nodes"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+
+  authorization_type = "JWT"
+  authorizer_id      = var.authorizer_id
+}
+
+# 作業・安全機材のタイトル検索
+resource "aws_apigatewayv2_route" "search_master" {
+  api_id    = var.api_gateway_id
+  route_key = "GET /construction-master/search"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+
+  authorization_type = "JWT"
+  authorizer_id      = var.authorizer_id
+}
+
+# ログイン直後の初期表示用 (ユーザー情報 + 工事マスタ)
+resource "aws_apigatewayv2_route" "bootstrap" {
+  api_id    = var.api_gateway_id
+  route_key = "GET /bootstrap"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+
+  authorization_type = "JWT"
+  authorizer_id      = var.authorizer_id
+}
+
 # ─────────────────────────────
 # 3. 権限設定 (AGWからLambda起動許可)
 # ─────────────────────────────
@@ -3,6 +3,10 @@ variable "name_prefix" { type = string }
 variable "construction_master_table_name" { type = string }
 variable "construction_master_table_arn" { type = string }
 
+# GET /bootstrap (ユーザー情報の取得) 用
+variable "tenant_user_master_table_name" { type = string }
+variable "tenant_user_master_table_arn" { type = string }
+
 # 共通AGW情報
 variable "api_gateway_id" { type = string }
 variable "api_gateway_execution_arn" { type = string }
@@ -12,3 +16,8 @@ variable "lambda_kms_key_arn" {
   description = "KMS key ARN for Lambda environment encryption"
   type        = string
 }
+
+variable "common_layer_arn" {
+  description = "共通 Lambda レイヤーの ARN (infrastructure/layers/common)"
+  type        = string
+}
@@ -0,0 +1,102 @@
+"""
+VQ ジョブの所要時間の集計 (EventBridge で定期実行)
+
+- 直近 SUMMARY_WINDOW_HOURS 時間に完了・失敗したジョブを TerminalHourIndex から時間帯ごとに Query する (テーブルはスキャンしない)
+- テナント × モデルごとに、POST から完了までの所要時間の分布 (ヒストグラム・p50/p95/p99)、ポーリング回数、作り直した回数を集計する
+- テナントごとに1件の集計アイテム (job_id = SUMMARY#LATENCY#<tenant_id>) に上書き保存する
+"""
+import os
+import time
+from decimal import Decimal
+from collections import defaultdict
+
+from aws_lambda_powertools import Logger, Tracer
+
+# VQ レイヤー
+from job_store import JobStore, terminal_hour
+
+logger = Logger()
+tracer = Tracer()
+
+# 環境変数
+SUMMARY_WINDOW_HOURS = int(os.environ.get('SUMMARY_WINDOW_HOURS', '24'))
+
+# ヒストグラムの区切り (秒)。最後の区切りを超えたものは gt_<最後の区切り>s に数える
+HISTOGRAM_BOUNDS_SECONDS = [10, 30, 60, 120, 300, 600, 1800]
+
+jobs = JobStore.from_env()
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法のパーセンタイル"""
+    index = min(len(sorted_values), max(1, -(-pct * len(sorted_values) // 100))) - 1
+    return sorted_values[index]
+
+
+def histogram(latencies_ms):
+    """所要時間のヒストグラム ({'le_10s': 件数, ..., 'gt_1800s': 件数})"""
+    buckets = {f'le_{bound}s': 0 for bound in HISTOGRAM_BOUNDS_SECONDS}
+    buckets[f'gt_{HISTOGRAM_BOUNDS_SECONDS[-1]}s'] = 0
+    for latency in latencies_ms:
+        for bound in HISTOGRAM_BOUNDS_SECONDS:
+            if latency <= bound * 1000:
+                buckets[f'le_{bound}s'] += 1
+                break
+        else:
+            buckets[f'gt_{HISTOGRAM_BOUNDS_SECONDS[-1]}s'] += 1
+    return buckets
+
+
+def summarize(items):
+    """1つのテナント × モデルのジョブの集計"""
+    latencies = sorted(int(item['latency_ms']) for item in items if item.get('latency_ms') is not None)
+    polls = [int(item.get('poll_count') or 0) for item in items]
+    retries = [int(item.get('retry_count') or 0) for item in items]
+
+    summary = {
+        'count': len(items),
+        'completed': sum(1 for item in items if item.get('status') == 'COMPLETED'),
+        'failed': sum(1 for item in items if item.get('status') == 'FAILED'),
+        'histogram': histogram(latencies),
+        'polls_avg': Decimal(str(round(sum(polls) / len(polls), 2))),
+        'recreations_avg': Decimal(str(round(sum(retries) / len(retries), 2))),
+    }
+    if latencies:
+        summary['latency_ms'] = {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1],
+            'avg': sum(latencies) // len(latencies),
+        }
+    return summary
+
+
+@tracer.capture_lambda_handler
+@logger.inject_lambda_context(log_event=False)
+def lambda_handler(event, context):
+    now = int(time.time())
+    window_start = now - SUMMARY_WINDOW_HOURS * 3600
+    logger.info("ジョブ所要時間の集計を開始", action_category="BATCH", window_hours=SUMMARY_WINDOW_HOURS)
+
+    # {tenant_id: {model_id: [ジョブ]}}
+    grouped = defaultdict(lambda: defaultdict(list))
+    job_count = 0
+    for hour_start in range(window_start - window_start % 3600, now + 1, 3600):
+        for item in jobs.query_terminal(terminal_hour(hour_start), since=window_start):
+            grouped[item.get('tenant_id')][item.get('model_id') or 'unknown'].append(item)
+            job_count += 1
+
+    for tenant_id, models in grouped.items():
+        if not tenant_id:
+            continue
+        jobs.put_latency_summary(tenant_id, {
+            'window_start': window_start,
+            'window_end': now,
+            'updated_at': now,
+            'models': {model_id: summarize(items) for model_id, items in models.items()},
+        })
+
+    logger.info("ジョブ所要時間の集計が完了しました", action_category="BATCH",
+                job_count=job_count, tenant_count=len(grouped))
+    return {'job_count': job_count, 'tenant_count': len(grouped)}
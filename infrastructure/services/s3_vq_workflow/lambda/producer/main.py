@@ -1,28 +1,22 @@
-import os
 import json
 import time
-import boto3
-import requests
 from decimal import Decimal
-from botocore.exceptions import ClientError
 
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Tracer, Metrics
+
+# VQ レイヤー (VQ API の呼び出しとジョブの保存は worker と共通)
+from vq_client import VQClient
+from job_store import JobStore
+from ndk_common import timing
 
 logger = Logger()
 tracer = Tracer()
+# 処理段階ごとの所要時間 (ndk_common.timing) もこの Metrics で EMF として出力される
+metrics = Metrics()
 
-# 環境変数
-JOB_TABLE_NAME = os.environ.get('JOB_TABLE_NAME')
-SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
-AUTH_API_URL = os.environ.get('AUTH_API_URL')
-MESSAGE_API_URL = os.environ.get('MESSAGE_API_URL')
-CALLBACK_URL = os.environ.get('CALLBACK_URL')
-VQ_SECRET_ARN = os.environ.get('VQ_SECRET_ARN')
-
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(JOB_TABLE_NAME)
-sqs = boto3.client('sqs')
-secrets = boto3.client('secretsmanager')
+# 認証情報・トークン・接続はコンテナ内で使い回す (環境変数から作成)
+vq = VQClient.from_env()
+jobs = JobStore.from_env()
 
 
 # DynamoDBのDecimal型をJSON変換するためのヘルパー
@@ -33,43 +27,14 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 
-# ---------------------------------------------------
-# 共通関数
-# ---------------------------------------------------
-def get_vq_credentials(target_tenant_id):
-    """Secrets Managerからテナントごとの認証情報を取得"""
-    try:
-        resp = secrets.get_secret_value(SecretId=VQ_SECRET_ARN)
-        secret_json = json.loads(resp.get('SecretString'))
-
-        if isinstance(secret_json, list):
-            target_config = next(
-                (item for item in secret_json if item.get("tenant_id") == target_tenant_id),
-                None
-            )
-            if not target_config:
-                raise Exception(f"Tenant config not found for id: {target_tenant_id}")
-            return target_config['secret_data']
-        else:
-            return secret_json.get('secret_data', secret_json)
-    except Exception as e:
-        logger.exception("シークレット取得に失敗しました", action_category="ERROR")
-        raise e
-
-
-def get_auth_token(api_key, login_id):
-    """VQ API認証トークン取得"""
-    resp = requests.post(AUTH_API_URL, json={"api_key": api_key, "login_id": login_id})
-    resp.raise_for_status()
-    return resp.json().get('token')
-
-
 # ---------------------------------------------------
 # POST: ジョブ作成処理
 # ---------------------------------------------------
 def handle_post(event, context):
     try:
         logger.info("POSTリクエストを処理します", action_category="EXECUTE")
+        # POST を受け付けた時刻 (完了までの所要時間を worker で計測する)
+        submitted_at_ms = int(time.time() * 1000)
 
         body = json.loads(event.get('body', '{}'))
         input_message = body.get('message')
@@ -86,64 +51,30 @@ def handle_post(event, context):
             return {"statusCode": 400, "body": json.dumps({"error": "Missing custom:tenant_id in token"})}
 
         # 認証情報の取得
-        creds = get_vq_credentials(tenant_id)
-        api_key = creds['api_key']
-        login_id = creds['login_id']
-        model_id = creds['model_id']
+        try:
+            creds = vq.get_credentials(tenant_id)
+        except Exception:
+            logger.exception("シークレット取得に失敗しました", action_category="ERROR")
+            raise
 
         # VQ API実行
-        token = get_auth_token(api_key, login_id)
-
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "message": input_message,
-            "model_id": model_id,
-            "callback_url": CALLBACK_URL
-        }
+        logger.debug("VQ APIリクエスト", action_category="EXECUTE", model_id=creds['model_id'], message=input_message)
+        submitted = vq.submit(creds, input_message)
 
-        logger.debug("VQ APIリクエスト", action_category="EXECUTE", model_id=model_id, payload=payload)
-
-        vq_resp = requests.post(MESSAGE_API_URL, json=payload, headers=headers)
-        vq_resp.raise_for_status()
-        vq_data = vq_resp.json()
-
-        tid = vq_data.get('tid')
-        mid = vq_data.get('mid')
+        tid = submitted['tid']
+        mid = submitted['mid']
         job_id = tid  # 今回はtidを主キーとする
 
-        # DynamoDB登録
-        # ★修正: Workerのリトライロジックに合わせて retry_count: 0 を初期設定に追加
-        item = {
-            'job_id': job_id,
-            'tenant_id': tenant_id,
-            'user_id': user_id,
-            'tid': tid,
-            'mid': mid,
-            'input_message': input_message,
-            'status': 'PENDING',
-            'retry_count': 0,
-            'created_at': int(time.time()),
-            'updated_at': int(time.time())
-        }
-        table.put_item(Item=item)
+        # DynamoDB登録 (Workerのリトライロジックに合わせて retry_count: 0 で登録)
+        jobs.create(job_id, tenant_id, user_id, tid, mid, input_message, model_id=creds['model_id'])
 
         logger.info("ジョブをDynamoDBに登録しました", action_category="EXECUTE", job_id=job_id)
 
         # SQS送信 (Workerへ)
-        sqs.send_message(
-            QueueUrl=SQS_QUEUE_URL,
-            MessageBody=json.dumps({
-                'job_id': job_id,
-                'tid': tid,
-                'mid': mid,
-                'tenant_id': tenant_id
-            })
-        )
-
-        logger.info("ジョブをSQSに送信しました", action_category="EXECUTE", job_id=job_id)
+        jobs.enqueue(job_id, tid, mid, tenant_id, submitted_at_ms=submitted_at_ms)
+
+        logger.info("ジョブをSQSに送信しました", action_category="EXECUTE", job_id=job_id,
+                    stage_durations_ms=timing.durations())
 
         return {
             "statusCode": 200,
@@ -178,8 +109,7 @@ def handle_get(event, context):
             return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized: No tenant info"})}
 
         # DynamoDBから取得
-        resp = table.get_item(Key={'job_id': job_id})
-        item = resp.get('Item')
+        item = jobs.get(job_id)
 
         if not item:
             logger.warning("ジョブが見つかりません", action_category="ERROR", job_id=job_id)
@@ -213,7 +143,9 @@ def handle_get(event, context):
 # メインハンドラ
 # ---------------------------------------------------
 @tracer.capture_lambda_handler
+@metrics.log_metrics
 @logger.inject_lambda_context(log_event=False)
+@timing.sample_invocation
 def lambda_handler(event, context):
     # HTTPメソッド判定
     http_method = event.get('requestContext', {}).get('http', {}).get('method')
@@ -1,50 +1,28 @@
 import os
 import json
 import time
-import boto3
-import requests
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Tracer, Metrics
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+# VQ レイヤー (VQ API の呼び出しとジョブの保存は producer と共通)
+from vq_client import VQClient
+from job_store import JobStore, MAX_RETRIES, STATUS_PENDING
+from ndk_common import timing
 
 logger = Logger()
 tracer = Tracer()
+# 処理段階ごとの所要時間 (ndk_common.timing) もこの Metrics で EMF として出力される
+metrics = Metrics()
 
 # 環境変数
-JOB_TABLE_NAME = os.environ.get('JOB_TABLE_NAME')
-SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
-AUTH_API_URL = os.environ.get('AUTH_API_URL')
-MESSAGE_API_URL = os.environ.get('MESSAGE_API_URL')
-CALLBACK_URL = os.environ.get('CALLBACK_URL')
-VQ_SECRET_ARN = os.environ.get('VQ_SECRET_ARN')
 POLLING_INTERVAL = int(os.environ.get('POLLING_INTERVAL'))
+# Lambda の残り時間がこれを切ったら、未確認のメッセージは再配信させる (ミリ秒)
+# VQ API の1回分のタイムアウト (接続 + 読み込み) と、最後のまとめての書き込み・送信が収まるようにする
+REMAINING_TIME_MARGIN_MS = int(os.environ.get('REMAINING_TIME_MARGIN_MS', '15000'))
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(JOB_TABLE_NAME)
-sqs = boto3.client('sqs')
-secrets = boto3.client('secretsmanager')
-
-
-def get_vq_credentials(target_tenant_id):
-    """Producerと同じ認証情報取得ロジック"""
-    try:
-        resp = secrets.get_secret_value(SecretId=VQ_SECRET_ARN)
-        secret_json = json.loads(resp.get('SecretString'))
-        if isinstance(secret_json, list):
-            target_config = next(
-                (item for item in secret_json if item.get("tenant_id") == target_tenant_id), None)
-            if not target_config:
-                raise Exception(f"Tenant config not found for id: {target_tenant_id}")
-            return target_config['secret_data']
-        else:
-            return secret_json.get('secret_data', secret_json)
-    except Exception as e:
-        logger.exception("シークレット取得に失敗しました", action_category="ERROR")
-        raise e
-
-
-def get_auth_token(api_key, login_id):
-    resp = requests.post(AUTH_API_URL, json={"api_key": api_key, "login_id": login_id})
-    resp.raise_for_status()
-    return resp.json().get('token')
+# 認証情報・トークン・接続はコンテナ内で使い回す (環境変数から作成)
+vq = VQClient.from_env()
+jobs = JobStore.from_env()
 
 
 def strip_markdown_code_block(content):
@@ -116,168 +94,292 @@ def is_valid_content(content):
         return False
 
 
-def recreate_job(creds, old_job_item, tenant_id, error_reason=None):
-    """JSONが不正だった場合にジョブを作り直す"""
-    logger.info("ジョブを再作成します", action_category="EXECUTE", old_tid=old_job_item['tid'])
-
-    token = get_auth_token(creds['api_key'], creds['login_id'])
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
+def job_stats(body, polls, model_id, retry_count):
+    """完了・失敗時に保存・出力する統計 (POST からの所要時間・ポーリング回数・作り直した回数)"""
+    submitted_at_ms = body.get('submitted_at_ms')
+    return {
+        'model_id': model_id,
+        'latency_ms': int(time.time() * 1000) - submitted_at_ms if submitted_at_ms else None,
+        'poll_count': polls,
+        'retry_count': retry_count,
     }
 
-    payload = {
-        "message": old_job_item.get('input_message'),
-        "model_id": creds['model_id'],
-        "callback_url": CALLBACK_URL
-    }
-
-    vq_resp = requests.post(MESSAGE_API_URL, json=payload, headers=headers)
-    vq_resp.raise_for_status()
-    vq_data = vq_resp.json()
-
-    new_tid = vq_data.get('tid')
-    new_mid = vq_data.get('mid')
-
-    logger.info("新しいIDを取得しました", action_category="EXECUTE", new_tid=new_tid)
-
-    # DynamoDB更新
-    # error_reasonがある場合は error_msg カラムも更新する
-    update_expression = "set tid=:t, mid=:m, #st=:s, updated_at=:u, retry_count=if_not_exists(retry_count, :zero) + :inc"
-    expression_values = {
-        ':t': new_tid,
-        ':m': new_mid,
-        ':s': 'PENDING',
-        ':u': int(time.time()),
-        ':zero': 0,
-        ':inc': 1
-    }
-
-    if error_reason:
-        update_expression += ", error_msg=:e"
-        expression_values[':e'] = error_reason
-
-    table.update_item(
-        Key={'job_id': old_job_item['job_id']},
-        UpdateExpression=update_expression,
-        ExpressionAttributeNames={'#st': 'status'},
-        ExpressionAttributeValues=expression_values
-    )
 
-    # 新しいSQSメッセージを送信 (Worker自身へ再送)
-    sqs.send_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MessageBody=json.dumps({
-            'job_id': old_job_item['job_id'],
-            'tid': new_tid,
-            'mid': new_mid,
-            'tenant_id': tenant_id
-        })
-    )
-
-    logger.info("ジョブ再作成を完了しました", action_category="EXECUTE", job_id=old_job_item['job_id'])
-
-
-@tracer.capture_lambda_handler
-@logger.inject_lambda_context(log_event=False)
-def lambda_handler(event, context):
-    for record in event['Records']:
+def emit_job_metrics(status, stats):
+    """完了・失敗したジョブのメトリクス (モデルごと)"""
+    dimensions = {'ModelId': stats.get('model_id') or 'unknown', 'Status': status}
+    values = [
+        ('JobLatency', MetricUnit.Milliseconds, stats['latency_ms']),
+        ('JobPolls', MetricUnit.Count, stats['poll_count']),
+        ('JobRecreations', MetricUnit.Count, stats['retry_count']),
+    ]
+    for name, unit, value in values:
+        if value is None:
+            continue
+        with single_metric(name=name, unit=unit, value=value, default_dimensions=dimensions):
+            pass
+
+
+def message_age_ms(record):
+    """SQS にメッセージが送信されてから受け取るまでの時間 (遅延配信の待ち時間を含む)"""
+    sent_at = record.get('attributes', {}).get('SentTimestamp')
+    return int(time.time() * 1000) - int(sent_at) if sent_at else None
+
+
+def bind_job_keys(check):
+    """以降のログにジョブの識別子を付ける (バッチ内のレコードごとに付け替える)"""
+    logger.append_keys(job_id=check['job_id'], tid=check['tid'], tenant_id=check['tenant_id'])
+
+
+def parse_records(records):
+    """
+    SQS のレコードを確認対象 (check) のリストにする
+    戻り値: (checks, 失敗した messageId のリスト)
+    """
+    checks = []
+    failures = []
+    for index, record in enumerate(records):
         try:
             body = json.loads(record['body'])
-            job_id = body.get('job_id')
-            tid = body.get('tid')
-            mid = body.get('mid')
-            tenant_id = body.get('tenant_id')
-
-            logger.append_keys(job_id=job_id, tid=tid, tenant_id=tenant_id)
-            logger.info("ジョブをチェックします", action_category="BATCH")
-
-            # tenant_id がSQSにない場合の復旧ロジック
-            if not tenant_id:
-                item_resp = table.get_item(Key={'job_id': job_id})
-                if 'Item' in item_resp:
-                    tenant_id = item_resp['Item'].get('tenant_id')
-
-            if not tenant_id:
-                logger.error("tenant_idがありません", action_category="ERROR")
-                return  # 処理不能
-
-            # 1. 認証情報取得
-            creds = get_vq_credentials(tenant_id)
-            token = get_auth_token(creds['api_key'], creds['login_id'])
+        except (TypeError, ValueError):
+            logger.exception("メッセージを読み取れませんでした", action_category="ERROR",
+                             message_id=record.get('messageId'))
+            failures.append(record['messageId'])
+            continue
+
+        check = {
+            'entry_id': str(index),
+            'message_id': record['messageId'],
+            'body': body,
+            'job_id': body.get('job_id'),
+            'tid': body.get('tid'),
+            'mid': body.get('mid'),
+            'tenant_id': body.get('tenant_id'),
+            'polls': int(body.get('polls') or 0) + 1,
+        }
+        # キューで待った時間 (ポーリング間隔の遅延を含む)
+        age_ms = message_age_ms(record)
+        if age_ms is not None:
+            metrics.add_metric(name='SqsMessageAge', unit=MetricUnit.Milliseconds, value=age_ms)
+        bind_job_keys(check)
+        logger.info("ジョブをチェックします", action_category="BATCH", sqs_message_age_ms=age_ms)
+        checks.append(check)
+    return checks, failures
+
+
+def restore_tenants(checks):
+    """tenant_id がSQSにない場合の復旧ロジック (ジョブテーブルからまとめて取得する)"""
+    missing = [check for check in checks if not check['tenant_id']]
+    if not missing:
+        return checks
+
+    items = jobs.get_many([check['job_id'] for check in missing])
+    restored = []
+    for check in checks:
+        if not check['tenant_id']:
+            check['tenant_id'] = (items.get(check['job_id']) or {}).get('tenant_id')
+        if not check['tenant_id']:
+            bind_job_keys(check)
+            logger.error("tenant_idがありません", action_category="ERROR")
+            continue  # 処理不能 (このメッセージは破棄する)
+        restored.append(check)
+    return restored
+
+
+def poll_jobs(checks, context):
+    """
+    VQ API でジョブの状態を確認する
+    Lambda の残り時間が REMAINING_TIME_MARGIN_MS を切ったら、残りは確認せずに失敗として返す (再配信させる)
+    戻り値: (確認できた checks, 失敗した messageId のリスト)
+    """
+    polled = []
+    failures = []
+    for index, check in enumerate(checks):
+        if context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+            logger.warning("残り時間が少ないため、残りのメッセージは再配信させます", action_category="BATCH",
+                           remaining_count=len(checks) - index)
+            failures.extend(c['message_id'] for c in checks[index:])
+            break
+
+        bind_job_keys(check)
+        try:
+            # 1. 認証情報取得 (トークンはキャッシュされていれば再取得しない)
+            try:
+                check['creds'] = vq.get_credentials(check['tenant_id'])
+            except Exception:
+                logger.exception("シークレット取得に失敗しました", action_category="ERROR")
+                raise
 
             # 2. ポーリング (GET)
-            url = f"{MESSAGE_API_URL}/{tid}/{mid}"
-            headers = {"Authorization": f"Bearer {token}"}
-
-            resp = requests.get(url, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-
+            data = vq.poll(check['creds'], check['tid'], check['mid'])
             logger.debug("VQ APIレスポンス", action_category="BATCH", response=data)
-
-            # ステータス確認 (processing / done)
-            status = data.get('status')
-
-            if status != 'done':
-                logger.info("ジョブは処理中です。再確認します。", action_category="BATCH", status=status)
-
-                sqs.send_message(
-                    QueueUrl=SQS_QUEUE_URL,
-                    MessageBody=record['body'],
-                    DelaySeconds=POLLING_INTERVAL
-                )
-                return
-
-            # 3. 完了時の検証
-            result_reply = data.get('reply', '')
-
-            if is_valid_content(result_reply):
-                # 成功: DB更新（Markdownコードブロックを除去して保存）
-                logger.info("検証成功 - DynamoDBに保存します", action_category="BATCH")
-                cleaned_reply = strip_markdown_code_block(result_reply)
-                table.update_item(
-                    Key={'job_id': job_id},
-                    UpdateExpression="set #r=:r, #st=:s, updated_at=:u",
-                    ExpressionAttributeNames={'#r': 'reply', '#st': 'status'},
-                    ExpressionAttributeValues={
-                        ':r': cleaned_reply,
-                        ':s': 'COMPLETED',
-                        ':u': int(time.time())
-                    }
-                )
-                logger.info("ジョブ完了", action_category="BATCH", job_id=job_id)
-            else:
-                # 失敗: やり直し (Re-create)
-                logger.warning("検証失敗 - リトライします", action_category="ERROR")
-
-                # 無限ループ防止のための回数チェック
-                resp = table.get_item(Key={'job_id': job_id})
-                if 'Item' in resp:
-                    current_item = resp['Item']
-                    current_retry = int(current_item.get('retry_count', 0))
-
-                    # 例: 3回以上リトライしていたら、あきらめてFAILEDにする
-                    if current_retry >= 3:
-                        logger.error("リトライ上限に達しました - FAILEDに設定", action_category="ERROR", retry_count=current_retry)
-                        table.update_item(
-                            Key={'job_id': job_id},
-                            UpdateExpression="set #st=:s, updated_at=:u, error_msg=:e",
-                            ExpressionAttributeNames={'#st': 'status'},
-                            ExpressionAttributeValues={
-                                ':s': 'FAILED',
-                                ':u': int(time.time()),
-                                ':e': 'Validation failed multiple times. Invalid JSON format.'
-                            }
-                        )
-                        return  # ここで終了（再送しない）
-
-                    # まだ上限に達していなければ再作成
-                    logger.info("リトライ中", action_category="BATCH", retry_count=current_retry + 1)
-                    recreate_job(creds, current_item, tenant_id, error_reason="Validation failed: Invalid JSON format.")
-
-        except Exception as e:
-            # 待機用の例外チェックは不要になったので削除し、予期せぬエラーのみを扱う
+        except Exception:
             logger.exception("ワーカーエラーが発生しました", action_category="ERROR")
-            raise e  # 本当のエラーはDLQ行きにするため raise
\ No newline at end of file
+            failures.append(check['message_id'])
+            continue
+
+        check['status'] = data.get('status')
+        check['reply'] = data.get('reply', '')
+        polled.append(check)
+    return polled, failures
+
+
+def plan_changes(checks):
+    """
+    確認結果から、ジョブテーブルの更新と送信するメッセージを組み立てる (まだ書き込まない)
+    戻り値: (更新のリスト [(check, 種類, update, stats)], メッセージのリスト [(check, entry)], 失敗した messageId のリスト)
+    """
+    updates = []
+    messages = []
+    failures = []
+    invalid = []
+
+    for check in checks:
+        bind_job_keys(check)
+        body = check['body']
+        # ステータス確認 (processing / done)
+        if check['status'] != 'done':
+            logger.info("ジョブは処理中です。再確認します。", action_category="BATCH", status=check['status'])
+            entry = jobs.requeue_entry(check['entry_id'], {**body, 'polls': check['polls']}, POLLING_INTERVAL)
+            messages.append((check, entry))
+            continue
+
+        # 3. 完了時の検証
+        with timing.stage('Validation'):
+            valid = is_valid_content(check['reply'])
+
+        if valid:
+            # 成功: DB更新（Markdownコードブロックを除去して保存）
+            logger.info("検証成功 - DynamoDBに保存します", action_category="BATCH")
+            stats = job_stats(body, check['polls'], check['creds'].get('model_id'), int(body.get('recreations') or 0))
+            update = jobs.complete_update(check['job_id'], strip_markdown_code_block(check['reply']), stats,
+                                          expected_tid=check['tid'])
+            updates.append((check, 'COMPLETED', update, stats))
+        else:
+            # 失敗: やり直し (Re-create)
+            logger.warning("検証失敗 - リトライします", action_category="ERROR")
+            invalid.append(check)
+
+    if not invalid:
+        return updates, messages, failures
+
+    # 無限ループ防止のための回数チェック (検証に失敗したジョブをまとめて取得する)
+    items = jobs.get_many([check['job_id'] for check in invalid])
+    for check in invalid:
+        bind_job_keys(check)
+        current_item = items.get(check['job_id'])
+        if not current_item:
+            continue
+        if current_item.get('status') != STATUS_PENDING:
+            # 別の配信で既に完了している (重複配信)。VQ に送り直さない
+            logger.info("ジョブは既に更新されているため、スキップします", action_category="BATCH",
+                        status=current_item.get('status'))
+            continue
+        if current_item.get('tid') != check['tid']:
+            # 別の配信で再作成済み。その配信が新しい tid の確認メッセージを送れずに終わっていると
+            # ジョブが PENDING のまま残るため、VQ には送り直さず、現在の tid / mid の確認を積む
+            # (確認が重複しても、完了の書き込みは条件付きなので1回だけ反映される)
+            logger.info("ジョブは再作成済みのため、現在のIDを確認します", action_category="BATCH",
+                        current_tid=current_item.get('tid'))
+            entry = jobs.enqueue_entry(
+                check['entry_id'], check['job_id'], current_item.get('tid'), current_item.get('mid'), check['tenant_id'],
+                submitted_at_ms=check['body'].get('submitted_at_ms'),
+                polls=check['polls'],
+                recreations=int(current_item.get('retry_count', 0))
+            )
+            messages.append((check, entry))
+            continue
+        current_retry = int(current_item.get('retry_count', 0))
+
+        # MAX_RETRIES 回以上リトライしていたら、あきらめてFAILEDにする
+        if current_retry >= MAX_RETRIES:
+            stats = job_stats(check['body'], check['polls'], check['creds'].get('model_id'), current_retry)
+            logger.error("リトライ上限に達しました - FAILEDに設定", action_category="ERROR", **stats)
+            update = jobs.fail_update(check['job_id'], 'Validation failed multiple times. Invalid JSON format.',
+                                      stats, expected_tid=check['tid'])
+            updates.append((check, 'FAILED', update, stats))
+            continue
+
+        # まだ上限に達していなければ再作成 (producer と同じ送信処理で新しい tid / mid を取得)
+        logger.info("リトライ中", action_category="BATCH", retry_count=current_retry + 1)
+        try:
+            submitted = vq.submit(check['creds'], current_item.get('input_message'))
+        except Exception:
+            logger.exception("ジョブの再作成に失敗しました", action_category="ERROR")
+            failures.append(check['message_id'])
+            continue
+        logger.info("新しいIDを取得しました", action_category="EXECUTE", new_tid=submitted['tid'])
+
+        update = jobs.recreated_update(check['job_id'], submitted['tid'], submitted['mid'],
+                                       error_reason="Validation failed: Invalid JSON format.",
+                                       expected_tid=check['tid'])
+        # 新しいSQSメッセージ (Worker自身へ再送。所要時間の計測用の値は引き継ぐ)。DynamoDB の更新が成功したものだけ送る
+        check['recreated'] = jobs.enqueue_entry(
+            check['entry_id'], check['job_id'], submitted['tid'], submitted['mid'], check['tenant_id'],
+            submitted_at_ms=check['body'].get('submitted_at_ms'),
+            polls=check['polls'],
+            recreations=current_retry + 1
+        )
+        updates.append((check, 'RECREATED', update, None))
+
+    return updates, messages, failures
+
+
+@tracer.capture_lambda_handler
+@metrics.log_metrics
+@logger.inject_lambda_context(log_event=False)
+@timing.sample_invocation
+def lambda_handler(event, context):
+    """
+    SQS のバッチ (最大 batch_size 件) をまとめて処理する
+    ジョブテーブルの読み込み・更新と SQS への送信はバッチ単位でまとめて行い、
+    処理できなかったメッセージだけを batchItemFailures で返して再配信させる
+    """
+    checks, failures = parse_records(event['Records'])
+    checks = restore_tenants(checks)
+    checks, poll_failures = poll_jobs(checks, context)
+    failures += poll_failures
+
+    updates, messages, plan_failures = plan_changes(checks)
+    failures += plan_failures
+
+    # 4. ジョブテーブルの更新 (まとめて1回のトランザクションで書き込む)
+    try:
+        results = jobs.apply_updates([update for _, _, update, _ in updates]) if updates else []
+    except Exception:
+        logger.exception("ジョブテーブルの更新に失敗しました", action_category="ERROR")
+        results = [None] * len(updates)
+
+    for (check, kind, _, stats), applied in zip(updates, results):
+        bind_job_keys(check)
+        if applied is None:
+            # 更新できなかったものは再配信させる
+            logger.warning("ジョブテーブルを更新できませんでした。再配信させます。", action_category="ERROR", result=kind)
+            failures.append(check['message_id'])
+            continue
+        if not applied:
+            # 別の配信で既に完了・再作成されている (重複配信)
+            logger.info("ジョブは既に更新されているため、スキップします", action_category="BATCH", result=kind)
+            continue
+        if kind == 'RECREATED':
+            messages.append((check, check['recreated']))
+            logger.info("ジョブ再作成を完了しました", action_category="EXECUTE")
+            continue
+        emit_job_metrics(kind, stats)
+        if kind == 'COMPLETED':
+            logger.info("ジョブ完了", action_category="BATCH", **stats, stage_durations_ms=timing.durations())
+
+    # 5. 再確認・再作成のメッセージ (まとめて送信する)
+    if messages:
+        failed_ids = jobs.send_many([entry for _, entry in messages])
+        for check, entry in messages:
+            if entry['Id'] in failed_ids:
+                bind_job_keys(check)
+                logger.error("メッセージの送信に失敗しました", action_category="ERROR")
+                failures.append(check['message_id'])
+
+    logger.remove_keys(['job_id', 'tid', 'tenant_id'])
+    logger.info("バッチを処理しました", action_category="BATCH", record_count=len(event['Records']),
+                failure_count=len(failures), write_count=sum(1 for r in results if r),
+                message_count=len(messages))
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
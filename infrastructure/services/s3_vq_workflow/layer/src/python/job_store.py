@@ -0,0 +1,356 @@
+"""
+VQ ジョブの保存先 (DynamoDB のジョブテーブルと、worker へのメッセージを積む SQS) の操作 (producer / worker 共通)
+
+- ジョブのアイテム・SQS メッセージの形式はここでだけ組み立てる
+- テーブルと SQS のクライアントは引数で差し替えられる (省略時は共通レイヤーの遅延生成クライアントを使う)
+- 書き込み・読み込み・送信は ndk_common.timing の段階 (JobWrite / JobRead / SqsSend) として計測する
+- 完了・失敗時には所要時間などの統計 (latency_ms / poll_count / retry_count / model_id) と完了時刻の時間帯 (terminal_hour) を保存する
+  terminal_hour は完了済みジョブだけが載る GSI (TerminalHourIndex) のキーで、集計 (aggregator) はこれを Query する
+- worker がバッチ単位でまとめて処理できるよう、複数件の読み込み (get_many: BatchGetItem)、
+  状態更新 (apply_updates: TransactWriteItems)、メッセージ送信 (send_many: SendMessageBatch) を用意している
+  状態更新は「PENDING かつ tid が一致する場合だけ」の条件付きで、重複配信されたメッセージで二重に更新しない
+"""
+import os
+import json
+import time
+import random
+
+from botocore.exceptions import ClientError
+
+from ndk_common import aws
+from ndk_common.timing import stage
+
+STATUS_PENDING = 'PENDING'
+STATUS_COMPLETED = 'COMPLETED'
+STATUS_FAILED = 'FAILED'
+
+# 検証失敗で作り直す回数の上限 (これ以上は FAILED にする)
+MAX_RETRIES = int(os.environ.get('JOB_MAX_RETRIES', '3'))
+
+# 完了・失敗したジョブを時間帯ごとに引くための GSI
+TERMINAL_INDEX_NAME = os.environ.get('JOB_TERMINAL_INDEX_NAME', 'TerminalHourIndex')
+
+# テナントごとの所要時間の集計結果を保存するアイテムの job_id (後ろにテナントIDを付ける)
+LATENCY_SUMMARY_PREFIX = 'SUMMARY#LATENCY#'
+
+# API ごとの1回あたりの上限
+BATCH_GET_MAX_KEYS = 100
+TRANSACT_MAX_ITEMS = 100
+SQS_BATCH_MAX_ENTRIES = 10
+
+# BatchGetItem の未処理キー・トランザクションの競合のリトライ回数
+BATCH_MAX_ATTEMPTS = 4
+
+
+def _backoff(attempt):
+    """attempt 回目のリトライまでの待ち時間 (フルジッター)"""
+    time.sleep(random.uniform(0, min(1.0, 0.05 * (2 ** attempt))))
+
+
+def terminal_hour(timestamp):
+    """完了時刻の時間帯 (UTC, 例: 2024-01-01T09)"""
+    return time.strftime('%Y-%m-%dT%H', time.gmtime(timestamp))
+
+
+class JobStore:
+    """ジョブテーブルと SQS の操作"""
+
+    def __init__(self, table_name, queue_url, table=None, sqs=None):
+        self.table_name = table_name
+        self.queue_url = queue_url
+        self._table = table
+        self._sqs = sqs
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Lambda の環境変数から作成する (この時点では通信しない)"""
+        return cls(
+            table_name=os.environ.get('JOB_TABLE_NAME'),
+            queue_url=os.environ.get('SQS_QUEUE_URL'),
+            **kwargs,
+        )
+
+    @property
+    def table(self):
+        # 差し替えていなければ、呼び出したスレッド用のテーブルを使う
+        return self._table if self._table is not None else aws.table(self.table_name)
+
+    @property
+    def sqs(self):
+        return self._sqs if self._sqs is not None else aws.client('sqs')
+
+    # ---------------------------------------------------
+    # DynamoDB
+    # ---------------------------------------------------
+    def create(self, job_id, tenant_id, user_id, tid, mid, input_message, model_id=None):
+        """PENDING のジョブを登録する"""
+        now = int(time.time())
+        item = {
+            'job_id': job_id,
+            'tenant_id': tenant_id,
+            'user_id': user_id,
+            'tid': tid,
+            'mid': mid,
+            'model_id': model_id,
+            'input_message': input_message,
+            'status': STATUS_PENDING,
+            'retry_count': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+        with stage('JobWrite'):
+            self.table.put_item(Item=item)
+        return item
+
+    def get(self, job_id):
+        """ジョブを取得する (なければ None)"""
+        with stage('JobRead'):
+            return self.table.get_item(Key={'job_id': job_id}).get('Item')
+
+    def get_many(self, job_ids):
+        """複数のジョブをまとめて取得する (BatchGetItem)。戻り値: {job_id: アイテム} (ないものは含まない)"""
+        client = self.table.meta.client
+        keys = [{'job_id': job_id} for job_id in dict.fromkeys(job_ids)]
+        found = {}
+        for offset in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            request = {self.table_name: {'Keys': keys[offset:offset + BATCH_GET_MAX_KEYS]}}
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                with stage('JobRead'):
+                    resp = client.batch_get_item(RequestItems=request)
+                for item in resp.get('Responses', {}).get(self.table_name, []):
+                    found[item['job_id']] = item
+                request = resp.get('UnprocessedKeys')
+                if not request:
+                    break
+                _backoff(attempt)
+            else:
+                raise RuntimeError(f'BatchGetItem の未処理キーが残りました: {len(request[self.table_name]["Keys"])} 件')
+        return found
+
+    # ---------------------------------------------------
+    # 状態更新 (update_item の引数を組み立て、1件ずつ / まとめて実行する)
+    # ---------------------------------------------------
+    def _update(self, job_id, values, increment=(), remove=(), expected_tid=None):
+        """
+        update_item の引数 (values の属性を set、increment の属性を +1、remove の属性を削除する)
+        expected_tid を指定した場合は、PENDING かつ tid が一致するときだけ更新する
+        """
+        names = {f'#a{i}': key for i, key in enumerate(values)}
+        expression_values = {f':a{i}': value for i, value in enumerate(values.values())}
+        assignments = [f'#a{i}=:a{i}' for i in range(len(values))]
+        if increment:
+            expression_values.update({':zero': 0, ':inc': 1})
+            assignments += [f'{key}=if_not_exists({key}, :zero) + :inc' for key in increment]
+        expression = 'set ' + ', '.join(assignments)
+        if remove:
+            expression += ' remove ' + ', '.join(remove)
+
+        update = {
+            'Key': {'job_id': job_id},
+            'UpdateExpression': expression,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': expression_values,
+        }
+        if expected_tid is not None:
+            names['#cst'] = 'status'
+            expression_values[':cpending'] = STATUS_PENDING
+            expression_values[':ctid'] = expected_tid
+            update['ConditionExpression'] = '#cst = :cpending AND tid = :ctid'
+        return update
+
+    def _finish_update(self, job_id, status, attributes, stats=None, expected_tid=None):
+        """
+        完了・失敗にする更新 (attributes と統計をまとめて保存する)
+        stats: {'model_id', 'latency_ms', 'poll_count', 'retry_count'} (None の値は保存しない)
+        """
+        now = int(time.time())
+        values = {
+            'status': status,
+            'updated_at': now,
+            'completed_at': now,
+            'terminal_hour': terminal_hour(now),
+            **attributes,
+        }
+        values.update({key: value for key, value in (stats or {}).items() if value is not None})
+        return self._update(job_id, values, expected_tid=expected_tid)
+
+    def complete_update(self, job_id, reply, stats=None, expected_tid=None):
+        """COMPLETED にして結果を保存する更新"""
+        return self._finish_update(job_id, STATUS_COMPLETED, {'reply': reply}, stats, expected_tid)
+
+    def fail_update(self, job_id, error_msg, stats=None, expected_tid=None):
+        """FAILED にする更新"""
+        return self._finish_update(job_id, STATUS_FAILED, {'error_msg': error_msg}, stats, expected_tid)
+
+    def recreated_update(self, job_id, tid, mid, error_reason=None, expected_tid=None):
+        """
+        作り直したジョブの tid / mid を保存し、retry_count を +1 する更新
+        完了済みのジョブを (重複配信などで) 作り直した場合に備えて、集計用のインデックスからは外す
+        """
+        values = {
+            'tid': tid,
+            'mid': mid,
+            'status': STATUS_PENDING,
+            'updated_at': int(time.time()),
+        }
+        # error_reasonがある場合は error_msg カラムも更新する
+        if error_reason:
+            values['error_msg'] = error_reason
+        return self._update(job_id, values, increment=('retry_count',),
+                            remove=('terminal_hour', 'completed_at'), expected_tid=expected_tid)
+
+    def complete(self, job_id, reply, stats=None):
+        """COMPLETED にして結果を保存する"""
+        with stage('JobWrite'):
+            self.table.update_item(**self.complete_update(job_id, reply, stats))
+
+    def fail(self, job_id, error_msg, stats=None):
+        """FAILED にする"""
+        with stage('JobWrite'):
+            self.table.update_item(**self.fail_update(job_id, error_msg, stats))
+
+    def mark_recreated(self, job_id, tid, mid, error_reason=None):
+        """作り直したジョブの tid / mid を保存し、retry_count を +1 する"""
+        with stage('JobWrite'):
+            self.table.update_item(**self.recreated_update(job_id, tid, mid, error_reason))
+
+    def apply_updates(self, updates):
+        """
+        複数の更新をまとめて実行する (TransactWriteItems、100件ずつ。同じジョブへの更新は別のトランザクションに分ける)
+        戻り値: 更新ごとの結果のリスト
+          True: 更新した / False: 条件を満たさず更新しなかった / None: 競合などで BATCH_MAX_ATTEMPTS 回やり直しても更新できなかった
+        条件を満たさなかった更新はトランザクションから除いてやり直す
+        """
+        results = [None] * len(updates)
+        chunks = []
+        chunk, keys = [], set()
+        for index, update in enumerate(updates):
+            job_id = update['Key']['job_id']
+            if len(chunk) >= TRANSACT_MAX_ITEMS or job_id in keys:
+                chunks.append(chunk)
+                chunk, keys = [], set()
+            chunk.append(index)
+            keys.add(job_id)
+        if chunk:
+            chunks.append(chunk)
+
+        for pending in chunks:
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                if attempt:
+                    _backoff(attempt)
+                try:
+                    self._transact([updates[i] for i in pending])
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'TransactionCanceledException':
+                        raise
+                    reasons = e.response.get('CancellationReasons') or [{}] * len(pending)
+                    # 条件を満たさなかったもの (重複配信など) は除き、残りをやり直す
+                    for i, reason in zip(pending, reasons):
+                        if reason.get('Code') == 'ConditionalCheckFailed':
+                            results[i] = False
+                    pending = [i for i in pending if results[i] is None]
+                    if not pending:
+                        break
+                    continue
+                for i in pending:
+                    results[i] = True
+                break
+        return results
+
+    def _transact(self, updates):
+        """update_item の引数のリストを1つのトランザクションで書き込む (テーブルの meta.client は型の変換をしてくれる)"""
+        items = [{'Update': {'TableName': self.table_name, **update}} for update in updates]
+        with stage('JobWrite'):
+            self.table.meta.client.transact_write_items(TransactItems=items)
+
+    def query_terminal(self, hour, since=0):
+        """terminal_hour の時間帯に完了・失敗したジョブ (completed_at >= since) を順に返す"""
+        kwargs = {
+            'IndexName': TERMINAL_INDEX_NAME,
+            'KeyConditionExpression': 'terminal_hour = :h AND completed_at >= :since',
+            'ExpressionAttributeValues': {':h': hour, ':since': since},
+        }
+        while True:
+            with stage('JobRead'):
+                resp = self.table.query(**kwargs)
+            yield from resp.get('Items', [])
+            if 'LastEvaluatedKey' not in resp:
+                return
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    def put_latency_summary(self, tenant_id, summary):
+        """テナントの所要時間の集計結果を保存する (前回の結果は上書きする)"""
+        with stage('JobWrite'):
+            self.table.put_item(Item={
+                'job_id': f'{LATENCY_SUMMARY_PREFIX}{tenant_id}',
+                'tenant_id': tenant_id,
+                **summary
+            })
+
+    # ---------------------------------------------------
+    # SQS
+    # ---------------------------------------------------
+    @staticmethod
+    def message_body(job_id, tid, mid, tenant_id, submitted_at_ms=None, polls=0, recreations=0):
+        """
+        worker に渡すメッセージ
+        submitted_at_ms / polls / recreations は所要時間の計測用 (ジョブの作り直しでも引き継ぐ)
+        """
+        return json.dumps({
+            'job_id': job_id,
+            'tid': tid,
+            'mid': mid,
+            'tenant_id': tenant_id,
+            'submitted_at_ms': submitted_at_ms,
+            'polls': polls,
+            'recreations': recreations
+        })
+
+    def enqueue(self, job_id, tid, mid, tenant_id, submitted_at_ms=None, polls=0, recreations=0):
+        """worker にジョブの確認を依頼する (キューの既定の遅延で配信される)"""
+        with stage('SqsSend'):
+            self.sqs.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=self.message_body(job_id, tid, mid, tenant_id, submitted_at_ms, polls, recreations)
+            )
+
+    def requeue_entry(self, entry_id, body, delay_seconds):
+        """send_many 用: 受け取ったメッセージ (dict) を delay_seconds 秒後に再確認させる"""
+        return {'Id': entry_id, 'MessageBody': json.dumps(body), 'DelaySeconds': delay_seconds}
+
+    def enqueue_entry(self, entry_id, job_id, tid, mid, tenant_id, submitted_at_ms=None, polls=0, recreations=0):
+        """send_many 用: worker にジョブの確認を依頼する"""
+        return {
+            'Id': entry_id,
+            'MessageBody': self.message_body(job_id, tid, mid, tenant_id, submitted_at_ms, polls, recreations),
+        }
+
+    def send_many(self, entries):
+        """
+        複数のメッセージをまとめて送信する (SendMessageBatch、10件ずつ。SQS 側の一時的な失敗はやり直す)
+        戻り値: 送信できなかったエントリーの Id の集合
+        """
+        failed = set()
+        for offset in range(0, len(entries), SQS_BATCH_MAX_ENTRIES):
+            pending = entries[offset:offset + SQS_BATCH_MAX_ENTRIES]
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                if attempt:
+                    _backoff(attempt)
+                with stage('SqsSend'):
+                    resp = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=pending)
+                retry_ids = {f['Id'] for f in resp.get('Failed', []) if not f.get('SenderFault')}
+                failed.update(f['Id'] for f in resp.get('Failed', []) if f.get('SenderFault'))
+                pending = [entry for entry in pending if entry['Id'] in retry_ids]
+                if not pending:
+                    break
+            failed.update(entry['Id'] for entry in pending)
+        return failed
+
+    def requeue(self, body, delay_seconds):
+        """受け取ったメッセージ (dict, ポーリング回数などを更新したもの) を delay_seconds 秒後に再確認させる"""
+        with stage('SqsSend'):
+            self.sqs.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=json.dumps(body),
+                DelaySeconds=delay_seconds
+            )
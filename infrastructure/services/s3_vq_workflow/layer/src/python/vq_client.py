@@ -0,0 +1,166 @@
+"""
+VQ API クライアント (producer / worker 共通)
+
+- 認証情報 (Secrets Manager) はコンテナ内で VQ_SECRET_CACHE_TTL_SECONDS 秒キャッシュする
+- 認証トークンはテナントごとに VQ_TOKEN_CACHE_TTL_SECONDS 秒キャッシュし、401 が返ったら取り直して1回だけやり直す
+- HTTP は requests.Session を使い回す (Keep-Alive で TLS ハンドシェイクを省く)。タイムアウトも必ず指定する
+- Secrets Manager のクライアントと HTTP のセッションは引数で差し替えられる (ローカルの代替実装で動かす場合など)
+- 通信は ndk_common.timing の段階 (SecretFetch / AuthToken / VqSubmit / VqPoll) として計測する
+"""
+import os
+import json
+import time
+import threading
+
+from ndk_common import aws
+from ndk_common.lazy import lazy_import
+from ndk_common.timing import stage
+
+requests = lazy_import('requests')
+
+# キャッシュの有効期間 (0 でキャッシュしない)
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('VQ_SECRET_CACHE_TTL_SECONDS', '300'))
+TOKEN_CACHE_TTL_SECONDS = int(os.environ.get('VQ_TOKEN_CACHE_TTL_SECONDS', '600'))
+
+# HTTP の設定
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('VQ_HTTP_CONNECT_TIMEOUT_SECONDS', '3'))
+HTTP_READ_TIMEOUT_SECONDS = float(os.environ.get('VQ_HTTP_READ_TIMEOUT_SECONDS', '10'))
+HTTP_POOL_SIZE = int(os.environ.get('VQ_HTTP_POOL_SIZE', '10'))
+
+
+def create_session():
+    """接続プール付きの HTTP セッション"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class VQClient:
+    """VQ API の呼び出し (認証情報の取得・トークン取得・メッセージ送信・結果取得)"""
+
+    def __init__(self, secret_arn, auth_url, message_url, callback_url,
+                 secrets_client=None, http=None, clock=time.monotonic):
+        self.secret_arn = secret_arn
+        self.auth_url = auth_url
+        self.message_url = message_url
+        self.callback_url = callback_url
+        self._secrets_client = secrets_client
+        self._http = http
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (取得時刻, シークレットの JSON)
+        self._secret = None
+        # {(api_key, login_id): (取得時刻, トークン)}
+        self._tokens = {}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Lambda の環境変数から作成する (この時点では通信しない)"""
+        return cls(
+            secret_arn=os.environ.get('VQ_SECRET_ARN'),
+            auth_url=os.environ.get('AUTH_API_URL'),
+            message_url=os.environ.get('MESSAGE_API_URL'),
+            callback_url=os.environ.get('CALLBACK_URL'),
+            **kwargs,
+        )
+
+    @property
+    def secrets_client(self):
+        if self._secrets_client is None:
+            self._secrets_client = aws.client('secretsmanager')
+        return self._secrets_client
+
+    @property
+    def http(self):
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    self._http = create_session()
+        return self._http
+
+    def _timeout(self):
+        return (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+
+    # ---------------------------------------------------
+    # 認証情報・トークン
+    # ---------------------------------------------------
+    def _secret_json(self):
+        """シークレット全体 (キャッシュが切れていれば取り直す)"""
+        cached = self._secret
+        if cached is not None and self._clock() - cached[0] < SECRET_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        with stage('SecretFetch'):
+            resp = self.secrets_client.get_secret_value(SecretId=self.secret_arn)
+        secret_json = json.loads(resp.get('SecretString'))
+        self._secret = (self._clock(), secret_json)
+        return secret_json
+
+    def get_credentials(self, tenant_id):
+        """テナントごとの認証情報 (api_key / login_id / model_id)"""
+        secret_json = self._secret_json()
+        if isinstance(secret_json, list):
+            target_config = next(
+                (item for item in secret_json if item.get('tenant_id') == tenant_id),
+                None
+            )
+            if not target_config:
+                raise Exception(f'Tenant config not found for id: {tenant_id}')
+            return target_config['secret_data']
+        return secret_json.get('secret_data', secret_json)
+
+    def get_token(self, creds, refresh=False):
+        """認証トークン (キャッシュがあればそれを返す)"""
+        key = (creds['api_key'], creds['login_id'])
+        cached = self._tokens.get(key)
+        if not refresh and cached is not None and self._clock() - cached[0] < TOKEN_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        with stage('AuthToken'):
+            resp = self.http.post(
+                self.auth_url,
+                json={'api_key': creds['api_key'], 'login_id': creds['login_id']},
+                timeout=self._timeout(),
+            )
+        resp.raise_for_status()
+        token = resp.json().get('token')
+        self._tokens[key] = (self._clock(), token)
+        return token
+
+    def _request(self, method, url, creds, **kwargs):
+        """トークン付きでリクエストする (401 の場合はトークンを取り直して1回だけやり直す)"""
+        for refresh in (False, True):
+            token = self.get_token(creds, refresh=refresh)
+            headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+            resp = self.http.request(method, url, headers=headers, timeout=self._timeout(), **kwargs)
+            if resp.status_code != 401:
+                break
+        resp.raise_for_status()
+        return resp.json()
+
+    # ---------------------------------------------------
+    # メッセージ送信・結果取得
+    # ---------------------------------------------------
+    def submit(self, creds, message):
+        """
+        メッセージを送信してジョブを作成する
+        戻り値: {'tid', 'mid'}
+        """
+        payload = {
+            'message': message,
+            'model_id': creds['model_id'],
+            'callback_url': self.callback_url
+        }
+        # トークンの取得は AuthToken として別に計測する
+        self.get_token(creds)
+        with stage('VqSubmit'):
+            vq_data = self._request('POST', self.message_url, creds, json=payload)
+        return {'tid': vq_data.get('tid'), 'mid': vq_data.get('mid')}
+
+    def poll(self, creds, tid, mid):
+        """ジョブの状態を取得する (status: processing / done, reply)"""
+        self.get_token(creds)
+        with stage('VqPoll'):
+            return self._request('GET', f'{self.message_url}/{tid}/{mid}', creds)
@@ -0,0 +1,23 @@
+"""
+VQ レイヤー (vq_client / job_store) の単体テスト
+
+使い方:
+    pip install pytest boto3 aws-lambda-powertools requests
+    python -m pytest infrastructure/services/s3_vq_workflow/layer/tests
+
+- AWS・VQ API には接続しない (Secrets Manager / HTTP / テーブル / SQS は引数で差し替えたローカルの代替実装を使う)
+- レイヤーと同じく、layer/src/python と共通レイヤー (ndk_common) を import できるようにする
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, '..', '..', '..', '..', '..'))
+
+sys.path.insert(0, os.path.join(HERE, '..', 'src', 'python'))
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'layers', 'common', 'src', 'python'))
+
+# X-Ray には送らない (stage() のサブセグメントは作られない)
+os.environ.setdefault('POWERTOOLS_TRACE_DISABLED', 'true')
+os.environ.setdefault('POWERTOOLS_METRICS_NAMESPACE', 'VQWorkflowTest')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
@@ -0,0 +1,196 @@
+"""JobStore: 更新の組み立て・まとめての読み込み/更新/送信のやり直し"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+import job_store
+from job_store import JobStore, STATUS_COMPLETED, STATUS_PENDING
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(job_store, '_backoff', lambda attempt: None)
+
+
+class FakeClient:
+    """テーブルの meta.client の代替。responses を呼び出し順に返す (例外なら送出する)"""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.calls = []
+
+    def _next(self, name, kwargs):
+        self.calls.append((name, kwargs))
+        response = self.responses.pop(0) if self.responses else {}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def batch_get_item(self, **kwargs):
+        return self._next('batch_get_item', kwargs)
+
+    def transact_write_items(self, **kwargs):
+        return self._next('transact_write_items', kwargs)
+
+
+class FakeTable:
+    def __init__(self, client=None):
+        self.meta = SimpleNamespace(client=client or FakeClient())
+        self.items = {}
+        self.updates = []
+
+    def put_item(self, Item):
+        self.items[Item['job_id']] = Item
+
+    def get_item(self, Key):
+        item = self.items.get(Key['job_id'])
+        return {'Item': item} if item else {}
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+class FakeSqs:
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.batches = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append([entry['Id'] for entry in Entries])
+        return self.responses.pop(0) if self.responses else {'Successful': [{'Id': e['Id']} for e in Entries]}
+
+
+def make_store(table=None, sqs=None):
+    return JobStore('jobs', 'https://sqs/queue', table=table or FakeTable(), sqs=sqs or FakeSqs())
+
+
+def transaction_canceled(*codes):
+    return ClientError(
+        {
+            'Error': {'Code': 'TransactionCanceledException', 'Message': 'canceled'},
+            'CancellationReasons': [{'Code': code} for code in codes],
+        },
+        'TransactWriteItems',
+    )
+
+
+def test_create_and_get():
+    store = make_store()
+    store.create('job-1', 'tenant-a', 'user-1', 't-1', 'm-1', 'hello', model_id='model-1')
+
+    item = store.get('job-1')
+    assert item['status'] == STATUS_PENDING
+    assert item['retry_count'] == 0
+    assert store.get('job-2') is None
+
+
+def test_complete_update_is_conditional_on_pending_and_tid():
+    update = make_store().complete_update('job-1', 'reply', {'latency_ms': 12, 'model_id': None}, expected_tid='t-1')
+
+    assert update['Key'] == {'job_id': 'job-1'}
+    assert update['ConditionExpression'] == '#cst = :cpending AND tid = :ctid'
+    assert update['ExpressionAttributeValues'][':ctid'] == 't-1'
+    values = {update['ExpressionAttributeNames'][f'#{key[1:]}']: value
+              for key, value in update['ExpressionAttributeValues'].items() if key.startswith(':a')}
+    assert values['status'] == STATUS_COMPLETED
+    assert values['reply'] == 'reply'
+    assert values['latency_ms'] == 12
+    assert 'model_id' not in values
+    assert 'terminal_hour' in values
+
+
+def test_recreated_update_increments_retry_count_and_leaves_index():
+    update = make_store().recreated_update('job-1', 't-2', 'm-2', 'invalid reply', expected_tid='t-1')
+
+    expression = update['UpdateExpression']
+    assert 'retry_count=if_not_exists(retry_count, :zero) + :inc' in expression
+    assert expression.endswith(' remove terminal_hour, completed_at')
+    assert update['ExpressionAttributeValues'][':ctid'] == 't-1'
+
+
+def test_single_item_helpers_write_unconditionally():
+    table = FakeTable()
+    store = make_store(table=table)
+    store.complete('job-1', 'reply')
+    store.mark_recreated('job-2', 't-2', 'm-2')
+
+    assert [u['Key']['job_id'] for u in table.updates] == ['job-1', 'job-2']
+    assert all('ConditionExpression' not in u for u in table.updates)
+
+
+def test_get_many_retries_unprocessed_keys():
+    unprocessed = {'jobs': {'Keys': [{'job_id': 'job-2'}]}}
+    client = FakeClient([
+        {'Responses': {'jobs': [{'job_id': 'job-1'}]}, 'UnprocessedKeys': unprocessed},
+        {'Responses': {'jobs': [{'job_id': 'job-2'}]}},
+    ])
+    store = make_store(table=FakeTable(client))
+
+    found = store.get_many(['job-1', 'job-2', 'job-1'])
+
+    assert set(found) == {'job-1', 'job-2'}
+    first, second = (kwargs['RequestItems'] for _, kwargs in client.calls)
+    assert first['jobs']['Keys'] == [{'job_id': 'job-1'}, {'job_id': 'job-2'}]
+    assert second == unprocessed
+
+
+def test_get_many_raises_when_keys_stay_unprocessed():
+    unprocessed = {'UnprocessedKeys': {'jobs': {'Keys': [{'job_id': 'job-1'}]}}}
+    store = make_store(table=FakeTable(FakeClient([unprocessed] * job_store.BATCH_MAX_ATTEMPTS)))
+
+    with pytest.raises(RuntimeError):
+        store.get_many(['job-1'])
+
+
+def test_apply_updates_drops_failed_conditions_and_retries_the_rest():
+    client = FakeClient([transaction_canceled('ConditionalCheckFailed', 'None', 'TransactionConflict'), {}])
+    store = make_store(table=FakeTable(client))
+    updates = [store.complete_update(job_id, 'reply', expected_tid='t') for job_id in ('job-1', 'job-2', 'job-3')]
+
+    assert store.apply_updates(updates) == [False, True, True]
+    retried = client.calls[1][1]['TransactItems']
+    assert [item['Update']['Key']['job_id'] for item in retried] == ['job-2', 'job-3']
+    assert retried[0]['Update']['TableName'] == 'jobs'
+
+
+def test_apply_updates_gives_up_after_max_attempts():
+    client = FakeClient([transaction_canceled('TransactionConflict')] * job_store.BATCH_MAX_ATTEMPTS)
+    store = make_store(table=FakeTable(client))
+
+    assert store.apply_updates([store.fail_update('job-1', 'error', expected_tid='t')]) == [None]
+    assert len(client.calls) == job_store.BATCH_MAX_ATTEMPTS
+
+
+def test_apply_updates_splits_same_job_and_large_batches():
+    client = FakeClient()
+    store = make_store(table=FakeTable(client))
+    updates = [store.complete_update(f'job-{i}', 'reply') for i in range(job_store.TRANSACT_MAX_ITEMS + 5)]
+    updates.insert(1, store.fail_update('job-0', 'error'))
+
+    assert all(store.apply_updates(updates))
+    sizes = [len(kwargs['TransactItems']) for _, kwargs in client.calls]
+    assert sizes == [1, job_store.TRANSACT_MAX_ITEMS, 5]
+
+
+def test_apply_updates_raises_other_errors():
+    error = ClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad'}}, 'TransactWriteItems')
+    store = make_store(table=FakeTable(FakeClient([error])))
+
+    with pytest.raises(ClientError):
+        store.apply_updates([store.complete_update('job-1', 'reply')])
+
+
+def test_send_many_batches_and_retries_only_service_faults():
+    sqs = FakeSqs([
+        {'Failed': [{'Id': '1', 'SenderFault': False}, {'Id': '2', 'SenderFault': True}]},
+        {},
+        {},
+    ])
+    store = make_store(sqs=sqs)
+    entries = [store.enqueue_entry(str(i), f'job-{i}', 't', 'm', 'tenant-a') for i in range(12)]
+
+    assert store.send_many(entries) == {'2'}
+    assert sqs.batches == [[str(i) for i in range(10)], ['1'], ['10', '11']]
+    assert json.loads(entries[0]['MessageBody'])['job_id'] == 'job-0'
@@ -0,0 +1,134 @@
+"""VQClient: 認証情報・トークンのキャッシュと 401 の再認証"""
+import json
+
+import pytest
+
+import vq_client
+from vq_client import VQClient
+
+CREDS = {'api_key': 'key-1', 'login_id': 'login-1', 'model_id': 'model-1'}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeSecrets:
+    """Secrets Manager の代替 (呼び出し回数を数える)"""
+
+    def __init__(self, secret):
+        self.secret = secret
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        return {'SecretString': json.dumps(self.secret)}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+class FakeHttp:
+    """requests.Session の代替。認証のたびに新しいトークンを返し、request は statuses の順に応答する"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.auth_calls = 0
+        self.requests = []
+
+    def post(self, url, json=None, timeout=None):
+        self.auth_calls += 1
+        return FakeResponse(200, {'token': f'token-{self.auth_calls}'})
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        self.requests.append((method, url, headers['Authorization']))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return FakeResponse(status, {'tid': 't-1', 'mid': 'm-1', 'status': 'done'})
+
+
+def make_client(secret=None, statuses=()):
+    clock = FakeClock()
+    secrets = FakeSecrets(secret if secret is not None else {'secret_data': CREDS})
+    http = FakeHttp(statuses)
+    client = VQClient('arn:secret', 'https://vq/auth', 'https://vq/messages', 'https://cb',
+                      secrets_client=secrets, http=http, clock=clock)
+    return client, secrets, http, clock
+
+
+def test_secret_is_cached_until_ttl():
+    client, secrets, _, clock = make_client()
+
+    assert client.get_credentials('tenant-a') == CREDS
+    clock.advance(vq_client.SECRET_CACHE_TTL_SECONDS - 1)
+    client.get_credentials('tenant-a')
+    assert secrets.calls == 1
+
+    clock.advance(1)
+    client.get_credentials('tenant-a')
+    assert secrets.calls == 2
+
+
+def test_credentials_are_selected_by_tenant():
+    other = {'api_key': 'key-2', 'login_id': 'login-2', 'model_id': 'model-2'}
+    client, _, _, _ = make_client(secret=[
+        {'tenant_id': 'tenant-a', 'secret_data': CREDS},
+        {'tenant_id': 'tenant-b', 'secret_data': other},
+    ])
+
+    assert client.get_credentials('tenant-b') == other
+    with pytest.raises(Exception, match='tenant-c'):
+        client.get_credentials('tenant-c')
+
+
+def test_token_is_cached_per_credentials_until_ttl():
+    client, _, http, clock = make_client()
+
+    client.submit(CREDS, 'hello')
+    client.poll(CREDS, 't-1', 'm-1')
+    assert http.auth_calls == 1
+
+    client.get_token({**CREDS, 'login_id': 'login-2'})
+    assert http.auth_calls == 2
+
+    clock.advance(vq_client.TOKEN_CACHE_TTL_SECONDS)
+    client.poll(CREDS, 't-1', 'm-1')
+    assert http.auth_calls == 3
+    assert http.requests[-1][2] == 'Bearer token-3'
+
+
+def test_401_refreshes_token_and_retries_once():
+    client, _, http, _ = make_client(statuses=[401, 200])
+
+    assert client.submit(CREDS, 'hello') == {'tid': 't-1', 'mid': 'm-1'}
+    assert http.auth_calls == 2
+    assert [auth for _, _, auth in http.requests] == ['Bearer token-1', 'Bearer token-2']
+
+    # 取り直したトークンは次の呼び出しでも使う
+    client.poll(CREDS, 't-1', 'm-1')
+    assert http.auth_calls == 2
+    assert http.requests[-1][2] == 'Bearer token-2'
+
+
+def test_second_401_is_raised():
+    client, _, http, _ = make_client(statuses=[401, 401])
+
+    with pytest.raises(RuntimeError, match='401'):
+        client.poll(CREDS, 't-1', 'm-1')
+    assert len(http.requests) == 2
@@ -2,8 +2,11 @@
 # 0. ローカル変数
 # ─────────────────────────────
 locals {
-  producer_src_dir = "${path.module}/lambda/producer"
-  worker_src_dir   = "${path.module}/lambda/worker"
+  producer_src_dir   = "${path.module}/lambda/producer"
+  worker_src_dir     = "${path.module}/lambda/worker"
+  aggregator_src_dir = "${path.module}/lambda/aggregator"
+  # producer / worker / aggregator 共通の VQ レイヤー (vq_client / job_store + requests)
+  vq_layer_src_dir   = "${path.module}/layer/src"
 }
 
 # ─────────────────────────────
@@ -33,7 +36,7 @@ resource "null_resource" "producer_deps" {
     working_dir = local.producer_src_dir
     command = <<-EOT
       echo "[s3_vq_workflow/producer] install deps with pip"
-      rm -rf aws_lambda_powertools* boto3* __pycache__
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* requests* urllib3* certifi* charset_normalizer* idna* __pycache__
       pip install -r requirements.txt -t .
       echo "[s3_vq_workflow/producer] deps installed"
     EOT
@@ -50,13 +53,49 @@ resource "null_resource" "worker_deps" {
     working_dir = local.worker_src_dir
     command = <<-EOT
       echo "[s3_vq_workflow/worker] install deps with pip"
-      rm -rf aws_lambda_powertools* boto3* __pycache__
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* requests* urllib3* certifi* charset_normalizer* idna* __pycache__
       pip install -r requirements.txt -t .
       echo "[s3_vq_workflow/worker] deps installed"
     EOT
   }
 }
 
+# aggregator 用
+resource "null_resource" "aggregator_deps" {
+  triggers = {
+    requirements = filesha256("${local.aggregator_src_dir}/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    working_dir = local.aggregator_src_dir
+    command = <<-EOT
+      echo "[s3_vq_workflow/aggregator] install deps with pip"
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* __pycache__
+      pip install -r requirements.txt -t .
+      echo "[s3_vq_workflow/aggregator] deps installed"
+    EOT
+  }
+}
+
+# VQ レイヤー用
+resource "null_resource" "vq_layer_deps" {
+  triggers = {
+    requirements = filesha256("${path.module}/layer/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    working_dir = local.vq_layer_src_dir
+    command = <<-EOT
+      echo "[s3_vq_workflow/layer] install deps with pip"
+      find python -mindepth 1 -maxdepth 1 ! -name vq_client.py ! -name job_store.py -exec rm -rf {} +
+      pip install -r ../requirements.txt -t python
+      # urllib3 はランタイムの botocore と共用する (別の版を入れると botocore 側も置き換わってしまう)
+      rm -rf python/urllib3*
+      echo "[s3_vq_workflow/layer] deps installed"
+    EOT
+  }
+}
+
 # ─────────────────────────────
 # ソースコードのZIP化
 # ─────────────────────────────
@@ -77,6 +116,33 @@ data "archive_file" "worker_zip" {
   depends_on  = [null_resource.worker_deps]
 }
 
+data "archive_file" "aggregator_zip" {
+  type        = "zip"
+  source_dir  = local.aggregator_src_dir
+  output_path = "${path.module}/aggregator_payload.zip"
+  excludes    = ["__pycache__", ".venv", "*.dist-info", "**/.DS_Store", ".gitkeep"]
+  depends_on  = [null_resource.aggregator_deps]
+}
+
+data "archive_file" "vq_layer_zip" {
+  type        = "zip"
+  source_dir  = local.vq_layer_src_dir
+  output_path = "${path.module}/vq_layer_payload.zip"
+  excludes    = ["**/__pycache__", "python/*.dist-info", "**/.DS_Store", ".gitkeep"]
+  depends_on  = [null_resource.vq_layer_deps]
+}
+
+# ─────────────────────────────
+# VQ レイヤー (producer / worker で共通の VQ API クライアント・ジョブ操作)
+# ─────────────────────────────
+resource "aws_lambda_layer_version" "vq" {
+  layer_name          = "${var.name_prefix}-vq"
+  description         = "vq_client + job_store + requests"
+  filename            = data.archive_file.vq_layer_zip.output_path
+  source_code_hash    = data.archive_file.vq_layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.12"]
+}
+
 # ─────────────────────────────
 # 1. IAM Role: Producer (API受付担当)
 # ─────────────────────────────
@@ -139,9 +205,9 @@ resource "aws_iam_role_policy_attachment" "worker_xray" {
 }
 
 data "aws_iam_policy_document" "worker_policy" {
-  statement { # DynamoDB Read/Update
+  statement { # DynamoDB Read/Update (TransactWriteItems は各アイテムの UpdateItem の権限で実行される)
     effect    = "Allow"
-    actions   = ["dynamodb:GetItem", "dynamodb:UpdateItem"]
+    actions   = ["dynamodb:GetItem", "dynamodb:BatchGetItem", "dynamodb:UpdateItem"]
     resources = [var.job_table_arn]
   }
   statement { # SQS Receive/Delete/Send (★Sendは再試行ロジックで必要)
@@ -182,6 +248,9 @@ resource "aws_lambda_function" "producer" {
   source_code_hash = data.archive_file.producer_zip.output_base64sha256
   kms_key_arn = var.lambda_kms_key_arn
 
+  # powertools / xray / ndk_common は共通レイヤー、vq_client / job_store / requests は VQ レイヤーから読み込む
+  layers = [var.common_layer_arn, aws_lambda_layer_version.vq.arn]
+
   environment {
     variables = {
       JOB_TABLE_NAME   = var.job_table_name
@@ -192,6 +261,11 @@ resource "aws_lambda_function" "producer" {
       AUTH_API_URL     = "${var.external_api_base_url}/public-api/v1/auth"
       MESSAGE_API_URL  = "${var.external_api_base_url}/public-api/v1/message"
       CALLBACK_URL     = "${var.api_endpoint}/webhook"
+
+      # 処理段階ごとの所要時間のメトリクス (EMF)
+      POWERTOOLS_SERVICE_NAME      = "vq-producer"
+      POWERTOOLS_METRICS_NAMESPACE = "${var.name_prefix}"
+      TIMING_SAMPLE_RATE           = var.timing_sample_rate
     }
   }
 
@@ -214,6 +288,9 @@ resource "aws_lambda_function" "worker" {
   source_code_hash = data.archive_file.worker_zip.output_base64sha256
   kms_key_arn = var.lambda_kms_key_arn
 
+  # powertools / xray / ndk_common は共通レイヤー、vq_client / job_store / requests は VQ レイヤーから読み込む
+  layers = [var.common_layer_arn, aws_lambda_layer_version.vq.arn]
+
   reserved_concurrent_executions = 10
 
   environment {
@@ -230,6 +307,11 @@ resource "aws_lambda_function" "worker" {
       # ★追加: ポーリング間隔をここで管理する
       POLLING_INTERVAL = "10"
       AUTH_API_URL     = "${var.external_api_base_url}/public-api/v1/auth"
+
+      # 処理段階ごとの所要時間のメトリクス (EMF)
+      POWERTOOLS_SERVICE_NAME      = "vq-worker"
+      POWERTOOLS_METRICS_NAMESPACE = "${var.name_prefix}"
+      TIMING_SAMPLE_RATE           = var.timing_sample_rate
     }
   }
 
@@ -244,7 +326,11 @@ resource "aws_lambda_function" "worker" {
 resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   event_source_arn = aws_sqs_queue.main.arn
   function_name    = aws_lambda_function.worker.arn
-  batch_size       = 1
+
+  # まとめて受け取り、DynamoDB の読み書き・SQS への送信をバッチ単位で行う
+  batch_size = var.worker_batch_size
+  # 処理できなかったメッセージだけを再配信させる (worker は batchItemFailures を返す)
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 # ─────────────────────────────
@@ -300,7 +386,95 @@ resource "aws_cloudwatch_log_group" "worker_log" {
 }
 
 # ─────────────────────────────
-# 8. KMS Decrypt Policy
+# 8. Aggregator (ジョブ所要時間の定期集計)
+# ─────────────────────────────
+resource "aws_iam_role" "aggregator_role" {
+  name               = "${var.name_prefix}-aggregator-role"
+  assume_role_policy = data.aws_iam_policy_document.assume_role.json
+}
+
+resource "aws_iam_role_policy_attachment" "aggregator_basic" {
+  role       = aws_iam_role.aggregator_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_iam_role_policy_attachment" "aggregator_xray" {
+  role       = aws_iam_role.aggregator_role.name
+  policy_arn = "arn:aws:iam::aws:policy/AWSXRayDaemonWriteAccess"
+}
+
+data "aws_iam_policy_document" "aggregator_policy" {
+  statement { # 完了済みジョブの Query
+    effect    = "Allow"
+    actions   = ["dynamodb:Query"]
+    resources = ["${var.job_table_arn}/index/TerminalHourIndex"]
+  }
+  statement { # 集計アイテムの保存
+    effect    = "Allow"
+    actions   = ["dynamodb:PutItem"]
+    resources = [var.job_table_arn]
+  }
+}
+
+resource "aws_iam_role_policy" "aggregator_policy" {
+  role   = aws_iam_role.aggregator_role.id
+  policy = data.aws_iam_policy_document.aggregator_policy.json
+}
+
+resource "aws_lambda_function" "aggregator" {
+  function_name    = "${var.name_prefix}-aggregator"
+  role             = aws_iam_role.aggregator_role.arn
+  handler          = "main.lambda_handler"
+  runtime          = "python3.12"
+  timeout          = 120
+
+  filename         = data.archive_file.aggregator_zip.output_path
+  source_code_hash = data.archive_file.aggregator_zip.output_base64sha256
+  kms_key_arn = var.lambda_kms_key_arn
+
+  # powertools / xray / ndk_common は共通レイヤー、job_store は VQ レイヤーから読み込む
+  layers = [var.common_layer_arn, aws_lambda_layer_version.vq.arn]
+
+  environment {
+    variables = {
+      JOB_TABLE_NAME          = var.job_table_name
+      SUMMARY_WINDOW_HOURS    = var.latency_summary_window_hours
+      POWERTOOLS_SERVICE_NAME = "vq-aggregator"
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "aggregator_schedule" {
+  name                = "${var.name_prefix}-aggregator-trigger"
+  description         = "Aggregate VQ job latency"
+  schedule_expression = var.latency_summary_schedule
+}
+
+resource "aws_cloudwatch_event_target" "aggregator" {
+  rule      = aws_cloudwatch_event_rule.aggregator_schedule.name
+  target_id = "VqAggregatorLambda"
+  arn       = aws_lambda_function.aggregator.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_aggregator" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.aggregator.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.aggregator_schedule.arn
+}
+
+resource "aws_cloudwatch_log_group" "aggregator_log" {
+  name              = "/aws/lambda/${aws_lambda_function.aggregator.function_name}"
+  retention_in_days = 30
+}
+
+# ─────────────────────────────
+# 9. KMS Decrypt Policy
 # ─────────────────────────────
 data "aws_iam_policy_document" "kms_decrypt" {
   statement {
@@ -320,4 +494,10 @@ resource "aws_iam_role_policy" "kms_decrypt_worker" {
   name   = "kms-decrypt-access-worker"
   role   = aws_iam_role.worker_role.id
   policy = data.aws_iam_policy_document.kms_decrypt.json
-}
\ No newline at end of file
+}
+
+resource "aws_iam_role_policy" "kms_decrypt_aggregator" {
+  name   = "kms-decrypt-access-aggregator"
+  role   = aws_iam_role.aggregator_role.id
+  policy = data.aws_iam_policy_document.kms_decrypt.json
+}
@@ -66,3 +66,32 @@ variable "env" {
   description = "Environment (dev, stg, prod)"
   type        = string
 }
+
+variable "common_layer_arn" {
+  description = "共通 Lambda レイヤーの ARN (infrastructure/layers/common)"
+  type        = string
+}
+
+variable "timing_sample_rate" {
+  description = "処理段階ごとの所要時間をメトリクス・X-Ray に出力する呼び出しの割合 (0〜1)"
+  type        = string
+  default     = "1"
+}
+
+variable "worker_batch_size" {
+  description = "worker が1回の呼び出しで受け取る SQS メッセージの最大件数"
+  type        = number
+  default     = 10
+}
+
+variable "latency_summary_window_hours" {
+  description = "ジョブ所要時間の集計対象とする直近の時間数"
+  type        = string
+  default     = "24"
+}
+
+variable "latency_summary_schedule" {
+  description = "ジョブ所要時間の集計 (aggregator) の実行スケジュール"
+  type        = string
+  default     = "rate(15 minutes)"
+}
@@ -0,0 +1,78 @@
+"""
+action_category の分類
+function_name のキーワードルールを1つの正規表現にまとめ、関数名ごとに結果をキャッシュする
+
+ルールは action_category_rules.json (環境変数 ACTION_CATEGORY_RULES_PATH で変更可) から読み込む
+上から順に評価し、最初にキーワードが含まれたルールのカテゴリを採用する
+"""
+import os
+import re
+import json
+from functools import lru_cache
+
+# 有効なaction_categoryの一覧
+VALID_ACTION_CATEGORIES = {"EXECUTE", "DELETE", "BATCH", "AUTH", "LOGIN", "ERROR"}
+
+RULES_PATH = os.environ.get(
+    "ACTION_CATEGORY_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "action_category_rules.json"),
+)
+# 関数名の種類はごく少数なので、上限付きでキャッシュする
+CACHE_SIZE = int(os.environ.get("ACTION_CATEGORY_CACHE_SIZE", "1024"))
+
+
+def compile_rules(rules: list) -> re.Pattern:
+    """
+    ルールを優先順位付きの単一の正規表現にまとめる
+
+    例: ^(?:(?=.*(?:auth|otp))(?P<AUTH>)|(?=.*(?:login))(?P<LOGIN>))
+    先読みを順番に試すため、ルールの優先順位 (上から順) が保たれる
+    マッチしたルールは match.lastgroup で取得できる
+    """
+    branches = []
+    for rule in rules:
+        category = rule["category"]
+        if category not in VALID_ACTION_CATEGORIES:
+            raise ValueError(f"Invalid action_category in rules: {category}")
+        keywords = "|".join(re.escape(k.lower()) for k in rule["keywords"])
+        branches.append(f"(?=.*(?:{keywords}))(?P<{category}>)")
+    return re.compile("^(?:" + "|".join(branches) + ")", re.DOTALL)
+
+
+def load_rules(path: str = RULES_PATH) -> tuple:
+    """設定ファイルを読み込み (正規表現, デフォルトカテゴリ) を返す"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    default = config.get("default", "EXECUTE")
+    if default not in VALID_ACTION_CATEGORIES:
+        raise ValueError(f"Invalid default action_category in rules: {default}")
+    return compile_rules(config["rules"]), default
+
+
+_MATCHER, DEFAULT_ACTION_CATEGORY = load_rules()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def category_for_function(function_name: str) -> str:
+    """function_name から action_category を推測 (結果はキャッシュされる)"""
+    match = _MATCHER.match(function_name.lower())
+    return match.lastgroup if match else DEFAULT_ACTION_CATEGORY
+
+
+def get_action_category_from_log(msg_data: dict, function_name: str) -> str:
+    """
+    ログデータからaction_categoryを取得
+    1. ログに直接action_categoryがあればそれを使用
+    2. なければlevelとfunction_nameから推測
+    """
+    # 1. ログから直接取得（各Lambdaで出力している場合）
+    action_category = msg_data.get("action_category")
+    if action_category and action_category in VALID_ACTION_CATEGORIES:
+        return action_category
+
+    # 2. フォールバック: エラーは最優先
+    if msg_data.get("level", "INFO") == "ERROR":
+        return "ERROR"
+
+    # 3. function_nameから推測 (関数名ごとにキャッシュ)
+    return category_for_function(function_name)
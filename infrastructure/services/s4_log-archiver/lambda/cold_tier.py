@@ -0,0 +1,91 @@
+"""
+ログのコールド層エクスポート
+1日分のログをテナント単位の Parquet ファイル (zstd圧縮) として S3 に保存する
+
+S3レイアウト (Hiveパーティション形式):
+    s3://<bucket>/<prefix>/tenant_id=<tenant_id>/date=<YYYY-MM-DD>/part-0000.parquet
+
+同じ日を再実行した場合は同じキーに上書きされる (冪等)
+ローカルからの参照は scripts/query_log_cold_tier.py を使用
+"""
+import io
+
+# Parquetに保存する列 (tenant_id / date はパーティション列なのでファイルには含めない)
+COLUMNS = [
+    ("timestamp", "int64"),
+    ("level", "string"),
+    ("message", "string"),
+    ("user_id", "string"),
+    ("function_name", "string"),
+    ("action_category", "string"),
+    ("is_cold_start", "bool"),
+    ("created_at", "string"),
+]
+
+PART_FILE_NAME = "part-0000.parquet"
+
+
+def partition_key(prefix: str, tenant_id: str, date_str: str) -> str:
+    """S3オブジェクトキーを作成"""
+    return f"{prefix.strip('/')}/tenant_id={tenant_id}/date={date_str}/{PART_FILE_NAME}"
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in COLUMNS])
+
+
+def to_parquet_bytes(rows: list) -> bytes:
+    """ログ行のリストを Parquet (zstd圧縮) のバイト列に変換"""
+    # pyarrow は重いので、エクスポート時にだけ読み込む
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    columns = {
+        name: [_coerce(row.get(name), type_name) for row in rows]
+        for name, type_name in COLUMNS
+    }
+    table = pa.Table.from_pydict(columns, schema=schema)
+
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd", use_dictionary=True)
+    return buffer.getvalue()
+
+
+def _coerce(value, type_name: str):
+    # DynamoDB用のDecimalや、ログ由来の文字列 "true" などを列の型に揃える
+    if value is None:
+        return None
+    if type_name == "int64":
+        return int(value)
+    if type_name == "bool":
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    return str(value)
+
+
+def export_day(s3_client, bucket: str, prefix: str, date_str: str, rows_by_tenant: dict) -> dict:
+    """
+    テナントごとに1日分のログをS3に書き込む
+    戻り値: {tenant_id: 書き込んだバイト数}
+    """
+    written = {}
+
+    for tenant_id, rows in rows_by_tenant.items():
+        if not rows:
+            continue
+
+        # 時刻順に並べておくと、min/max統計が効いて期間指定の読み込みが速くなる
+        rows.sort(key=lambda r: r["timestamp"])
+        body = to_parquet_bytes(rows)
+
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=partition_key(prefix, tenant_id, date_str),
+            Body=body,
+            ContentType="application/vnd.apache.parquet",
+        )
+        written[tenant_id] = len(body)
+
+    return written
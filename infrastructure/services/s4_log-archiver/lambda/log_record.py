@@ -0,0 +1,90 @@
+"""
+CloudWatch Logs Insights の結果1行を、DynamoDB保存用アイテムに変換する
+(ハンドラから切り出し、boto3なしでベンチマークできるようにしている)
+"""
+import json
+import datetime
+
+from classifier import get_action_category_from_log
+
+
+def parse_insights_row(row: list, seen_keys: set, expires_at: int) -> tuple | None:
+    """
+    Insightsの結果1行を (DynamoDB保存用アイテム, パース済みメッセージ) に変換する
+    タイムスタンプが不正でキーが作れない場合は None を返す
+    """
+    # CloudWatch Insightsの結果は [{'field': '...', 'value': '...'}, ...] 形式
+    item = {d["field"]: d["value"] for d in row}
+
+    # A. メッセージ内のJSON文字列をパース
+    raw_message = item.get("@message", "{}")
+
+    # 【修正】JSONパースエラー時もログを捨てずに保存する
+    try:
+        msg_data = json.loads(raw_message)
+    except json.JSONDecodeError:
+        # JSONでないログ（PythonのTracebackやタイムアウトログなど）も救済
+        msg_data = {
+            "level": "WARN",          # パースできないので一旦WARN扱い
+            "message": raw_message,   # 生ログをそのままメッセージにする
+            "function_name": "unknown",
+            "user_id": "SYSTEM"
+        }
+
+    # B. タイムスタンプの変換 (ISO -> UNIXミリ秒)
+    try:
+        dt = datetime.datetime.fromisoformat(item["@timestamp"].replace("Z", "+00:00"))
+        ts = int(dt.timestamp() * 1000)
+    except (KeyError, ValueError):
+        # タイムスタンプ自体が不正な場合はDBキーが作れないためスキップ
+        return None
+
+    # CloudWatch Logs Insightsで抽出できた tenant_id を使用
+    tenant_id = item.get("tenant_id", "UNKNOWN")
+
+    # 【修正】キーの重複回避ロジック
+    # まったく同じ tenant_id と timestamp (ミリ秒) が存在する場合、
+    # +1ミリ秒ずつずらして一意性を確保する
+    while (tenant_id, ts) in seen_keys:
+        ts += 1
+
+    # 使用したキーを記録
+    seen_keys.add((tenant_id, ts))
+
+    # C. 各フィールドを抽出
+    level = msg_data.get("level", "INFO")
+    message = msg_data.get("message", "")
+    function_name = msg_data.get("function_name", "unknown")
+    is_cold_start = msg_data.get("cold_start", False)
+
+    # D. action_categoryの取得
+    action_category = get_action_category_from_log(msg_data, function_name)
+
+    # E. DynamoDB保存用アイテムの作成
+    db_item = {
+        # キー (調整済みのタイムスタンプを使用)
+        "tenant_id": tenant_id,
+        "timestamp": ts,
+
+        # ログ本体
+        "level": level,
+        "message": message,
+
+        # コンテキスト
+        "user_id": item.get("user_id", msg_data.get("user_id", "SYSTEM")),
+        "function_name": function_name,
+        "action_category": action_category,
+
+        # GSI用の複合キー (ログ参照APIの絞り込み用)
+        "tenant_action_category": f"{tenant_id}#{action_category}",
+        "tenant_level": f"{tenant_id}#{level}",
+
+        # メタ情報
+        "is_cold_start": is_cold_start,
+        "created_at": item.get("@timestamp"),
+
+        # TTL
+        "expires_at": expires_at
+    }
+
+    return db_item, msg_data
@@ -3,65 +3,44 @@
 昨日のログを集計してDynamoDBに保存する
 """
 import os
-import json
 import time
 import datetime
-import boto3
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer
 
+# 共通レイヤー (boto3 のクライアントは初回アクセス時に作成)
+from ndk_common import aws
+
+from cold_tier import export_day
+from log_record import parse_insights_row
+from parallel_writer import ParallelBatchWriter
+from rollup import RollupAggregator
+
 logger = Logger()
 tracer = Tracer()
 
-logs_client = boto3.client("logs")
-dynamodb = boto3.resource("dynamodb")
+# DynamoDB書き込みの並列数 (ワーカースレッド数)
+WRITE_WORKERS = int(os.environ.get("WRITE_WORKERS", "8"))
 
 TABLE_NAME = os.environ["LOG_ARCHIVE_TABLE"]
 TARGET_LOG_GROUPS = os.environ["TARGET_LOG_GROUPS"].split(",")
+# ロールアップ(集計)アイテムの保持日数 (生ログより長く残す)
+ROLLUP_TTL_DAYS = int(os.environ.get("ROLLUP_TTL_DAYS", "400"))
+# コールド層 (Parquet) の出力先。未設定ならエクスポートしない
+COLD_TIER_BUCKET = os.environ.get("COLD_TIER_BUCKET")
+COLD_TIER_PREFIX = os.environ.get("COLD_TIER_PREFIX", "log-archive")
 
-# 有効なaction_categoryの一覧
-VALID_ACTION_CATEGORIES = {"EXECUTE", "DELETE", "BATCH", "AUTH", "LOGIN", "ERROR"}
-DEFAULT_ACTION_CATEGORY = "EXECUTE"
+# 生ログの保持日数 (TTL)
+LOG_TTL_DAYS = 90
 
 
-def get_action_category_from_log(msg_data: dict, function_name: str) -> str:
+def dynamodb_client():
     """
-    ログデータからaction_categoryを取得
-    1. ログに直接action_categoryがあればそれを使用
-    2. なければlevelとfunction_nameから推測
+    並列書き込み用: クライアントはスレッドセーフなので1つを共有し、接続数をワーカー数に合わせる
+    スロットリング時の再送は ParallelBatchWriter 側で行う
     """
-    # 1. ログから直接取得（各Lambdaで出力している場合）
-    action_category = msg_data.get("action_category")
-    if action_category and action_category in VALID_ACTION_CATEGORIES:
-        return action_category
-
-    # 2. フォールバック: levelとfunction_nameから推測
-    level = msg_data.get("level", "INFO")
-
-    # エラーは最優先
-    if level == "ERROR":
-        return "ERROR"
-
-    # function_nameから推測
-    fn_lower = function_name.lower()
-
-    # 認証系
-    if any(x in fn_lower for x in ["auth", "otp", "token", "verify-challenge", "create-challenge"]):
-        return "AUTH"
-
-    # ログイン系
-    if any(x in fn_lower for x in ["login", "define-auth"]):
-        return "LOGIN"
-
-    # 削除系
-    if any(x in fn_lower for x in ["delete", "remove"]):
-        return "DELETE"
-
-    # バッチ系（EventBridge経由）
-    if any(x in fn_lower for x in ["batch", "scheduled", "archiver", "worker"]):
-        return "BATCH"
-
-    return DEFAULT_ACTION_CATEGORY
+    return aws.client("dynamodb", max_pool_connections=max(10, WRITE_WORKERS),
+                      retries={"max_attempts": 2, "mode": "standard"})
 
 
 @tracer.capture_lambda_handler
@@ -78,9 +57,13 @@ def lambda_handler(event, context):
     - user_id
     - function_name: Lambda関数名
     - action_category: EXECUTE / DELETE / BATCH / AUTH / LOGIN / ERROR
+    - tenant_action_category / tenant_level: GSI用 ("<tenant_id>#<値>")
     - is_cold_start
     - created_at
     - expires_at (TTL)
+
+    同じループでテナント別の日次/時間ロールアップも作成する (rollup.py 参照)
+    COLD_TIER_BUCKET が設定されていれば、1日分をParquetでS3にも保存する (cold_tier.py 参照)
     """
 
     # 1. 集計期間の設定 (昨日 00:00:00 - 23:59:59 UTC)
@@ -108,7 +91,7 @@ def lambda_handler(event, context):
 
     try:
         # 3. クエリ実行開始
-        start_response = logs_client.start_query(
+        start_response = aws.client("logs").start_query(
             logGroupNames=TARGET_LOG_GROUPS,
             startTime=start_time,
             endTime=end_time,
@@ -120,7 +103,7 @@ def lambda_handler(event, context):
 
         # 4. 完了まで待機 (ポーリング)
         while True:
-            response = logs_client.get_query_results(queryId=query_id)
+            response = aws.client("logs").get_query_results(queryId=query_id)
             status = response["status"]
 
             if status in ["Complete", "Failed", "Cancelled"]:
@@ -136,95 +119,76 @@ def lambda_handler(event, context):
 
         logger.info("ログを取得しました", action_category="BATCH", log_count=len(results))
 
-        # 5. DynamoDBへ書き込み
-        table = dynamodb.Table(TABLE_NAME)
+        # 5. DynamoDBへ書き込み (tenant_id のハッシュで振り分けて並列書き込み)
         written_count = 0
         skipped_count = 0
 
         # 【修正】重複チェック用のセット (同じバッチ内でのPK+SK重複を防ぐ)
         seen_keys = set()
 
-        with table.batch_writer() as batch:
-            for row in results:
-                # CloudWatch Insightsの結果は [{'field': '...', 'value': '...'}, ...] 形式
-                item = {d["field"]: d["value"] for d in row}
-
-                # A. メッセージ内のJSON文字列をパース
-                raw_message = item.get("@message", "{}")
-
-                # 【修正】JSONパースエラー時もログを捨てずに保存する
-                try:
-                    msg_data = json.loads(raw_message)
-                except json.JSONDecodeError:
-                    # JSONでないログ（PythonのTracebackやタイムアウトログなど）も救済
-                    msg_data = {
-                        "level": "WARN",          # パースできないので一旦WARN扱い
-                        "message": raw_message,   # 生ログをそのままメッセージにする
-                        "function_name": "unknown",
-                        "user_id": "SYSTEM"
-                    }
-
-                # B. タイムスタンプの変換 (ISO -> UNIXミリ秒)
-                try:
-                    dt = datetime.datetime.fromisoformat(item["@timestamp"].replace("Z", "+00:00"))
-                    ts = int(dt.timestamp() * 1000)
-                except (KeyError, ValueError):
-                    # タイムスタンプ自体が不正な場合はDBキーが作れないためスキップ
-                    skipped_count += 1
-                    continue
-
-                # CloudWatch Logs Insightsで抽出できた tenant_id を使用
-                tenant_id = item.get("tenant_id", "UNKNOWN")
-
-                # 【修正】キーの重複回避ロジック
-                # まったく同じ tenant_id と timestamp (ミリ秒) が存在する場合、
-                # +1ミリ秒ずつずらして一意性を確保する
-                while (tenant_id, ts) in seen_keys:
-                    ts += 1
-
-                # 使用したキーを記録
-                seen_keys.add((tenant_id, ts))
-
-                # C. 各フィールドを抽出
-                level = msg_data.get("level", "INFO")
-                message = msg_data.get("message", "")
-                function_name = msg_data.get("function_name", "unknown")
-                is_cold_start = msg_data.get("cold_start", False)
+        # ダッシュボード用の集計 (テナント x 日/時間)
+        rollup = RollupAggregator()
 
-                # D. action_categoryの取得
-                action_category = get_action_category_from_log(msg_data, function_name)
+        # コールド層エクスポート用 (tenant_id -> 行のリスト)
+        cold_rows = {}
 
-                # E. DynamoDB保存用アイテムの作成
-                db_item = {
-                    # キー (調整済みのタイムスタンプを使用)
-                    "tenant_id": tenant_id,
-                    "timestamp": ts,
+        # TTL (90日後に自動削除) は全行共通なので1回だけ計算
+        expires_at = int(time.time()) + (LOG_TTL_DAYS * 24 * 60 * 60)
 
-                    # ログ本体
-                    "level": level,
-                    "message": message,
-
-                    # コンテキスト
-                    "user_id": item.get("user_id", msg_data.get("user_id", "SYSTEM")),
-                    "function_name": function_name,
-                    "action_category": action_category,
-
-                    # メタ情報
-                    "is_cold_start": is_cold_start,
-                    "created_at": item.get("@timestamp"),
+        with ParallelBatchWriter(dynamodb_client(), TABLE_NAME, workers=WRITE_WORKERS) as batch:
+            for row in results:
+                # A-E. Insightsの1行を保存用アイテムに変換 (log_record.py)
+                parsed = parse_insights_row(row, seen_keys, expires_at)
+                if parsed is None:
+                    skipped_count += 1
+                    continue
 
-                    # TTL (90日後に自動削除)
-                    "expires_at": int(time.time()) + (90 * 24 * 60 * 60)
-                }
+                db_item, msg_data = parsed
+                tenant_id = db_item["tenant_id"]
 
                 batch.put_item(Item=db_item)
                 written_count += 1
 
+                rollup.add(
+                    tenant_id,
+                    db_item["timestamp"],
+                    db_item["level"],
+                    db_item["action_category"],
+                    db_item["function_name"],
+                    msg_data
+                )
+
+                if COLD_TIER_BUCKET:
+                    cold_rows.setdefault(tenant_id, []).append(db_item)
+
+            # F. ロールアップアイテムの書き込み
+            rollup_items = rollup.to_items(int(time.time()) + (ROLLUP_TTL_DAYS * 24 * 60 * 60))
+            for rollup_item in rollup_items:
+                batch.put_item(Item=rollup_item)
+
+        # 6. コールド層 (S3 / Parquet) へのエクスポート
+        if COLD_TIER_BUCKET:
+            exported = export_day(
+                aws.client("s3"),
+                COLD_TIER_BUCKET,
+                COLD_TIER_PREFIX,
+                yesterday.strftime("%Y-%m-%d"),
+                cold_rows
+            )
+            logger.info(
+                "コールド層へのエクスポートが完了しました",
+                action_category="BATCH",
+                tenant_count=len(exported),
+                total_bytes=sum(exported.values())
+            )
+
         logger.info(
             "ログアーカイブが完了しました",
             action_category="BATCH",
             written_count=written_count,
-            skipped_count=skipped_count
+            skipped_count=skipped_count,
+            rollup_count=len(rollup_items),
+            write_stats=batch.stats()
         )
 
     except ClientError as e:
@@ -0,0 +1,214 @@
+"""
+並列 BatchWriteItem ライター
+table.batch_writer() は1リクエスト(25件)ずつ順番に送るため、件数が多い日は時間がかかる
+ワーカースレッドごとにバッチを持ち、tenant_id のハッシュで振り分けて並列に書き込む
+
+- UnprocessedItems / スロットリングは指数バックオフ (ジッタ付き) で再送
+- バックオフ幅はワーカーごとに適応的に調整 (スロットリングで倍増、成功で半減)
+- 書き込み件数・リクエスト数・再送回数などを stats() で取得できる
+- ワーカーで例外が起きても _STOP まではキューを読み続ける (put_item / __exit__ が詰まらない)
+"""
+import time
+import queue
+import random
+import threading
+import zlib
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+MAX_BATCH_SIZE = 25  # BatchWriteItem の上限
+
+# 再送すれば成功する可能性があるエラー
+RETRYABLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+}
+
+_STOP = object()
+
+
+class ParallelBatchWriter:
+    """
+    使い方:
+        with ParallelBatchWriter(client, table_name, workers=4) as writer:
+            writer.put_item(item)
+        writer.stats()
+    """
+
+    def __init__(
+        self,
+        client,
+        table_name: str,
+        workers: int = 4,
+        partition_key: str = "tenant_id",
+        max_retries: int = 10,
+        base_delay: float = 0.05,
+        max_delay: float = 5.0,
+        flush_interval: float = 0.2,
+    ):
+        self._client = client
+        self._table_name = table_name
+        self._workers = max(1, workers)
+        self._partition_key = partition_key
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._flush_interval = flush_interval
+
+        self._serializer = TypeSerializer()
+        self._queues = [queue.Queue(maxsize=MAX_BATCH_SIZE * 40) for _ in range(self._workers)]
+        self._threads = []
+        self._error = None
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "items_written": 0,
+            "requests": 0,
+            "unprocessed_retries": 0,
+            "throttled_retries": 0,
+        }
+        self._started_at = None
+        self._elapsed = 0.0
+
+    # ─────────────────────────────
+    # 公開API
+    # ─────────────────────────────
+    def __enter__(self):
+        self._started_at = time.perf_counter()
+        for index in range(self._workers):
+            thread = threading.Thread(target=self._run, args=(index,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for q, thread in zip(self._queues, self._threads):
+            # ワーカーが止まっている場合に備え、待ち時間を区切って積む
+            while thread.is_alive():
+                try:
+                    q.put(_STOP, timeout=self._flush_interval)
+                    break
+                except queue.Full:
+                    continue
+        for thread in self._threads:
+            thread.join()
+        self._elapsed = time.perf_counter() - self._started_at
+
+        if self._error is not None and exc_type is None:
+            raise self._error
+        return False
+
+    def put_item(self, item: dict) -> None:
+        """アイテムを担当ワーカーのキューに積む (同じテナントは同じワーカーが書き込む)"""
+        if self._error is not None:
+            raise self._error
+
+        key = str(item.get(self._partition_key, "")).encode("utf-8")
+        index = zlib.crc32(key) % self._workers
+        entry = {k: self._serializer.serialize(v) for k, v in item.items()}
+
+        # キューが一杯の間に書き込みエラーが起きたら、待ち続けずに例外にする
+        while True:
+            try:
+                self._queues[index].put(entry, timeout=self._flush_interval)
+                return
+            except queue.Full:
+                if self._error is not None:
+                    raise self._error
+
+    def stats(self) -> dict:
+        """書き込みメトリクス"""
+        elapsed = self._elapsed or (time.perf_counter() - self._started_at if self._started_at else 0.0)
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self._workers
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["items_per_second"] = round(stats["items_written"] / elapsed, 1) if elapsed else 0.0
+        return stats
+
+    # ─────────────────────────────
+    # ワーカー
+    # ─────────────────────────────
+    def _run(self, index: int) -> None:
+        q = self._queues[index]
+        buffer = []
+        delay = self._base_delay
+
+        while True:
+            try:
+                entry = q.get(timeout=self._flush_interval)
+            except queue.Empty:
+                # しばらく入力がなければ、溜まっている分を送る
+                entry = None
+
+            if entry is _STOP:
+                break
+            if entry is not None:
+                buffer.append(entry)
+            if buffer and (entry is None or len(buffer) >= MAX_BATCH_SIZE):
+                delay = self._safe_flush(buffer, delay)
+                buffer = []
+
+        if buffer:
+            self._safe_flush(buffer, delay)
+
+    def _safe_flush(self, items: list, delay: float) -> float:
+        """_flush の予期しない例外 (通信エラー等) も記録し、ワーカーは止めない"""
+        try:
+            return self._flush(items, delay)
+        except Exception as e:
+            self._fail(e)
+            return delay
+
+    def _flush(self, items: list, delay: float) -> float:
+        """25件までのアイテムを書き込む。次回の初期バックオフ幅を返す"""
+        # エラー発生後は書き込まずに読み捨てる (put_item 側で例外にする)
+        if self._error is not None:
+            return delay
+
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        attempts = 0
+
+        while requests:
+            try:
+                response = self._client.batch_write_item(RequestItems={self._table_name: requests})
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in RETRYABLE_ERRORS:
+                    self._fail(e)
+                    return delay
+                self._count("throttled_retries")
+                unprocessed = requests
+            else:
+                self._count("requests")
+                unprocessed = response.get("UnprocessedItems", {}).get(self._table_name, [])
+                self._count("items_written", len(requests) - len(unprocessed))
+                if unprocessed:
+                    self._count("unprocessed_retries")
+
+            if not unprocessed:
+                # 成功したらバックオフ幅を徐々に戻す
+                return max(self._base_delay, delay / 2)
+
+            attempts += 1
+            if attempts > self._max_retries:
+                self._fail(RuntimeError(f"BatchWriteItem retries exhausted ({len(unprocessed)} items)"))
+                return delay
+
+            # 指数バックオフ (フルジッタ)
+            delay = min(self._max_delay, delay * 2)
+            time.sleep(random.uniform(0, delay))
+            requests = unprocessed
+
+        return delay
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def _fail(self, error: Exception) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
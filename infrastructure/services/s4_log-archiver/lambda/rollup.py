@@ -0,0 +1,134 @@
+"""
+ログ集計（ロールアップ）
+アーカイブ処理と同じループで日次/時間単位のカウンタとレイテンシ分位数を計算する
+
+保存形式 (ログアーカイブテーブルに同居):
+- tenant_id (PK): ROLLUP#DAY#<tenant_id> / ROLLUP#HOUR#<tenant_id>
+- timestamp (SK): 集計バケットの開始時刻 (UNIXミリ秒)
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+ROLLUP_PK_PREFIX = "ROLLUP"
+
+# 集計粒度ごとのバケット幅 (ミリ秒)
+GRANULARITIES = {
+    "DAY": 24 * 60 * 60 * 1000,
+    "HOUR": 60 * 60 * 1000,
+}
+
+# 分位数を計算する対象: Powertoolsログに含まれる "_ms" で終わる数値フィールド
+DURATION_FIELD_SUFFIX = "_ms"
+
+
+def rollup_partition_key(granularity: str, tenant_id: str) -> str:
+    """ロールアップアイテムのPKを作成 (例: ROLLUP#DAY#tenant-a)"""
+    return f"{ROLLUP_PK_PREFIX}#{granularity}#{tenant_id}"
+
+
+def percentile(sorted_values: list, p: float):
+    """ソート済みリストから最近傍順位法で分位数を取得"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))  # ceil(n * p / 100)
+    return sorted_values[int(rank) - 1]
+
+
+def _to_decimal(value: float) -> Decimal:
+    # DynamoDBはfloatを扱えないため、小数3桁に丸めてDecimal化
+    return Decimal(str(round(value, 3)))
+
+
+class _Bucket:
+    __slots__ = ("total", "level", "action_category", "function_name", "durations")
+
+    def __init__(self):
+        self.total = 0
+        self.level = defaultdict(int)
+        self.action_category = defaultdict(int)
+        self.function_name = defaultdict(int)
+        self.durations = defaultdict(list)
+
+
+class RollupAggregator:
+    """
+    ログ1行ごとに add() を呼び、最後に to_items() で保存用アイテムを取得する
+    """
+
+    def __init__(self):
+        # (granularity, tenant_id, bucket_start_ms) -> _Bucket
+        self._buckets = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(
+        self,
+        tenant_id: str,
+        ts: int,
+        level: str,
+        action_category: str,
+        function_name: str,
+        msg_data: dict,
+    ) -> None:
+        # 数値のdurationフィールドを一度だけ抽出 (boolはintのサブクラスなので除外)
+        durations = [
+            (key, float(value))
+            for key, value in msg_data.items()
+            if key.endswith(DURATION_FIELD_SUFFIX)
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+        ]
+
+        for granularity, width in GRANULARITIES.items():
+            key = (granularity, tenant_id, ts - ts % width)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+
+            bucket.total += 1
+            bucket.level[level] += 1
+            bucket.action_category[action_category] += 1
+            bucket.function_name[function_name] += 1
+            for field, value in durations:
+                bucket.durations[field].append(value)
+
+    def to_items(self, expires_at: int) -> list:
+        """DynamoDB保存用のロールアップアイテムを作成"""
+        items = []
+
+        for (granularity, tenant_id, bucket_start), bucket in self._buckets.items():
+            durations = {}
+            for field, values in bucket.durations.items():
+                values.sort()
+                durations[field] = {
+                    "count": len(values),
+                    "p50": _to_decimal(percentile(values, 50)),
+                    "p95": _to_decimal(percentile(values, 95)),
+                    "max": _to_decimal(values[-1]),
+                }
+
+            started = datetime.datetime.fromtimestamp(bucket_start / 1000, tz=datetime.timezone.utc)
+
+            items.append({
+                # キー
+                "tenant_id": rollup_partition_key(granularity, tenant_id),
+                "timestamp": bucket_start,
+
+                # 集計対象
+                "target_tenant_id": tenant_id,
+                "granularity": granularity,
+                "bucket_start": started.isoformat(),
+
+                # カウンタ
+                "total": bucket.total,
+                "by_level": dict(bucket.level),
+                "by_action_category": dict(bucket.action_category),
+                "by_function_name": dict(bucket.function_name),
+                "durations": durations,
+
+                "expires_at": expires_at,
+            })
+
+        return items
@@ -48,6 +48,13 @@ data "aws_iam_policy_document" "archiver_policy" {
     ]
     resources = [var.log_archive_table_arn]
   }
+
+  # 3. コールド層 (Parquet) の書き込み先
+  statement {
+    effect    = "Allow"
+    actions   = ["s3:PutObject"]
+    resources = ["${var.cold_tier_bucket_arn}/${var.cold_tier_prefix}/*"]
+  }
 }
 
 resource "aws_iam_role_policy" "archiver_policy" {
@@ -56,31 +63,74 @@ resource "aws_iam_role_policy" "archiver_policy" {
 }
 
 # ─────────────────────────────
-# Lambda 依存ライブラリのインストール（ローカル pip）
+# pyarrow レイヤー
+#  - pyarrow はネイティブ拡張を含み展開後で 100MB を超えるため、関数の ZIP には入れず専用のレイヤーにする
+#  - ZIP が直接アップロードの上限 (50MB) を超えるので、S3 にアップロードしてから登録する
 # ─────────────────────────────
-resource "null_resource" "lambda_deps" {
+locals {
+  # レイヤーのZIPは python/ 以下が /opt/python に展開され、sys.path に追加される
+  pyarrow_layer_dir = "${path.module}/layer"
+}
+
+resource "null_resource" "pyarrow_layer_deps" {
   # requirements.txt が変わったら再実行
   triggers = {
-    requirements = filesha256("${local.lambda_src_dir}/requirements.txt")
+    requirements = filesha256("${local.pyarrow_layer_dir}/requirements.txt")
   }
 
   provisioner "local-exec" {
-    working_dir = local.lambda_src_dir
+    working_dir = local.pyarrow_layer_dir
 
     command = <<-EOT
-      echo "[s4_log-archiver] install deps with pip"
+      echo "[s4_log-archiver] install pyarrow layer with pip"
 
       # 念のため過去の依存を掃除
-      rm -rf aws_lambda_powertools* boto3* __pycache__
+      rm -rf python
+
+      # pyarrow はネイティブ拡張を含むため、Lambda (x86_64 / Python 3.12) 用のwheelを指定して取得する
+      pip install -r requirements.txt -t python \
+        --platform manylinux2014_x86_64 --implementation cp --python-version 3.12 --only-binary=:all:
 
-      # 依存ライブラリを lambda/ 直下にインストール
-      pip install -r requirements.txt -t .
+      # 実行時に使わないファイルを削除して展開サイズを抑える (関数 + レイヤーで 250MB まで)
+      # テスト・型スタブ・Cython のソース・C++ のヘッダー
+      find python -type d \( -name tests -o -name __pycache__ \) -prune -exec rm -rf {} +
+      find python -type f \( -name "*.pyi" -o -name "*.pxd" -o -name "*.pyx" \) -delete
+      rm -rf python/pyarrow/include python/pyarrow/src
 
-      echo "[s4_log-archiver] deps installed"
+      echo "[s4_log-archiver] pyarrow layer installed"
     EOT
   }
 }
 
+data "archive_file" "pyarrow_layer_zip" {
+  type        = "zip"
+  source_dir  = local.pyarrow_layer_dir
+  output_path = "${path.module}/pyarrow_layer_payload.zip"
+  excludes    = ["requirements.txt", "python/*.dist-info", "**/.DS_Store", ".gitkeep"]
+
+  # 先に pip を実行させる
+  depends_on = [null_resource.pyarrow_layer_deps]
+}
+
+resource "aws_s3_object" "pyarrow_layer" {
+  bucket      = var.artifact_bucket_name
+  key         = "${var.artifact_prefix}/${var.name_prefix}/pyarrow_layer_payload.zip"
+  source      = data.archive_file.pyarrow_layer_zip.output_path
+  source_hash = data.archive_file.pyarrow_layer_zip.output_base64sha256
+}
+
+resource "aws_lambda_layer_version" "pyarrow" {
+  layer_name          = "${var.name_prefix}-pyarrow"
+  description         = "pyarrow (Parquet export)"
+  s3_bucket           = aws_s3_object.pyarrow_layer.bucket
+  s3_key              = aws_s3_object.pyarrow_layer.key
+  s3_object_version   = aws_s3_object.pyarrow_layer.version_id
+  source_code_hash    = data.archive_file.pyarrow_layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.12"]
+  # x86_64 用の wheel を入れているため
+  compatible_architectures = ["x86_64"]
+}
+
 # ─────────────────────────────
 # Lambda Function
 # ─────────────────────────────
@@ -90,9 +140,6 @@ data "archive_file" "lambda_zip" {
   output_path = "${path.module}/lambda_payload.zip"
 
   excludes = ["__pycache__", ".venv", "*.dist-info", "**/.DS_Store", ".gitkeep"]
-
-  # 先に pip を実行させる
-  depends_on = [null_resource.lambda_deps]
 }
 
 resource "aws_lambda_function" "this" {
@@ -107,10 +154,17 @@ resource "aws_lambda_function" "this" {
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
 
   kms_key_arn = var.lambda_kms_key_arn
+
+  # powertools / xray / ndk_common は共通レイヤー、pyarrow は専用のレイヤーから読み込む
+  layers = [var.common_layer_arn, aws_lambda_layer_version.pyarrow.arn]
   environment {
     variables = {
       LOG_ARCHIVE_TABLE = var.log_archive_table_name
       TARGET_LOG_GROUPS = join(",", var.target_log_group_names)
+      ROLLUP_TTL_DAYS   = "400" # ダッシュボード用集計は生ログ(90日)より長く保持
+      COLD_TIER_BUCKET  = var.cold_tier_bucket_name
+      COLD_TIER_PREFIX  = var.cold_tier_prefix
+      WRITE_WORKERS     = "8" # DynamoDBへの並列書き込み数
       POWERTOOLS_SERVICE_NAME = "log-archiver"
       LOG_LEVEL               = "INFO"
     }
@@ -9,6 +9,16 @@ variable "region" {
 variable "log_archive_table_name" { type = string }
 variable "log_archive_table_arn" { type = string }
 
+# コールド層 (Parquet) の保存先 (S3)
+variable "cold_tier_bucket_name" { type = string }
+variable "cold_tier_bucket_arn" { type = string }
+
+variable "cold_tier_prefix" {
+  description = "S3 key prefix for the columnar (Parquet) log export"
+  type        = string
+  default     = "log-archive"
+}
+
 # 収集対象のロググループ名
 variable "target_log_group_names" {
   description = "List of CloudWatch Log Group Names to query"
@@ -24,4 +34,21 @@ variable "target_log_group_arns" {
 variable "lambda_kms_key_arn" {
   description = "KMS key ARN for Lambda environment encryption"
   type        = string
-}
\ No newline at end of file
+}
+
+variable "common_layer_arn" {
+  description = "共通 Lambda レイヤーの ARN (infrastructure/layers/common)"
+  type        = string
+}
+
+# デプロイ用の成果物 (50MB を超えるレイヤーの ZIP) のアップロード先 (S3)
+variable "artifact_bucket_name" {
+  description = "S3 bucket for Lambda deployment artifacts (versioning enabled)"
+  type        = string
+}
+
+variable "artifact_prefix" {
+  description = "S3 key prefix for Lambda deployment artifacts"
+  type        = string
+  default     = "lambda-artifacts"
+}
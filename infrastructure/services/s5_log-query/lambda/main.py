@@ -0,0 +1,314 @@
+"""
+ログ参照 API
+s4_log-archiver が保存したログをテナント単位・期間指定で取得する
+
+- 期間指定は timestamp (SK) のキー条件で行う (FilterExpressionは使わない)
+- action_category / level の絞り込みは GSI を使用
+- ページングは不透明なカーソル (LastEvaluatedKey を base64url 化したもの)
+- format=csv の場合は CSV でエクスポート (サイズ上限を超えたら X-Next-Cursor で続きを返す)
+"""
+import os
+import io
+import csv
+import json
+import time
+import base64
+import binascii
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.data_classes import event_source, APIGatewayProxyEventV2
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+# 共通レイヤー (boto3 のクライアントは初回アクセス時に作成)
+from ndk_common import aws
+
+logger = Logger()
+tracer = Tracer()
+
+TABLE_NAME = os.environ.get("LOG_ARCHIVE_TABLE_NAME")
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+DEFAULT_RANGE_MS = 24 * 60 * 60 * 1000  # 期間未指定時は直近24時間
+
+# CSVエクスポートのレスポンスサイズ上限 (Lambdaのレスポンス上限 6MB に余裕を持たせる)
+CSV_MAX_BYTES = int(os.environ.get("CSV_MAX_BYTES", str(5 * 1024 * 1024)))
+CSV_PAGE_SIZE = 1000
+
+# 画面に表示する項目のみ取得する
+DISPLAY_FIELDS = ["timestamp", "level", "message", "user_id", "function_name", "action_category"]
+
+# 絞り込み条件ごとの GSI (パラメータ名 -> (インデックス名, 複合キー属性名))
+FILTER_INDEXES = {
+    "action_category": ("TenantActionCategoryIndex", "tenant_action_category"),
+    "level": ("TenantLevelIndex", "tenant_level"),
+}
+
+
+class InvalidRequest(Exception):
+    """クエリパラメータが不正"""
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    return str(obj)
+
+
+def create_response(status_code: int, body: dict, headers: dict | None = None) -> dict:
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": json.dumps(body, default=_json_default, ensure_ascii=False)
+    }
+
+
+def encode_cursor(last_evaluated_key: dict, index_name: str | None) -> str:
+    """LastEvaluatedKey を不透明なカーソル文字列に変換"""
+    payload = {"i": index_name, "k": last_evaluated_key}
+    raw = json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _key_attributes(index_name: str | None) -> list:
+    """ExclusiveStartKey に必要な属性 (テーブルのキー + GSI のキー)"""
+    attrs = ["tenant_id", "timestamp"]
+    for index, key_attr in FILTER_INDEXES.values():
+        if index == index_name:
+            attrs.append(key_attr)
+    return attrs
+
+
+def decode_cursor(cursor: str, tenant_id: str, index_name: str | None) -> dict:
+    """カーソル文字列を ExclusiveStartKey に戻す (他テナント・別条件のカーソルは拒否)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidRequest("Invalid cursor")
+
+    if not isinstance(payload, dict) or payload.get("i") != index_name:
+        raise InvalidRequest("Invalid cursor")
+
+    # ExclusiveStartKey には、このテナントのテーブル / インデックスのキー属性だけを許す
+    key = payload.get("k")
+    if (
+        not isinstance(key, dict)
+        or set(key) != set(_key_attributes(index_name))
+        or key.get("tenant_id") != tenant_id
+        or not isinstance(key.get("timestamp"), int)
+        or isinstance(key.get("timestamp"), bool)
+        # GSI のキーは "<tenant_id>#<値>"
+        or any(
+            not isinstance(key[attr], str) or not key[attr].startswith(f"{tenant_id}#")
+            for attr in key if attr not in ("tenant_id", "timestamp")
+        )
+    ):
+        raise InvalidRequest("Invalid cursor")
+
+    return key
+
+
+def _int_param(params: dict, name: str, default: int) -> int:
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidRequest(f"Invalid parameter: {name}")
+
+
+def build_query(tenant_id: str, params: dict) -> dict:
+    """クエリパラメータから DynamoDB Query の引数を組み立てる"""
+    now_ms = int(time.time() * 1000)
+    end = _int_param(params, "to", now_ms)
+    start = _int_param(params, "from", end - DEFAULT_RANGE_MS)
+    if start > end:
+        raise InvalidRequest("'from' must be earlier than 'to'")
+
+    # 期間はSKのキー条件で指定する
+    time_condition = Key("timestamp").between(start, end)
+
+    query = {
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(DISPLAY_FIELDS))),
+        "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(DISPLAY_FIELDS)},
+        "ScanIndexForward": params.get("order", "desc") != "desc",
+    }
+
+    # 絞り込み条件があれば GSI を使う (両方指定時は action_category を優先)
+    index_name = None
+    for param_name, (index, key_attr) in FILTER_INDEXES.items():
+        value = params.get(param_name)
+        if value:
+            index_name = index
+            query["IndexName"] = index
+            query["KeyConditionExpression"] = Key(key_attr).eq(f"{tenant_id}#{value}") & time_condition
+            break
+    else:
+        query["KeyConditionExpression"] = Key("tenant_id").eq(tenant_id) & time_condition
+
+    # action_category と level が両方指定された場合、level は GSI の結果に対して絞り込む
+    if index_name == FILTER_INDEXES["action_category"][0] and params.get("level"):
+        query["FilterExpression"] = Attr("level").eq(params["level"])
+
+    cursor = params.get("cursor")
+    if cursor:
+        query["ExclusiveStartKey"] = decode_cursor(cursor, tenant_id, index_name)
+
+    return query
+
+
+def _cursor_from(response: dict, query: dict) -> str | None:
+    last_key = response.get("LastEvaluatedKey")
+    if not last_key:
+        return None
+    return encode_cursor(last_key, query.get("IndexName"))
+
+
+def query_page(table, query: dict, limit: int) -> tuple:
+    """1ページ分のログを取得"""
+    response = table.query(Limit=limit, **query)
+    return response.get("Items", []), _cursor_from(response, query)
+
+
+def export_csv(table, query: dict) -> tuple:
+    """
+    CSVを生成する
+    上限サイズ (UTF-8 のバイト数) を超える行の手前で打ち切り、続きのカーソルを返す
+    """
+    index_name = query.get("IndexName")
+    key_attrs = _key_attributes(index_name)
+
+    # 途中の行で打ち切ったときにカーソルを作れるよう、キー属性も射影する (CSVには出力しない)
+    names = dict(query["ExpressionAttributeNames"])
+    projection = query["ProjectionExpression"]
+    for i, attr in enumerate(a for a in key_attrs if a not in DISPLAY_FIELDS):
+        names[f"#k{i}"] = attr
+        projection += f", #k{i}"
+    query = {**query, "ExpressionAttributeNames": names, "ProjectionExpression": projection}
+
+    row_buffer = io.StringIO()
+    writer = csv.DictWriter(row_buffer, fieldnames=DISPLAY_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    chunks = [row_buffer.getvalue()]
+    total_bytes = len(chunks[0].encode("utf-8"))
+
+    row_count = 0
+    page_count = 0
+    next_cursor = None
+    last_item = None
+
+    while True:
+        response = table.query(Limit=CSV_PAGE_SIZE, **query)
+        page_count += 1
+
+        for item in response.get("Items", []):
+            row_buffer.seek(0)
+            row_buffer.truncate()
+            writer.writerow({k: _json_default(v) if isinstance(v, Decimal) else v for k, v in item.items()})
+            row_text = row_buffer.getvalue()
+            row_bytes = len(row_text.encode("utf-8"))
+
+            if last_item is not None and total_bytes + row_bytes > CSV_MAX_BYTES:
+                # 最後に書き込んだ行のキーから再開すれば重複・欠落しない
+                next_cursor = encode_cursor({k: last_item[k] for k in key_attrs}, index_name)
+                break
+
+            chunks.append(row_text)
+            total_bytes += row_bytes
+            row_count += 1
+            last_item = item
+
+        last_key = response.get("LastEvaluatedKey")
+        if next_cursor is not None or not last_key:
+            break
+
+        query = {**query, "ExclusiveStartKey": last_key}
+
+    logger.info(
+        "CSVを生成しました",
+        action_category="EXECUTE",
+        row_count=row_count,
+        page_count=page_count,
+        byte_count=total_bytes,
+        truncated=next_cursor is not None
+    )
+
+    return "".join(chunks), next_cursor
+
+
+@tracer.capture_lambda_handler
+@event_source(data_class=APIGatewayProxyEventV2)
+@logger.inject_lambda_context(log_event=False)
+def lambda_handler(event: APIGatewayProxyEventV2, context: LambdaContext):
+    """
+    ログ参照API
+    GET /logs?from=&to=&action_category=&level=&limit=&cursor=&order=&format=csv
+    """
+    raw_claims = (
+        event.raw_event.get("requestContext", {})
+        .get("authorizer", {})
+        .get("jwt", {})
+        .get("claims", {})
+    )
+
+    tenant_id = raw_claims.get("custom:tenant_id") or raw_claims.get("tenant_id")
+
+    if not tenant_id:
+        logger.warning("トークンにtenant_idがありません", action_category="ERROR")
+        logger.debug("受信したclaims", action_category="EXECUTE", claims=raw_claims)
+        return create_response(400, {"message": "Invalid token"})
+
+    logger.append_keys(tenant_id=tenant_id)
+
+    params = event.query_string_parameters or {}
+    export_format = params.get("format", "json")
+
+    try:
+        query = build_query(tenant_id, params)
+        limit = min(max(_int_param(params, "limit", DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except InvalidRequest as e:
+        logger.warning("クエリパラメータが不正です", action_category="ERROR", error=str(e))
+        return create_response(400, {"message": str(e)})
+
+    logger.info(
+        "ログを取得します",
+        action_category="EXECUTE",
+        index_name=query.get("IndexName"),
+        export_format=export_format
+    )
+
+    try:
+        table = aws.table(TABLE_NAME)
+
+        if export_format == "csv":
+            body, next_cursor = export_csv(table, query)
+            headers = {
+                "Content-Type": "text/csv; charset=utf-8",
+                "Content-Disposition": 'attachment; filename="logs.csv"',
+            }
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            return {"statusCode": 200, "headers": headers, "body": body}
+
+        items, next_cursor = query_page(table, query, limit)
+
+        logger.info("ログを取得しました", action_category="EXECUTE", item_count=len(items))
+
+    except ClientError as e:
+        # 改ざんされたカーソル等で ExclusiveStartKey が不正な場合
+        if e.response["Error"]["Code"] == "ValidationException":
+            logger.warning("クエリが不正です", action_category="ERROR")
+            return create_response(400, {"message": "Invalid query"})
+        logger.exception("DynamoDBクエリに失敗しました", action_category="ERROR")
+        return create_response(500, {"message": "Database error"})
+    except Exception:
+        logger.exception("予期しないエラーが発生しました", action_category="ERROR")
+        return create_response(500, {"message": "Internal server error"})
+
+    return create_response(200, {"items": items, "nextCursor": next_cursor})
@@ -0,0 +1,183 @@
+# ─────────────────────────────
+# 0. ローカル変数
+# ─────────────────────────────
+locals {
+  # Lambda のソースコードディレクトリ
+  lambda_src_dir = "${path.module}/lambda"
+}
+
+# ─────────────────────────────
+# 1. IAM Role & Lambda Function
+# ─────────────────────────────
+
+data "aws_iam_policy_document" "assume_role" {
+  statement {
+    actions = ["sts:AssumeRole"]
+    principals {
+      type        = "Service"
+      identifiers = ["lambda.amazonaws.com"]
+    }
+  }
+}
+
+resource "aws_iam_role" "this" {
+  name               = "${var.name_prefix}-role"
+  assume_role_policy = data.aws_iam_policy_document.assume_role.json
+}
+
+# 基本ポリシー (CloudWatch Logs)
+resource "aws_iam_role_policy_attachment" "basic" {
+  role       = aws_iam_role.this.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+# X-Ray トレース (Powertools用)
+resource "aws_iam_role_policy_attachment" "xray" {
+  role       = aws_iam_role.this.name
+  policy_arn = "arn:aws:iam::aws:policy/AWSXRayDaemonWriteAccess"
+}
+
+# DynamoDB 読み取り権限 (テーブル本体 + GSI への Query)
+data "aws_iam_policy_document" "dynamodb_read" {
+  statement {
+    effect    = "Allow"
+    actions   = ["dynamodb:Query"]
+    resources = [
+      var.log_archive_table_arn,
+      "${var.log_archive_table_arn}/index/*"
+    ]
+  }
+}
+
+resource "aws_iam_role_policy" "dynamodb_read" {
+  name   = "dynamodb-read-access"
+  role   = aws_iam_role.this.id
+  policy = data.aws_iam_policy_document.dynamodb_read.json
+}
+
+# ─────────────────────────────
+# Lambda 依存ライブラリのインストール（ローカルで pip 実行）
+# ─────────────────────────────
+resource "null_resource" "lambda_deps" {
+  # requirements.txt が変わったら再実行
+  triggers = {
+    requirements = filesha256("${local.lambda_src_dir}/requirements.txt")
+  }
+
+  provisioner "local-exec" {
+    working_dir = local.lambda_src_dir
+
+    command = <<-EOT
+      echo "[s5_log-query] install deps with pip"
+
+      # 念のため過去の依存を掃除
+      rm -rf aws_lambda_powertools* aws_xray_sdk* boto3* botocore* wrapt* __pycache__
+
+      # 依存ライブラリを lambda/ 直下にインストール
+      pip install -r requirements.txt -t .
+
+      echo "[s5_log-query] deps installed"
+    EOT
+  }
+}
+
+# ─────────────────────────────
+# Lambda ソースコードのZIP化
+# ─────────────────────────────
+data "archive_file" "lambda_zip" {
+  type        = "zip"
+  source_dir  = local.lambda_src_dir
+  output_path = "${path.module}/lambda_payload.zip"
+  excludes    = ["__pycache__", ".venv", "*.dist-info", "**/.DS_Store", ".gitkeep"]
+
+  # 先に pip 実行してから ZIP させる
+  depends_on = [null_resource.lambda_deps]
+}
+
+resource "aws_lambda_function" "this" {
+  function_name = var.name_prefix
+  role          = aws_iam_role.this.arn
+  handler       = "main.lambda_handler"
+  runtime       = "python3.12"
+  architectures = ["arm64"]
+  timeout       = 29 # CSVエクスポート用 (API Gatewayの上限に合わせる)
+  memory_size   = 512
+
+  kms_key_arn = var.lambda_kms_key_arn
+
+  # powertools / xray / ndk_common は共通レイヤーから読み込む
+  layers = [var.common_layer_arn]
+
+
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  environment {
+    variables = {
+      LOG_ARCHIVE_TABLE_NAME  = var.log_archive_table_name
+      POWERTOOLS_SERVICE_NAME = "LogQuery"
+      LOG_LEVEL               = "INFO"
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+}
+
+# ─────────────────────────────
+# 2. ルーティング設定 (共通AGWへ追加)
+# ─────────────────────────────
+resource "aws_apigatewayv2_integration" "lambda" {
+  api_id           = var.api_gateway_id
+  integration_type = "AWS_PROXY"
+
+  connection_type        = "INTERNET"
+  integration_method     = "POST"
+  integration_uri        = aws_lambda_function.this.invoke_arn
+  payload_format_version = "2.0"
+}
+
+resource "aws_apigatewayv2_route" "get_logs" {
+  api_id    = var.api_gateway_id
+  route_key = "GET /logs" # 管理画面のログ一覧から呼ぶパス
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+
+  # 共通Authorizer (JWT) を使用
+  authorization_type = "JWT"
+  authorizer_id      = var.authorizer_id
+}
+
+# ─────────────────────────────
+# 3. 権限設定 (AGWからLambda起動許可)
+# ─────────────────────────────
+resource "aws_lambda_permission" "apigw" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.this.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${var.api_gateway_execution_arn}/*/*"
+}
+
+# ─────────────────────────────
+# 4. CloudWatch Log Group (ログ管理)
+# ─────────────────────────────
+resource "aws_cloudwatch_log_group" "this" {
+  name              = "/aws/lambda/${var.name_prefix}"
+  retention_in_days = 30
+}
+
+# KMS 復号権限
+data "aws_iam_policy_document" "kms_decrypt" {
+  statement {
+    effect    = "Allow"
+    actions   = ["kms:Decrypt"]
+    resources = [var.lambda_kms_key_arn]
+  }
+}
+
+resource "aws_iam_role_policy" "kms_decrypt" {
+  name   = "kms-decrypt-access"
+  role   = aws_iam_role.this.id
+  policy = data.aws_iam_policy_document.kms_decrypt.json
+}
\ No newline at end of file
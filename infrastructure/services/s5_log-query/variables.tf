@@ -0,0 +1,20 @@
+variable "name_prefix" { type = string }
+
+# 参照先 (s4_log-archiver の保存先テーブル)
+variable "log_archive_table_name" { type = string }
+variable "log_archive_table_arn" { type = string }
+
+# 共通AGW情報
+variable "api_gateway_id" { type = string }
+variable "api_gateway_execution_arn" { type = string }
+variable "authorizer_id" { type = string }
+
+variable "lambda_kms_key_arn" {
+  description = "KMS key ARN for Lambda environment encryption"
+  type        = string
+}
+
+variable "common_layer_arn" {
+  description = "共通 Lambda レイヤーの ARN (infrastructure/layers/common)"
+  type        = string
+}
@@ -0,0 +1,521 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from construction_dynamodb import flatten_data, compute_diff
+
+# ==========================================
+# 設定
+# ==========================================
+PROFILE_NAME = 'proj-ndk-ky'
+REGION = 'ap-northeast-1'
+CONSTRUCTION_TABLE_NAME = 'ndk-ky-system-dev-tenant-construction-master'
+USER_TABLE_NAME = 'ndk-ky-system-dev-tenant-user-master'
+TARGET_SECRET_NAME = 'ndk-ky-system-dev/vq-credentials'
+SEEDS_DIR = '../seeds/tenants'
+# ==========================================
+
+# シードディレクトリの構成 (テナントごとに1ディレクトリ、ファイルはどれも省略可)
+#   <SEEDS_DIR>/<tenant_id>/construction_master.json  {"tenant_id": ..., "data": [ノード, ...]}
+#   <SEEDS_DIR>/<tenant_id>/users.json                [ユーザー, ...]
+#   <SEEDS_DIR>/<tenant_id>/secrets.json              {"description": ..., "secret_data": {...}}
+CONSTRUCTION_FILE = 'construction_master.json'
+USERS_FILE = 'users.json'
+SECRETS_FILE = 'secrets.json'
+
+READ_CHUNK_SIZE = 1 << 16
+
+_thread_local = threading.local()
+
+
+# ─────────────────────────────
+# スキーマ検証
+# ─────────────────────────────
+NODE_ID_PATTERN = re.compile(r'^[A-Z]+#[A-Za-z0-9_-]+(#[A-Z]+#[A-Za-z0-9_-]+)*$')
+NODE_CHILD_KEYS = ('children', 'tasks', 'safety_equipments')
+
+# 属性名 -> (型, 必須か)
+USER_SCHEMA = {
+    'tenant_id': (str, True),
+    'user_id': (str, True),
+    'tenant_name': (str, False),
+    'domain': (str, False),
+    'departments': (dict, False),
+    'status': (str, False),
+    'created_at': (str, False),
+    'updated_at': (str, False),
+}
+SECRET_SCHEMA = {
+    'description': (str, False),
+    'secret_data': (dict, True),
+}
+SECRET_DATA_SCHEMA = {
+    'model_id': (str, True),
+    'api_key': (str, True),
+    'login_id': (str, True),
+}
+
+
+def check_schema(obj, schema, where):
+    """schema に従って型と必須項目を確認し、エラーメッセージのリストを返す"""
+    if not isinstance(obj, dict):
+        return [f"{where}: オブジェクトではありません"]
+
+    errors = []
+    for name, (expected, required) in schema.items():
+        if name not in obj:
+            if required:
+                errors.append(f"{where}.{name}: 必須です")
+        elif not isinstance(obj[name], expected):
+            errors.append(f"{where}.{name}: {expected.__name__} ではありません")
+    return errors
+
+
+def check_node(node, where, parent_id, seen_ids):
+    """工事マスタのノードを再帰的に確認 (id の形式・親子関係・重複)"""
+    errors = check_schema(node, {'id': (str, True), 'title': (str, True), 'is_high_risk': (bool, False)}, where)
+    if errors:
+        return errors
+
+    node_id = node['id']
+    if not NODE_ID_PATTERN.match(node_id):
+        errors.append(f"{where}.id: 形式が不正です ({node_id})")
+    elif parent_id and not node_id.startswith(parent_id + '#'):
+        errors.append(f"{where}.id: 親 {parent_id} の配下になっていません ({node_id})")
+    if node_id in seen_ids:
+        errors.append(f"{where}.id: 重複しています ({node_id})")
+    seen_ids.add(node_id)
+
+    for key in NODE_CHILD_KEYS:
+        children = node.get(key, [])
+        if not isinstance(children, list):
+            errors.append(f"{where}.{key}: 配列ではありません")
+            continue
+        for index, child in enumerate(children):
+            errors.extend(check_node(child, f"{where}.{key}[{index}]", node_id, seen_ids))
+    return errors
+
+
+# ─────────────────────────────
+# JSON の逐次読み込み
+# ─────────────────────────────
+class _Reader:
+    """ファイルを少しずつ読み込みながら、先頭から順に JSON を取り出す"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # 読み終えた部分は捨てる (バッファが大きくならないように)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """空白を読み飛ばして次の1文字を返す (終端なら None)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"'{char}' が必要です (位置 {self.pos})")
+        self.pos += 1
+
+    def value(self):
+        """次の JSON 値を1つ読み込む (途中で切れていれば追加で読む)"""
+        decoder = json.JSONDecoder()
+        self.peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.buf, self.pos)
+                # 数値などはバッファの末尾で切れている可能性がある
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_array(path, key=None):
+    """
+    JSON の配列を1要素ずつ返す (ファイル全体を読み込まない)
+    key を指定すると、最上位オブジェクトの key の配列を対象にする (それ以外の値は読み飛ばす)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f)
+
+        if key is not None:
+            reader.expect('{')
+            while True:
+                name = reader.value()
+                reader.expect(':')
+                if name == key:
+                    break
+                reader.value()
+                if reader.peek() != ',':
+                    raise ValueError(f"キー '{key}' が見つかりません: {path}")
+                reader.pos += 1
+
+        reader.expect('[')
+        if reader.peek() == ']':
+            return
+        while True:
+            yield reader.value()
+            char = reader.peek()
+            reader.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"配列の区切りが不正です: {path}")
+
+
+def read_top_level(path, key):
+    """最上位オブジェクトの先頭付近にある値 (tenant_id など) を読む"""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f)
+        reader.expect('{')
+        while reader.peek() != '}':
+            name = reader.value()
+            reader.expect(':')
+            value = reader.value()
+            if name == key:
+                return value
+            if reader.peek() == ',':
+                reader.pos += 1
+    return None
+
+
+# ─────────────────────────────
+# シードの読み込み
+# ─────────────────────────────
+def discover_tenants(seeds_dir, only=None):
+    """シードディレクトリからテナントの一覧を作る"""
+    tenants = []
+    for name in sorted(os.listdir(seeds_dir)):
+        tenant_dir = os.path.join(seeds_dir, name)
+        if not os.path.isdir(tenant_dir) or (only and name not in only):
+            continue
+        files = {
+            kind: os.path.join(tenant_dir, filename)
+            for kind, filename in (('construction', CONSTRUCTION_FILE), ('users', USERS_FILE), ('secrets', SECRETS_FILE))
+            if os.path.exists(os.path.join(tenant_dir, filename))
+        }
+        if files:
+            tenants.append({'tenant_id': name, 'files': files})
+    return tenants
+
+
+def validate_tenant(tenant):
+    """テナントのシードをすべて確認する (書き込み前に全テナント分をまとめて確認する)"""
+    tenant_id = tenant['tenant_id']
+    files = tenant['files']
+    errors = []
+
+    if 'construction' in files:
+        path = files['construction']
+        file_tenant = read_top_level(path, 'tenant_id')
+        if file_tenant != tenant_id:
+            errors.append(f"{path}: tenant_id がディレクトリ名と一致しません ({file_tenant})")
+        seen_ids = set()
+        for index, node in enumerate(iter_json_array(path, 'data')):
+            errors.extend(check_node(node, f"{path}: data[{index}]", None, seen_ids))
+
+    if 'users' in files:
+        path = files['users']
+        seen_users = set()
+        for index, user in enumerate(iter_json_array(path)):
+            where = f"{path}: [{index}]"
+            user_errors = check_schema(user, USER_SCHEMA, where)
+            if not user_errors and user['tenant_id'] != tenant_id:
+                user_errors.append(f"{where}.tenant_id: ディレクトリ名と一致しません ({user['tenant_id']})")
+            if not user_errors and user['user_id'] in seen_users:
+                user_errors.append(f"{where}.user_id: 重複しています ({user['user_id']})")
+            if not user_errors:
+                seen_users.add(user['user_id'])
+            errors.extend(user_errors)
+
+    if 'secrets' in files:
+        path = files['secrets']
+        with open(path, 'r', encoding='utf-8') as f:
+            secret = json.load(f)
+        errors.extend(check_schema(secret, SECRET_SCHEMA, path))
+        if isinstance(secret, dict) and 'tenant_id' in secret and secret['tenant_id'] != tenant_id:
+            errors.append(f"{path}: tenant_id がディレクトリ名と一致しません ({secret['tenant_id']})")
+        if isinstance(secret, dict) and isinstance(secret.get('secret_data'), dict):
+            errors.extend(check_schema(secret['secret_data'], SECRET_DATA_SCHEMA, f"{path}.secret_data"))
+
+    return errors
+
+
+# ─────────────────────────────
+# DynamoDB
+# ─────────────────────────────
+def _session():
+    # boto3 のセッション・リソースはスレッドセーフではないため、スレッドごとに作成する
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = boto3.Session(profile_name=PROFILE_NAME)
+    return _thread_local.session
+
+
+def _table(name):
+    return _session().resource('dynamodb', region_name=REGION).Table(name)
+
+
+def query_all(table, key_condition, **kwargs):
+    """Query を LastEvaluatedKey をたどって最後まで実行する"""
+    query_kwargs = {'KeyConditionExpression': key_condition, **kwargs}
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def parallel_scan_keys(table_name, key_names, segments, filter_expression=None):
+    """
+    Segment / TotalSegments で分割した Scan を並列に実行し、キーだけを集める
+    各セグメントは LastEvaluatedKey をたどって最後までページングする
+    """
+    projection = ', '.join(f'#k{i}' for i in range(len(key_names)))
+    names = {f'#k{i}': name for i, name in enumerate(key_names)}
+
+    def scan_segment(segment):
+        table = _table(table_name)
+        scan_kwargs = {
+            'Segment': segment,
+            'TotalSegments': segments,
+            'ProjectionExpression': projection,
+            'ExpressionAttributeNames': names,
+        }
+        if filter_expression is not None:
+            scan_kwargs['FilterExpression'] = filter_expression
+
+        keys = []
+        while True:
+            response = table.scan(**scan_kwargs)
+            keys.extend({name: item[name] for name in key_names} for item in response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return keys
+            scan_kwargs['ExclusiveStartKey'] = last_key
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        return [key for keys in executor.map(scan_segment, range(segments)) for key in keys]
+
+
+def truncate_users(tenant_ids, segments, dry_run):
+    """読み込むテナントの既存ユーザーを削除する (並列セグメントScan)"""
+    # IN 句は100件までなので分割する
+    keys = []
+    for i in range(0, len(tenant_ids), 100):
+        keys.extend(parallel_scan_keys(
+            USER_TABLE_NAME, ['tenant_id', 'user_id'], segments,
+            filter_expression=Attr('tenant_id').is_in(tenant_ids[i:i + 100])
+        ))
+
+    print(f"既存ユーザー: {len(keys)} 件 ({segments} セグメントで Scan)")
+    if dry_run or not keys:
+        return len(keys)
+
+    with _table(USER_TABLE_NAME).batch_writer() as batch:
+        for key in keys:
+            batch.delete_item(Key=key)
+    return len(keys)
+
+
+def load_construction(tenant_id, path, dry_run):
+    """工事マスタを差分で書き込む (construction_dynamodb.py の sync と同じ)"""
+    flat_items = []
+    for node in iter_json_array(path, 'data'):
+        flatten_data(node, tenant_id, flat_items)
+
+    table = _table(CONSTRUCTION_TABLE_NAME)
+    existing = list(query_all(table, Key('tenant_id').eq(tenant_id)))
+    added, updated, deleted, unchanged = compute_diff(existing, flat_items)
+
+    stats = {'put': len(added) + len(updated), 'delete': len(deleted), 'unchanged': unchanged}
+    if dry_run or not (added or updated or deleted):
+        return stats
+
+    with table.batch_writer() as batch:
+        for item in added + updated:
+            batch.put_item(Item=item)
+    with table.batch_writer() as batch:
+        for key in deleted:
+            batch.delete_item(Key=key)
+
+    # マスタのバージョンを更新 (s2 のツリーキャッシュを無効化する)
+    table.update_item(
+        Key={'tenant_id': f'META#{tenant_id}', 'nodePath': 'VERSION'},
+        UpdateExpression='ADD version :one SET updated_at = :now',
+        ExpressionAttributeValues={':one': 1, ':now': int(time.time())}
+    )
+    return stats
+
+
+def load_users(path, dry_run):
+    """ユーザーを逐次読み込みながら書き込む"""
+    count = 0
+    if dry_run:
+        return sum(1 for _ in iter_json_array(path))
+
+    with _table(USER_TABLE_NAME).batch_writer(overwrite_by_pkeys=['tenant_id', 'user_id']) as batch:
+        for user in iter_json_array(path):
+            batch.put_item(Item=user)
+            count += 1
+    return count
+
+
+def load_tenant(tenant, dry_run):
+    """1テナント分の工事マスタ・ユーザーを書き込む (スレッドで並列に実行される)"""
+    started = time.perf_counter()
+    files = tenant['files']
+    result = {'tenant_id': tenant['tenant_id'], 'items': 0}
+
+    if 'construction' in files:
+        stats = load_construction(tenant['tenant_id'], files['construction'], dry_run)
+        result['construction'] = stats
+        result['items'] += stats['put'] + stats['delete']
+
+    if 'users' in files:
+        result['users'] = load_users(files['users'], dry_run)
+        result['items'] += result['users']
+
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def merge_secrets(tenants, dry_run):
+    """
+    VQ連携キーは全テナントで1つのシークレット (テナントの配列) なので、
+    既存の値に読み込むテナント分を上書きして1回だけ更新する
+    """
+    entries = {}
+    for tenant in tenants:
+        if 'secrets' in tenant['files']:
+            with open(tenant['files']['secrets'], 'r', encoding='utf-8') as f:
+                # tenant_id はファイルの値で上書きさせない (他テナントのキーを書き換えないように)
+                entries[tenant['tenant_id']] = {**json.load(f), 'tenant_id': tenant['tenant_id']}
+    if not entries:
+        return 0
+
+    client = _session().client('secretsmanager', region_name=REGION)
+    try:
+        current = json.loads(client.get_secret_value(SecretId=TARGET_SECRET_NAME)['SecretString'])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise
+        print(f"❌ シークレット '{TARGET_SECRET_NAME}' が見つかりません。Terraformで作成されているか確認してください。")
+        return 0
+
+    merged = [entry for entry in current if entry.get('tenant_id') not in entries] + list(entries.values())
+    if not dry_run:
+        client.put_secret_value(SecretId=TARGET_SECRET_NAME, SecretString=json.dumps(merged, ensure_ascii=False))
+    return len(entries)
+
+
+# ─────────────────────────────
+# CLI
+# ─────────────────────────────
+def parse_args():
+    parser = argparse.ArgumentParser(description='複数テナントのシードをまとめて検証・投入する')
+    parser.add_argument('--dir', default=SEEDS_DIR, help='テナントごとのシードディレクトリの親')
+    parser.add_argument('--tenants', nargs='*', help='対象テナント (省略時はすべて)')
+    parser.add_argument('--parallel', type=int, default=4, help='並列に投入するテナント数')
+    parser.add_argument('--scan-segments', type=int, default=4, help='ユーザー削除時の並列Scanのセグメント数')
+    parser.add_argument('--truncate-users', action='store_true',
+                        help='投入前に対象テナントの既存ユーザーを削除する (user_dynamodb.py と同じ動作)')
+    parser.add_argument('--validate-only', action='store_true', help='検証だけ行う')
+    parser.add_argument('--dry-run', action='store_true', help='書き込まずに件数だけ表示する')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+
+    tenants = discover_tenants(args.dir, args.tenants)
+    if not tenants:
+        print(f"❌ [{args.dir}] にテナントのシードがありません")
+        return
+    print(f"--- {len(tenants)} テナントのシードを検証中... ---")
+
+    # 1. 先に全テナントを検証する (途中まで投入された状態を作らない)
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        results = list(executor.map(validate_tenant, tenants))
+    errors = [error for tenant_errors in results for error in tenant_errors]
+    if errors:
+        for error in errors[:50]:
+            print(f"   ❌ {error}")
+        print(f"❌ 検証エラー: {len(errors)} 件 (投入は行いません)")
+        exit(1)
+    print("✅ 検証OK")
+
+    if args.validate_only:
+        return
+
+    # 2. 既存ユーザーの削除
+    user_tenants = [t['tenant_id'] for t in tenants if 'users' in t['files']]
+    if args.truncate_users and user_tenants:
+        deleted = truncate_users(user_tenants, args.scan_segments, args.dry_run)
+        print(f"ユーザー削除: {deleted} 件")
+
+    # 3. テナントごとに並列で投入
+    total_items = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = {executor.submit(load_tenant, tenant, args.dry_run): tenant for tenant in tenants}
+        for future in as_completed(futures):
+            tenant_id = futures[future]['tenant_id']
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"   ❌ {tenant_id}: {e}")
+                continue
+            total_items += result['items']
+            construction = result.get('construction')
+            detail = []
+            if construction:
+                detail.append(f"工事マスタ 書込 {construction['put']} / 削除 {construction['delete']} / 変更なし {construction['unchanged']}")
+            if 'users' in result:
+                detail.append(f"ユーザー {result['users']}")
+            print(f"   ✅ {tenant_id}: {' / '.join(detail)} ({result['elapsed']:.1f} 秒)")
+
+    # 4. VQ連携キー (1つのシークレットにまとめて更新)
+    secret_count = merge_secrets(tenants, args.dry_run)
+    if secret_count:
+        print(f"VQ連携キー: {secret_count} テナント分を更新")
+
+    elapsed = time.perf_counter() - started
+    rate = total_items / elapsed if elapsed else 0
+    print(f"{'[dry-run] ' if args.dry_run else ''}✅ 完了: {total_items} 件 / {elapsed:.1f} 秒 ({rate:.0f} 件/秒)")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ 処理中断: {e}")
@@ -1,5 +1,8 @@
 import boto3
 import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from boto3.dynamodb.conditions import Key
 
 # ==========================================
@@ -11,17 +14,36 @@ TABLE_NAME = 'ndk-ky-system-dev-tenant-construction-master'
 JSON_FILE = '../seeds/table_tenant_construction_master.json'
 # ==========================================
 
-print(f"--- 処理開始: {TABLE_NAME} ---")
+# 差分の比較に使う属性 (キー以外)
+COMPARE_ATTRIBUTES = ('title', 'is_high_risk')
+DEFAULT_WORKERS = 4
+
+session = None
+table = None
+
+
+def init_table():
+    """セッションとテーブルを初期化する (実行時にだけ接続する)"""
+    global session, table
+    try:
+        session = boto3.Session(profile_name=PROFILE_NAME)
+        dynamodb = session.resource('dynamodb', region_name=REGION)
+        table = dynamodb.Table(TABLE_NAME)
+        print("✅ AWSセッション確立成功")
+    except Exception as e:
+        print(f"❌ AWS接続エラー: {e}")
+        exit(1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='工事マスタのシードをDynamoDBに投入する')
+    parser.add_argument('--file', default=JSON_FILE, help='シードJSONのパス')
+    parser.add_argument('--mode', choices=['sync', 'replace'], default='sync',
+                        help='sync: 変更のあったノードだけ書き込む (既定) / replace: 全削除してから全件登録')
+    parser.add_argument('--dry-run', action='store_true', help='書き込まずに差分の件数だけ表示する')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='並列に書き込むスレッド数')
+    return parser.parse_args()
 
-# 1. セッションとリソースの初期化
-try:
-    session = boto3.Session(profile_name=PROFILE_NAME)
-    dynamodb = session.resource('dynamodb', region_name=REGION)
-    table = dynamodb.Table(TABLE_NAME)
-    print("✅ AWSセッション確立成功")
-except Exception as e:
-    print(f"❌ AWS接続エラー: {e}")
-    exit(1)
 
 def flatten_data(node, tenant_id, flat_list):
     """
@@ -56,21 +78,102 @@ def flatten_data(node, tenant_id, flat_list):
             flatten_data(eq, tenant_id, flat_list)
 
 
+def fetch_tenant_items(tenant_id):
+    """
+    指定テナントの既存データを全件取得する (LastEvaluatedKey をたどってページング)
+    """
+    query_kwargs = {'KeyConditionExpression': Key('tenant_id').eq(tenant_id)}
+    items = []
+    pages = 0
+
+    while True:
+        try:
+            response = table.query(**query_kwargs)
+        except Exception as e:
+            print(f"❌ Queryエラー: {e}")
+            raise e
+
+        items.extend(response.get('Items', []))
+        pages += 1
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+    print(f"既存データ: {len(items)} 件 ({pages} ページ)")
+    return items
+
+
+def compute_diff(existing_items, new_items):
+    """
+    nodePath 単位で差分を計算する
+    戻り値: (追加するアイテム, 更新するアイテム, 削除するキー, 変更なしの件数)
+    """
+    existing = {item['nodePath']: item for item in existing_items}
+    seen = set()
+    added, updated = [], []
+    unchanged = 0
+
+    for item in new_items:
+        path = item['nodePath']
+        seen.add(path)
+        current = existing.get(path)
+        if current is None:
+            added.append(item)
+        elif any(current.get(attr) != item.get(attr) for attr in COMPARE_ATTRIBUTES):
+            updated.append(item)
+        else:
+            unchanged += 1
+
+    deleted = [
+        {'tenant_id': item['tenant_id'], 'nodePath': path}
+        for path, item in existing.items() if path not in seen
+    ]
+    return added, updated, deleted, unchanged
+
+
+def _chunks(items, count):
+    """items をほぼ同じ件数の count 個に分割"""
+    size = max(1, -(-len(items) // max(1, count)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _new_table():
+    # boto3 のリソースはスレッドセーフではないため、スレッドごとに作成する
+    return boto3.Session(profile_name=PROFILE_NAME).resource('dynamodb', region_name=REGION).Table(TABLE_NAME)
+
+
+def write_parallel(puts, deletes, workers):
+    """
+    登録・削除を複数スレッドの batch_writer で並列に書き込む
+    先に登録を終えてから削除する (処理中にノードが欠ける時間を作らない)
+    """
+    def put_chunk(chunk):
+        with _new_table().batch_writer() as batch:
+            for item in chunk:
+                batch.put_item(Item=item)
+        return len(chunk)
+
+    def delete_chunk(chunk):
+        with _new_table().batch_writer() as batch:
+            for key in chunk:
+                batch.delete_item(Key=key)
+        return len(chunk)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        written = sum(executor.map(put_chunk, _chunks(puts, workers))) if puts else 0
+        deleted = sum(executor.map(delete_chunk, _chunks(deletes, workers))) if deletes else 0
+    return written, deleted
+
+
 def delete_tenant_data(tenant_id):
     """
     指定されたテナントIDのデータを全削除する
     """
     print(f"テナントID: {tenant_id} の既存データを検索中...")
 
-    try:
-        response = table.query(
-            KeyConditionExpression=Key('tenant_id').eq(tenant_id)
-        )
-    except Exception as e:
-        print(f"❌ Queryエラー: {e}")
-        raise e
-
-    items = response.get('Items', [])
+    items = fetch_tenant_items(tenant_id)
 
     if not items:
         print("削除対象のデータはありません。")
@@ -88,10 +191,76 @@ def delete_tenant_data(tenant_id):
             )
     print("削除完了。")
 
+def bump_master_version(tenant_id):
+    """
+    マスタのバージョンを +1 する
+    s2_tenant-context はこのバージョンでツリーのキャッシュ・ETag を管理している
+    """
+    response = table.update_item(
+        Key={'tenant_id': f'META#{tenant_id}', 'nodePath': 'VERSION'},
+        UpdateExpression='ADD version :one SET updated_at = :now',
+        ExpressionAttributeValues={':one': 1, ':now': int(time.time())},
+        ReturnValues='UPDATED_NEW'
+    )
+    print(f"マスタのバージョンを更新しました: v{response['Attributes']['version']}")
+
+
+def replace_all(tenant_id, flat_items, dry_run):
+    """従来の動作: 全削除してから全件登録"""
+    if dry_run:
+        print(f"[dry-run] 既存データを全削除し、{len(flat_items)} 件を登録します")
+        return True
+
+    # 1. 既存データの削除
+    delete_tenant_data(tenant_id)
+
+    print(f"{len(flat_items)} 件のデータを登録します...")
+
+    # 2. データの登録
+    with table.batch_writer() as batch:
+        for item in flat_items:
+            batch.put_item(Item=item)
+    return True
+
+
+def sync(tenant_id, flat_items, dry_run, workers):
+    """差分だけを書き込む。変更があったかどうかを返す"""
+    started = time.perf_counter()
+
+    existing_items = fetch_tenant_items(tenant_id)
+    added, updated, deleted, unchanged = compute_diff(existing_items, flat_items)
+
+    print(f"差分: 追加 {len(added)} 件 / 更新 {len(updated)} 件 / 削除 {len(deleted)} 件 / 変更なし {unchanged} 件")
+
+    if dry_run:
+        for item in added[:10]:
+            print(f"   + {item['nodePath']} {item['title']}")
+        for item in updated[:10]:
+            print(f"   ~ {item['nodePath']} {item['title']}")
+        for key in deleted[:10]:
+            print(f"   - {key['nodePath']}")
+        print("[dry-run] 書き込みは行いませんでした")
+        return False
+
+    if not (added or updated or deleted):
+        print("変更はありません。")
+        return False
+
+    written, removed = write_parallel(added + updated, deleted, workers)
+    elapsed = time.perf_counter() - started
+    print(f"書き込み {written} 件 / 削除 {removed} 件 ({elapsed:.1f} 秒, {workers} スレッド)")
+    return True
+
+
 def main():
-    print(f"[{JSON_FILE}] を読み込み中...")
+    args = parse_args()
+
+    print(f"--- 処理開始: {TABLE_NAME} ({args.mode}{', dry-run' if args.dry_run else ''}) ---")
+    init_table()
+
+    print(f"[{args.file}] を読み込み中...")
     try:
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
+        with open(args.file, 'r', encoding='utf-8') as f:
             source_data = json.load(f)
     except FileNotFoundError:
         print("❌ JSONファイルが見つかりません。パスを確認してください。")
@@ -100,25 +269,28 @@ def main():
     tenant_id = source_data['tenant_id']
     root_nodes = source_data['data']
 
-    # 1. 既存データの削除
-    delete_tenant_data(tenant_id)
-
-    # 2. データのフラット化
+    # 1. データのフラット化
     flat_items = []
     for node in root_nodes:
         flatten_data(node, tenant_id, flat_items)
 
-    print(f"{len(flat_items)} 件のデータを登録します...")
+    # 2. データの登録
+    if args.mode == 'replace':
+        changed = replace_all(tenant_id, flat_items, args.dry_run)
+    else:
+        changed = sync(tenant_id, flat_items, args.dry_run, args.workers)
 
-    # 3. データの登録
-    with table.batch_writer() as batch:
-        for item in flat_items:
-            batch.put_item(Item=item)
+    if args.dry_run:
+        return
 
     print("✅ 登録完了！")
 
+    # 3. マスタのバージョンを更新 (s2 のツリーキャッシュを無効化する)
+    if changed:
+        bump_master_version(tenant_id)
+
 if __name__ == '__main__':
     try:
         main()
     except Exception as e:
-        print(f"❌ 処理中断: {e}")
\ No newline at end of file
+        print(f"❌ 処理中断: {e}")
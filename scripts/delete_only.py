@@ -1,3 +1,4 @@
+import time
 import boto3
 from boto3.dynamodb.conditions import Key
 
@@ -39,4 +40,12 @@ else:
                     'nodePath': item['nodePath']
                 }
             )
-    print("✅ 削除完了！")
\ No newline at end of file
+    print("✅ 削除完了！")
+
+    # マスタのバージョンを更新 (s2 のツリーキャッシュを無効化する)
+    table.update_item(
+        Key={'tenant_id': f'META#{TENANT_ID}', 'nodePath': 'VERSION'},
+        UpdateExpression='ADD version :one SET updated_at = :now',
+        ExpressionAttributeValues={':one': 1, ':now': int(time.time())}
+    )
+    print("✅ マスタのバージョンを更新しました")
\ No newline at end of file
@@ -0,0 +1,122 @@
+import argparse
+import datetime
+
+import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+# ==========================================
+# 設定
+# ==========================================
+PROFILE_NAME = 'proj-ndk-ky'
+REGION = 'ap-northeast-1'
+# s4_log-archiver のコールド層出力先 (s3://<bucket>/<prefix>)
+DEFAULT_SOURCE = 's3://ndk-ky-system-dev-log-archive-v2/log-archive'
+# ==========================================
+
+# 集計できる列
+GROUP_COLUMNS = ['tenant_id', 'date', 'level', 'action_category', 'function_name', 'user_id']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='コールド層 (Parquet) のログをDynamoDBを使わずに絞り込み・集計する'
+    )
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='s3://bucket/prefix またはローカルディレクトリ')
+    parser.add_argument('--tenant', help='テナントID (省略時は全テナント)')
+    parser.add_argument('--from', dest='date_from', help='開始日 YYYY-MM-DD (この日を含む)')
+    parser.add_argument('--to', dest='date_to', help='終了日 YYYY-MM-DD (この日を含む)')
+    parser.add_argument('--level', help='例: ERROR')
+    parser.add_argument('--action-category', help='例: AUTH')
+    parser.add_argument('--contains', help='message に含まれる文字列')
+    parser.add_argument('--group-by', nargs='*', choices=GROUP_COLUMNS,
+                        help='指定した列で件数を集計する (省略時は該当ログを表示)')
+    parser.add_argument('--limit', type=int, default=50, help='表示件数 (集計なしの場合)')
+    return parser.parse_args()
+
+
+def open_dataset(source):
+    """S3またはローカルのParquetをHiveパーティション付きで開く"""
+    # パーティション列は文字列として扱う (date を日付型に推論させない)
+    partitioning = ds.partitioning(
+        pa.schema([('tenant_id', pa.string()), ('date', pa.string())]), flavor='hive'
+    )
+
+    if not source.startswith('s3://'):
+        return ds.dataset(source, format='parquet', partitioning=partitioning)
+
+    # boto3 のプロファイルから認証情報を取り出して pyarrow に渡す
+    session = boto3.Session(profile_name=PROFILE_NAME)
+    creds = session.get_credentials().get_frozen_credentials()
+    s3 = fs.S3FileSystem(
+        access_key=creds.access_key,
+        secret_key=creds.secret_key,
+        session_token=creds.token,
+        region=REGION,
+    )
+    return ds.dataset(source[len('s3://'):], filesystem=s3, format='parquet', partitioning=partitioning)
+
+
+def build_filter(args):
+    """絞り込み条件を作成 (tenant_id / date はパーティションの枝刈りに使われる)"""
+    conditions = []
+
+    if args.tenant:
+        conditions.append(ds.field('tenant_id') == args.tenant)
+    # date はパーティション値なので文字列比較 (YYYY-MM-DD は辞書順 = 日付順)
+    if args.date_from:
+        conditions.append(ds.field('date') >= args.date_from)
+    if args.date_to:
+        conditions.append(ds.field('date') <= args.date_to)
+    if args.level:
+        conditions.append(ds.field('level') == args.level)
+    if args.action_category:
+        conditions.append(ds.field('action_category') == args.action_category)
+    if args.contains:
+        conditions.append(pc.match_substring(ds.field('message'), args.contains))
+
+    if not conditions:
+        return None
+
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+
+def main():
+    args = parse_args()
+
+    print(f"[{args.source}] を読み込み中...")
+    dataset = open_dataset(args.source)
+    expression = build_filter(args)
+
+    if args.group_by:
+        # 集計に必要な列だけ読み込む
+        table = dataset.to_table(filter=expression, columns=args.group_by + ['timestamp'])
+        result = table.group_by(args.group_by).aggregate([('timestamp', 'count')])
+        result = result.sort_by([('timestamp_count', 'descending')])
+
+        print(f"✅ {table.num_rows} 件のログを集計しました")
+        for row in result.to_pylist():
+            keys = ' / '.join(str(row[col]) for col in args.group_by)
+            print(f"   - {keys}: {row['timestamp_count']}")
+        return
+
+    table = dataset.to_table(filter=expression)
+    table = table.sort_by([('timestamp', 'descending')])
+    print(f"✅ {table.num_rows} 件のログが見つかりました (先頭 {args.limit} 件を表示)")
+
+    for row in table.slice(0, args.limit).to_pylist():
+        ts = datetime.datetime.fromtimestamp(row['timestamp'] / 1000, tz=datetime.timezone.utc)
+        print(f"   {ts.isoformat()} [{row['level']}] {row['tenant_id']} {row['function_name']}: {row['message']}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ 処理中断: {e}")
@@ -25,15 +25,21 @@ except Exception as e:
 
 def truncate_table():
     print("既存データをスキャン中...")
+    items = []
+    scan_kwargs = {'ProjectionExpression': 'tenant_id, user_id'}
     try:
-        # scan実行
-        scan = table.scan()
+        # scan実行 (1MBを超える場合は LastEvaluatedKey をたどって全ページ取得)
+        while True:
+            scan = table.scan(**scan_kwargs)
+            items.extend(scan.get('Items', []))
+            if 'LastEvaluatedKey' not in scan:
+                break
+            scan_kwargs['ExclusiveStartKey'] = scan['LastEvaluatedKey']
     except Exception as e:
         print(f"❌ Scanエラー: {e}")
         print("考えられる原因: プロファイル設定、リージョン、テーブル名の不一致")
         raise e
 
-    items = scan.get('Items', [])
     if not items:
         print("削除対象のデータはありません。")
         return